@@ -0,0 +1,63 @@
+"""unique session player
+
+Revision ID: 9d2f6c1e8b47
+Revises: 4518f93a426c
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d2f6c1e8b47'
+down_revision: Union[str, Sequence[str], None] = '4518f93a426c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Дубликаты игроков (одновременный вход из нескольких вкладок) сливаются в самую раннюю запись:
+    # ее счет становится суммой счетов дубликатов, ответы переносятся на нее, остальные записи удаляются.
+    # downgrade не восстанавливает удаленные записи
+    op.execute("""
+        UPDATE sessions_players SET score = (
+            SELECT SUM(COALESCE(other.score, 0)) FROM sessions_players other
+            WHERE other.session_id = sessions_players.session_id AND other.user_id = sessions_players.user_id
+        )
+        WHERE id IN (
+            SELECT keep.id FROM sessions_players keep
+            JOIN sessions_players dup ON dup.session_id = keep.session_id AND dup.user_id = keep.user_id
+            WHERE keep.id < dup.id
+        )
+    """)
+    op.execute("""
+        UPDATE player_answers SET session_player_id = (
+            SELECT MIN(keep.id) FROM sessions_players keep
+            JOIN sessions_players dup ON dup.session_id = keep.session_id AND dup.user_id = keep.user_id
+            WHERE dup.id = player_answers.session_player_id
+        )
+        WHERE session_player_id IN (
+            SELECT dup.id FROM sessions_players dup
+            JOIN sessions_players keep ON keep.session_id = dup.session_id AND keep.user_id = dup.user_id
+            WHERE keep.id < dup.id
+        )
+    """)
+    op.execute("""
+        DELETE FROM sessions_players WHERE id IN (
+            SELECT dup.id FROM sessions_players dup
+            JOIN sessions_players keep ON keep.session_id = dup.session_id AND keep.user_id = dup.user_id
+            WHERE keep.id < dup.id
+        )
+    """)
+    op.create_unique_constraint(
+        'uq_sessions_players_session_user', 'sessions_players', ['session_id', 'user_id']
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_sessions_players_session_user', 'sessions_players', type_='unique')
@@ -0,0 +1,45 @@
+"""hot query indexes
+
+Revision ID: b3e71f2a6c90
+Revises: 9d2f6c1e8b47
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3e71f2a6c90'
+down_revision: Union[str, Sequence[str], None] = '9d2f6c1e8b47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# sessions_players(session_id, user_id) уже покрыт uq_sessions_players_session_user.
+# id в конце индексов questions и sessions - второй ключ сортировки при равных order_index/started_at
+INDEXES = [
+    ('ix_player_answers_player_question', 'player_answers', ['session_player_id', 'question_id']),
+    ('ix_questions_quiz_order', 'questions', ['quiz_id', 'order_index', 'id']),
+    ('ix_answers_question_correct', 'answers', ['question_id', 'is_correct']),
+    ('ix_sessions_host_started', 'sessions', ['host_id', 'started_at', 'id']),
+    ('ix_sessions_host_status_started', 'sessions', ['host_id', 'status', 'started_at', 'id']),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CREATE INDEX CONCURRENTLY (PostgreSQL) не блокирует запись в таблицы, но не выполняется
+    # внутри транзакции. Если построение прервалось, индекс остается INVALID - его нужно
+    # удалить (DROP INDEX CONCURRENTLY) и повторить миграцию
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
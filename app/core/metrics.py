@@ -0,0 +1,214 @@
+"""Метрики приложения в текстовом формате Prometheus (/api/metrics).
+
+Счетчики и гистограммы обновляются в горячих путях, поэтому устроены просто: словарь
+по значениям меток и короткая блокировка (синхронные обработчики и Redis-функции
+выполняются в пуле потоков). Значения, которые и так есть в памяти (сокеты, очереди,
+пул соединений), не считаются на каждом событии, а снимаются при запросе метрик
+через gauge_callback. METRICS_ENABLED=false отключает обновления и эндпоинт.
+"""
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+from app.core.config import settings
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FAST_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.enabled = True
+        self.values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = list(self.values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.enabled = True
+        self.values: Dict[LabelValues, list] = {}  # метки -> [счетчики по корзинам (+Inf последним), сумма]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        if not self.enabled:
+            return
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self.values.get(labels)
+            if state is None:
+                state = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(labels, list(counts), total) for labels, (counts, total) in self.values.items()]
+        names = self.labelnames + ("le",)
+        for labels, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(names, labels + (_format_value(bound),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class GaugeCallback:
+    """Gauge, значения которого считаются при запросе метрик"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], collect: Callable[[], Iterable[Tuple[LabelValues, float]]]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        for labels, value in self.collect():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.metrics: list = []
+
+    def _register(self, metric):
+        if hasattr(metric, "enabled"):
+            metric.enabled = self.enabled
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge_callback(self, name: str, documentation: str, labelnames: Sequence[str], collect) -> GaugeCallback:
+        return self._register(GaugeCallback(name, documentation, labelnames, collect))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry(enabled=settings.METRICS_ENABLED)
+
+http_request_seconds = registry.histogram(
+    "quiz_http_request_duration_seconds", "Время обработки HTTP-запроса", ("method", "route")
+)
+http_requests_total = registry.counter(
+    "quiz_http_requests_total", "HTTP-запросы по статусу ответа", ("method", "route", "status")
+)
+ws_broadcast_seconds = registry.histogram(
+    "quiz_ws_broadcast_duration_seconds", "Постановка события сессии в очереди сокетов воркера", buckets=FAST_BUCKETS
+)
+ws_broadcast_recipients_total = registry.counter(
+    "quiz_ws_broadcast_recipients_total", "Кадры событий сессий, поставленные в очереди сокетов"
+)
+answers_total = registry.counter(
+    "quiz_answers_total", "Принятые ответы игроков", ("result",)
+)
+redis_call_seconds = registry.histogram(
+    "quiz_redis_call_duration_seconds", "Время вызовов Redis из app/db/redis.py", ("operation",), buckets=FAST_BUCKETS
+)
+redis_errors_total = registry.counter(
+    "quiz_redis_errors_total", "Ошибки Redis в app/db/redis.py", ("operation",)
+)
+
+
+class RedisCall:
+    """Замер вызова Redis: with RedisCall("operation"): ... - время и ошибки по операции"""
+
+    __slots__ = ("operation", "started")
+
+    def __init__(self, operation: str):
+        self.operation = operation
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        redis_call_seconds.observe(time.perf_counter() - self.started, self.operation)
+        if exc_type is not None:
+            redis_errors_total.inc(self.operation)
+        return False
+
+
+class HttpMetricsMiddleware:
+    """ASGI-middleware: время и статусы HTTP-запросов по шаблону маршрута (/api/quizzes/{quiz_id}),
+    чтобы число рядов не зависело от id в путях"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            http_request_seconds.observe(time.perf_counter() - started, scope["method"], route)
+            http_requests_total.inc(scope["method"], route, str(status))
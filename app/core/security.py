@@ -7,6 +7,7 @@ from sqlalchemy.orm import Session
 from app.core.config import settings
 from app.db.session import get_db
 from app.services import crud
+from app.services.auth_cache import auth_cache
 from app.models import models
 
 http_bearer = HTTPBearer(auto_error=False)
@@ -25,6 +26,28 @@ def verify_token(token: str) -> dict:
     except JWTError as e:
         raise
 
+def user_id_from_token(token: str) -> Optional[int]:
+    """id пользователя из JWT; уже проверенный токен берется из кэша до своего истечения"""
+    user_id = auth_cache.token_user_id(token)
+    if user_id is not None:
+        return user_id
+    payload = verify_token(token)
+    subject = payload.get("sub")
+    if subject is None:
+        return None
+    user_id = int(subject)
+    auth_cache.remember_token(token, payload, user_id)
+    return user_id
+
+def get_cached_user(db: Session, user_id: int) -> Optional[models.User]:
+    """Пользователь из кэша авторизации; при промахе читается из БД"""
+    user = auth_cache.get_user(user_id)
+    if user is None:
+        user = crud.get_user(db, user_id=user_id)
+        if user is not None:
+            auth_cache.remember_user(user)
+    return user
+
 def get_current_user(
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(http_bearer),
     db: Session = Depends(get_db)
@@ -47,14 +70,13 @@ def get_current_user(
     )
     
     try:
-        payload = verify_token(token)
-        user_id: str = payload.get("sub")
+        user_id = user_id_from_token(token)
         if user_id is None:
             raise credentials_exception
-    except JWTError:
+    except (JWTError, ValueError):
         raise credentials_exception
     
-    user = crud.get_user(db, user_id=int(user_id))
+    user = get_cached_user(db, user_id)
     if user is None:
         raise credentials_exception
     
@@ -79,14 +101,13 @@ def get_current_user_required(
     )
     
     try:
-        payload = verify_token(token)
-        user_id: str = payload.get("sub")
+        user_id = user_id_from_token(token)
         if user_id is None:
             raise credentials_exception
-    except JWTError:
+    except (JWTError, ValueError):
         raise credentials_exception
     
-    user = crud.get_user(db, user_id=int(user_id))
+    user = get_cached_user(db, user_id)
     if user is None:
         raise credentials_exception
     
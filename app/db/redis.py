@@ -1,11 +1,19 @@
 import redis
-from typing import Optional
+import redis.asyncio as aioredis
+from typing import Callable, List, Optional
 from app.core.config import settings
+from app.core.metrics import RedisCall
 import logging
 
 logger = logging.getLogger(__name__)
 
 redis_client: Optional[redis.Redis] = None
+async_redis_client: Optional[aioredis.Redis] = None
+
+# Канал, по которому invalidate_token оповещает остальные воркеры
+TOKEN_INVALIDATION_CHANNEL = "auth:invalidate"
+# Локальные кэши, которые нужно сбросить при invalidate_token (кэш пользователей авторизации)
+token_invalidation_hooks: List[Callable[[str], None]] = []
 
 def get_redis() -> Optional[redis.Redis]:
     global redis_client
@@ -35,25 +43,50 @@ def get_redis() -> Optional[redis.Redis]:
             redis_client = None
     return redis_client
 
+def get_async_redis() -> Optional[aioredis.Redis]:
+    """Асинхронный клиент Redis (нужен для pub/sub в WebSocket)"""
+    global async_redis_client
+    if async_redis_client is None:
+        try:
+            if settings.USE_INMEMORY_REDIS:
+                try:
+                    from fakeredis import aioredis as fake_aioredis
+                    async_redis_client = fake_aioredis.FakeRedis(decode_responses=True)
+                    logger.info("Using in-memory async Redis (fakeredis)")
+                except ImportError:
+                    logger.error("fakeredis is not installed. Install it with: pip install fakeredis")
+                    raise ImportError("fakeredis is required for in-memory Redis mode")
+            else:
+                async_redis_client = aioredis.from_url(
+                    settings.REDIS_URL,
+                    decode_responses=True,
+                    socket_connect_timeout=5
+                )
+        except ImportError as e:
+            logger.error(f"Failed to initialize async Redis: {e}")
+            async_redis_client = None
+    return async_redis_client
+
 def check_rate_limit(key: str, limit: int, window: int) -> tuple[bool, int]:
     r = get_redis()
     if r is None:
         return True, limit
     
     try:
-        current = r.get(key)
+        with RedisCall("rate_limit"):
+            current = r.get(key)
         
-        if current is None:
-            r.setex(key, window, 1)
-            return True, limit - 1
+            if current is None:
+                r.setex(key, window, 1)
+                return True, limit - 1
         
-        current_count = int(current)
-        if current_count >= limit:
-            return False, 0
+            current_count = int(current)
+            if current_count >= limit:
+                return False, 0
         
-        r.incr(key)
-        remaining = limit - current_count - 1
-        return True, remaining
+            r.incr(key)
+            remaining = limit - current_count - 1
+            return True, remaining
     except (redis.ConnectionError, redis.TimeoutError) as e:
         logger.warning(f"Redis error during rate limit check: {e}")
         return True, limit
@@ -65,7 +98,8 @@ def cache_user_check(email: str, exists: bool, ttl: int = 300) -> None:
     
     try:
         key = f"user_exists:{email}"
-        r.setex(key, ttl, "1" if exists else "0")
+        with RedisCall("cache_user_check"):
+            r.setex(key, ttl, "1" if exists else "0")
     except (redis.ConnectionError, redis.TimeoutError) as e:
         logger.warning(f"Redis error during cache write: {e}")
 
@@ -76,7 +110,8 @@ def get_cached_user_check(email: str) -> Optional[bool]:
     
     try:
         key = f"user_exists:{email}"
-        result = r.get(key)
+        with RedisCall("get_cached_user_check"):
+            result = r.get(key)
         if result is None:
             return None
         return result == "1"
@@ -91,7 +126,8 @@ def cache_token(user_id: str, token: str, ttl: int) -> None:
     
     try:
         key = f"user_token:{user_id}"
-        r.setex(key, ttl, token)
+        with RedisCall("cache_token"):
+            r.setex(key, ttl, token)
     except (redis.ConnectionError, redis.TimeoutError) as e:
         logger.warning(f"Redis error during token cache: {e}")
 
@@ -102,19 +138,25 @@ def get_cached_token(user_id: str) -> Optional[str]:
     
     try:
         key = f"user_token:{user_id}"
-        return r.get(key)
+        with RedisCall("get_cached_token"):
+            return r.get(key)
     except (redis.ConnectionError, redis.TimeoutError) as e:
         logger.warning(f"Redis error during token read: {e}")
         return None
 
 def invalidate_token(user_id: str) -> None:
+    for hook in token_invalidation_hooks:
+        hook(user_id)
+    
     r = get_redis()
     if r is None:
         return
     
     try:
         key = f"user_token:{user_id}"
-        r.delete(key)
+        with RedisCall("invalidate_token"):
+            r.delete(key)
+            r.publish(TOKEN_INVALIDATION_CHANNEL, str(user_id))
     except (redis.ConnectionError, redis.TimeoutError) as e:
         logger.warning(f"Redis error during token invalidation: {e}")
 
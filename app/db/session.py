@@ -1,4 +1,7 @@
+from contextlib import asynccontextmanager
 from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.exc import SQLAlchemyError, OperationalError
 from app.core.config import settings
@@ -47,3 +50,42 @@ def get_db():
         raise
     finally:
         db.close()
+
+# Асинхронные драйверы для того же DATABASE_URL: запросы из async-кода не блокируют event loop
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def get_async_database_url() -> str:
+    if settings.ASYNC_DATABASE_URL:
+        return settings.ASYNC_DATABASE_URL
+    url = make_url(settings.DATABASE_URL)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        raise ValueError(f"Нет асинхронного драйвера для {url.get_backend_name()}, задайте ASYNC_DATABASE_URL")
+    return url.set(drivername=driver).render_as_string(hide_password=False)
+
+async_engine = create_async_engine(get_async_database_url(), future=True, pool_pre_ping=True)
+# expire_on_commit=False: после commit атрибуты читаются без повторного запроса (ленивая загрузка в async недоступна)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+logger.info("✓ AsyncSessionLocal создан успешно")
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+        except SQLAlchemyError as e:
+            logger.error(f"Ошибка SQLAlchemy в get_async_db: {e}")
+            await db.rollback()
+            raise
+
+@asynccontextmanager
+async def async_session_scope():
+    """Асинхронная короткоживущая сессия БД на одну операцию"""
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+        except Exception:
+            await db.rollback()
+            raise
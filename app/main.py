@@ -1,12 +1,22 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Response
 from starlette.middleware.cors import CORSMiddleware
 from sqlalchemy import text
+from sqlalchemy.pool import QueuePool
 import logging
 
 from app.routers import auth, users, quizzes, questions, answers, sessions, websocket, media
-from app.db.session import engine
+from app.db.session import async_engine, engine
 from app.db.init_db import init_db
+from app.core import metrics
 from app.core.config import settings
+from app.utils.pagination import NEXT_CURSOR_HEADER
+from app.services.answer_progress import answer_progress
+from app.services.answer_writer import answer_buffer
+from app.services.auth_cache import auth_cache
+from app.services.game_context import invalidation_listener
+from app.services.join_admission import join_admission
+from app.services.leaderboard import leaderboard
+from app.services.question_timer import question_timer
 
 # Настройка логирования
 logging.basicConfig(
@@ -24,8 +34,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Курсор следующей страницы списков (keyset-пагинация) и ETag полного квиза
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag"],
 )
 
+if settings.METRICS_ENABLED:
+    app.add_middleware(metrics.HttpMetricsMiddleware)
+
 prefix = '/api'
 
 app.include_router(auth.router, prefix=prefix)
@@ -37,6 +52,26 @@ app.include_router(sessions.router, prefix=prefix)
 app.include_router(websocket.router, prefix=prefix)
 app.include_router(media.router, prefix=prefix)
 
+def queue_depths():
+    return [
+        (("answer_writer",), len(answer_buffer.pending_answers)),
+        (("join_admission",), len(join_admission.pending)),
+        (("answer_progress",), len(answer_progress.pending)),
+        (("leaderboard",), len(leaderboard.dirty)),
+        (("player_left",), len(websocket.manager.pending_left))
+    ]
+
+def pool_usage():
+    for name, pool in (("sync", engine.pool), ("async", async_engine.pool)):
+        # У NullPool и StaticPool счетчиков нет
+        if isinstance(pool, QueuePool):
+            yield (name, "size"), pool.size()
+            yield (name, "checked_out"), pool.checkedout()
+            yield (name, "overflow"), max(pool.overflow(), 0)
+
+metrics.registry.gauge_callback("quiz_queue_depth", "Длина внутренних очередей воркера", ("queue",), queue_depths)
+metrics.registry.gauge_callback("quiz_db_pool_connections", "Соединения пула SQLAlchemy", ("engine", "state"), pool_usage)
+
 @app.on_event("startup")
 async def startup_event():
     logger.info("=" * 50)
@@ -47,7 +82,23 @@ async def startup_event():
     logger.info(f"SECRET_KEY установлен: {settings.SECRET_KEY != 'CHANGE_ME_TO_SECRET'}")
     logger.info(f"USE_OBJECT_STORAGE: {settings.USE_OBJECT_STORAGE}")
     logger.info(f"USE_INMEMORY_REDIS: {settings.USE_INMEMORY_REDIS}")
+    logger.info(f"BROADCAST_BACKEND: {settings.BROADCAST_BACKEND}")
     logger.info("=" * 50)
+    await auth_cache.start()
+    await invalidation_listener.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await websocket.manager.close()
+    await leaderboard.close()
+    await answer_progress.close()
+    await question_timer.close()
+    await auth_cache.close()
+    await invalidation_listener.close()
+    await join_admission.close()
+    # Дописываем в БД ответы, которые еще не были сброшены
+    await answer_buffer.close()
+    await async_engine.dispose()
 
 # create tables (for development; use Alembic for production)
 try:
@@ -78,5 +129,15 @@ def health_check():
         "status": "ok",
         "database": db_status,
         "app_name": settings.APP_NAME,
-        "env_loaded": settings.SECRET_KEY != "CHANGE_ME_TO_SECRET"
+        "env_loaded": settings.SECRET_KEY != "CHANGE_ME_TO_SECRET",
+        "websocket": websocket.manager.stats(),
+        "auth_cache": auth_cache.stats(),
+        "join_admission": join_admission.stats()
     }
+
+@app.get('/api/metrics')
+async def metrics_endpoint():
+    """Метрики в текстовом формате Prometheus"""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, TIMESTAMP, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, Boolean, TIMESTAMP, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.db.base import Base
@@ -22,6 +22,8 @@ class Quiz(Base):
     author_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     is_public = Column(Boolean, nullable=False, default=False)
     created_at = Column(TIMESTAMP, default=datetime.utcnow)
+    # Растет при любой правке квиза, его вопросов и ответов (crud.bump_quiz_version) - ETag полного квиза
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
     author = relationship("User", back_populates="quizzes")
     questions = relationship("Question", back_populates="quiz", cascade="all, delete-orphan")
@@ -34,6 +36,9 @@ class Media(Base):
 
 class Question(Base):
     __tablename__ = "questions"
+    __table_args__ = (
+        Index("ix_questions_quiz_order", "quiz_id", "order_index", "id"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     quiz_id = Column(Integer, ForeignKey("quizzes.id"), nullable=False)
     text = Column(Text, nullable=True)
@@ -49,6 +54,9 @@ class Question(Base):
 
 class Answer(Base):
     __tablename__ = "answers"
+    __table_args__ = (
+        Index("ix_answers_question_correct", "question_id", "is_correct"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     question_id = Column(Integer, ForeignKey("questions.id"), nullable=False)
     text = Column(Text, nullable=False)
@@ -58,6 +66,10 @@ class Answer(Base):
 
 class SessionGame(Base):
     __tablename__ = "sessions"
+    __table_args__ = (
+        Index("ix_sessions_host_started", "host_id", "started_at", "id"),
+        Index("ix_sessions_host_status_started", "host_id", "status", "started_at", "id"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     quiz_id = Column(Integer, ForeignKey("quizzes.id"), nullable=False)
     host_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -69,6 +81,9 @@ class SessionGame(Base):
 
 class SessionPlayer(Base):
     __tablename__ = "sessions_players"
+    __table_args__ = (
+        UniqueConstraint("session_id", "user_id", name="uq_sessions_players_session_user"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(Integer, ForeignKey("sessions.id"), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
@@ -78,6 +93,9 @@ class SessionPlayer(Base):
 
 class PlayerAnswer(Base):
     __tablename__ = "player_answers"
+    __table_args__ = (
+        Index("ix_player_answers_player_question", "session_player_id", "question_id"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     session_player_id = Column(Integer, ForeignKey("sessions_players.id"), nullable=False)
     question_id = Column(Integer, ForeignKey("questions.id"), nullable=False)
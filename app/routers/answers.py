@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import Optional
 from app.schemas import schemas
-from app.services import crud
+from app.services import crud, ownership
 from app.db.session import get_db
 from app.core.security import get_current_user
 from app.models import models
@@ -35,8 +35,7 @@ def update_answer(
     db: Session = Depends(get_db),
     current_user: Optional[models.User] = Depends(get_current_user)
 ):
-    ans = crud.get_answer(db, answer_id)
-    if not ans:
+    if ownership.resolve_author(db, models.Answer, answer_id) is None:
         raise HTTPException(status_code=404, detail="Answer not found")
     return crud.update_answer(db, answer_id, ans_in, current_user)
 
@@ -46,8 +45,7 @@ def delete_answer(
     db: Session = Depends(get_db),
     current_user: Optional[models.User] = Depends(get_current_user)
 ):
-    ans = crud.get_answer(db, answer_id)
-    if not ans:
+    if ownership.resolve_author(db, models.Answer, answer_id) is None:
         raise HTTPException(status_code=404, detail="Answer not found")
     crud.delete_answer(db, answer_id, current_user)
     return
@@ -1,23 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from app.schemas import schemas
-from app.services import crud
+from app.services import crud, ownership
 from app.db.session import get_db
 from app.core.security import get_current_user
 from app.models import models
+from app.utils.pagination import set_next_cursor
 
 router = APIRouter(prefix="/questions", tags=["questions"])
 
 @router.get("/", response_model=List[schemas.QuestionOut])
 def get_questions(
     quiz_id: int,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: Optional[models.User] = Depends(get_current_user)
 ):
-    return crud.get_questions(db, quiz_id=quiz_id, skip=skip, limit=limit)
+    questions = crud.get_questions(db, quiz_id=quiz_id, skip=skip, limit=limit, cursor=cursor)
+    set_next_cursor(response, crud.QUESTIONS_KEYSET, questions, limit)
+    return questions
 
 @router.get("/{question_id}", response_model=schemas.QuestionOut)
 def get_question(
@@ -47,8 +52,7 @@ def update_question(
     db: Session = Depends(get_db),
     current_user: Optional[models.User] = Depends(get_current_user)
 ):
-    q = crud.get_question(db, question_id)
-    if not q:
+    if ownership.resolve_author(db, models.Question, question_id) is None:
         raise HTTPException(status_code=404, detail="Question not found")
     return crud.update_question(db, question_id, q_in, current_user)
 
@@ -58,8 +62,7 @@ def delete_question(
     db: Session = Depends(get_db),
     current_user: Optional[models.User] = Depends(get_current_user)
 ):
-    q = crud.get_question(db, question_id)
-    if not q:
+    if ownership.resolve_author(db, models.Question, question_id) is None:
         raise HTTPException(status_code=404, detail="Question not found")
     crud.delete_question(db, question_id, current_user)
     return
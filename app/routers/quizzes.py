@@ -1,11 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from app.schemas import schemas
-from app.services import crud
+from app.services import crud, ownership, quiz_tree
 from app.db.session import get_db
 from app.core.security import get_current_user
 from app.models import models
+from app.utils.pagination import set_next_cursor
 
 router = APIRouter(prefix="/quizzes", tags=["quizzes"])
 
@@ -28,14 +29,41 @@ def get_quiz(
         raise HTTPException(status_code=404, detail="Quiz not found")
     return q
 
+@router.get("/{quiz_id}/full", response_model=schemas.QuizFullOut)
+def get_quiz_full(
+    quiz_id: int,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    current_user: Optional[models.User] = Depends(get_current_user)
+):
+    version = crud.get_quiz_version(db, quiz_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+    # no-cache: браузер хранит ответ, но перед использованием переспрашивает с If-None-Match
+    headers = {"ETag": quiz_tree.etag(quiz_id, version), "Cache-Control": "private, no-cache"}
+    if quiz_tree.etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    body = quiz_tree.tree_cache.get(quiz_id, version)
+    if body is None:
+        rendered = quiz_tree.render(db, quiz_id)
+        if rendered is None:
+            raise HTTPException(status_code=404, detail="Quiz not found")
+        version, body = rendered
+        headers["ETag"] = quiz_tree.etag(quiz_id, version)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @router.get("/", response_model=List[schemas.QuizOut])
 def list_quizzes(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: Optional[models.User] = Depends(get_current_user)
 ):
-    return crud.list_quizzes(db, skip=skip, limit=limit)
+    quizzes = crud.list_quizzes(db, skip=skip, limit=limit, cursor=cursor)
+    set_next_cursor(response, crud.QUIZZES_KEYSET, quizzes, limit)
+    return quizzes
 
 @router.put("/{quiz_id}", response_model=schemas.QuizOut)
 def update_quiz(
@@ -44,8 +72,7 @@ def update_quiz(
     db: Session = Depends(get_db),
     current_user: Optional[models.User] = Depends(get_current_user)
 ):
-    q = crud.get_quiz(db, quiz_id)
-    if not q:
+    if ownership.resolve_author(db, models.Quiz, quiz_id) is None:
         raise HTTPException(status_code=404, detail="Quiz not found")
     return crud.update_quiz(db, quiz_id, quiz_in, current_user)
 
@@ -55,8 +82,7 @@ def delete_quiz(
     db: Session = Depends(get_db),
     current_user: Optional[models.User] = Depends(get_current_user)
 ):
-    q = crud.get_quiz(db, quiz_id)
-    if not q:
+    if ownership.resolve_author(db, models.Quiz, quiz_id) is None:
         raise HTTPException(status_code=404, detail="Quiz not found")
     crud.delete_quiz(db, quiz_id, current_user)
     return
@@ -1,12 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 from app.schemas import schemas
-from app.services import crud
-from app.db.session import get_db
+from app.services import crud, crud_async, game_context
+from app.db.session import get_async_db, get_db
 from app.core.security import get_current_user_required
 from app.models import models
-from app.routers.websocket import manager
+from app.routers.websocket import announce_question
+from app.utils.pagination import set_next_cursor
 
 router = APIRouter(prefix="/sessions", tags=["sessions"])
 
@@ -20,21 +22,29 @@ def create_session(
 
 @router.get('/', response_model=List[schemas.SessionOut])
 def list_sessions(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user_required)
 ):
-    return crud.list_sessions(db, current_user, skip=skip, limit=limit)
+    sessions = crud.list_sessions(db, current_user, skip=skip, limit=limit, cursor=cursor)
+    set_next_cursor(response, crud.SESSIONS_KEYSET, sessions, limit)
+    return sessions
 
 @router.get('/ended', response_model=List[schemas.SessionOut])
 def list_ended_sessions(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user_required)
 ):
-    return crud.list_ended_sessions(db, current_user, skip=skip, limit=limit)
+    sessions = crud.list_ended_sessions(db, current_user, skip=skip, limit=limit, cursor=cursor)
+    set_next_cursor(response, crud.SESSIONS_KEYSET, sessions, limit)
+    return sessions
 
 @router.get('/{session_id}')
 def get_session(
@@ -79,34 +89,34 @@ def get_session_statistics(
         raise HTTPException(status_code=404, detail="Session statistics not found")
     return statistics
 
-@router.get('/{session_id}/current-question', response_model=schemas.QuestionOut)
+@router.get('/{session_id}/current-question', response_model=schemas.QuestionPublicOut)
 def get_current_question(
     session_id: int,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user_required)
 ):
-    question = crud.get_current_question(db, session_id, current_user)
-    if not question:
+    question_id = crud.get_current_question_id(db, session_id, current_user)
+    snapshot = game_context.get_question_snapshot(db, question_id) if question_id else None
+    if not snapshot:
         raise HTTPException(status_code=404, detail="No current question in this session")
-    return question
+    # Тот же снимок, что рассылается в question_available, уже закодированный
+    return Response(content=snapshot.frame, media_type="application/json")
 
 @router.post('/{session_id}/questions/next', response_model=schemas.QuestionOut)
 async def next_question(
     session_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user_required)
 ):
-    question = crud.set_next_question(db, session_id, current_user)
+    ctx = game_context.get_session_context(session_id)
+    question = await crud_async.set_next_question(
+        db, session_id, current_user,
+        question_ids=ctx.question_ids if ctx and not ctx.stale else None
+    )
     
-    session = crud.get_session(db, session_id, current_user)
+    # Сессия уже загружена в set_next_question и берется из identity map без запроса
+    session = await db.get(models.SessionGame, session_id)
     if session:
-        await manager.broadcast(
-            session.url,
-            {
-                "type": "question_available",
-                "question_id": question.id,
-                "session_id": session_id
-            }
-        )
+        await announce_question(session_id, session.url, question)
     
     return question
\ No newline at end of file
@@ -1,34 +1,107 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException, Query
-from typing import Dict, List, Optional
-from sqlalchemy.orm import Session
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
+import asyncio
 import logging
-from app.core.security import verify_token
-from app.services import crud
-from app.db.session import SessionLocal
+import time
+from app.core import metrics
+from app.core.security import user_id_from_token
+from app.services.auth_cache import auth_cache
+from app.services import crud_async, game_context
+from app.db.session import async_session_scope
 from app.models import models
 from app.core.config import settings
+from app.services.answer_progress import answer_progress
+from app.services.answer_writer import answer_buffer
+from app.services.connection_writer import ConnectionWriter
+from app.services.join_admission import join_admission
+from app.services.leaderboard import leaderboard
+from app.services.question_timer import question_timer
+from app.services.replay import ReplayBuffer
+from app.services.throttle import MessageThrottle, default_limits
+from app.utils.serialization import (
+    SUBPROTOCOL_JSON, SUBPROTOCOL_MSGPACK, dumps, json_frame_to_msgpack, msgpack_available, pack, unpack
+)
+from app.services.broadcast import BroadcastBackend, InMemoryBroadcastBackend, create_broadcast_backend
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 class ConnectionManager:
-    def __init__(self):
+    def __init__(self, backend: Optional[BroadcastBackend] = None):
         self.active_connections: Dict[str, List[WebSocket]] = {}
         self.connection_users: Dict[WebSocket, models.User] = {}
         self.webrtc_hosts: Dict[str, WebSocket] = {}  # session_url -> host websocket
         self.webrtc_viewers: Dict[str, List[WebSocket]] = {}  # session_url -> list of viewer websockets
+        self.writers: Dict[WebSocket, ConnectionWriter] = {}
+        self.binary_connections: Set[WebSocket] = set()  # сокеты с подпротоколом MessagePack
+        self.last_seen: Dict[WebSocket, float] = {}  # время последнего входящего сообщения (loop.time())
+        self.reaped_total = 0
+        self.last_sweep_reaped = 0
+        self.heartbeats_sent = 0
+        self.throttles: Dict[WebSocket, MessageThrottle] = {}
+        self.throttle_limits = default_limits()
+        self.throttled_total = 0
+        self.replay: Dict[str, ReplayBuffer] = {}  # session_url -> последние события сессии
+        self.empty_since: Dict[str, float] = {}  # сессии без сокетов на этом воркере -> с какого момента
+        self.pending_left: Dict[Tuple[str, int], Tuple[float, dict]] = {}  # (session_url, user_id) -> (время, player_left)
+        self.resumed_total = 0
+        self._sweeper: Optional[asyncio.Task] = None
+        self.backend = backend or InMemoryBroadcastBackend()
+        self.backend.set_deliver(self.deliver_local)
 
-    async def connect(self, session_url: str, websocket: WebSocket, user: models.User):
-        await websocket.accept()
+    async def connect(
+        self, session_url: str, websocket: WebSocket, user: models.User, binary: bool = False,
+        resume_epoch: Optional[str] = None, last_seq: Optional[int] = None
+    ) -> Optional[int]:
+        """Регистрация уже принятого сокета и подписка воркера на канал сессии.
+        При докачке возвращает число отправленных пропущенных событий, иначе None"""
+        self.empty_since.pop(session_url, None)
+        buffer = self.replay_buffer(session_url)
         self.active_connections.setdefault(session_url, []).append(websocket)
         self.connection_users[websocket] = user
+        if binary:
+            self.binary_connections.add(websocket)
+        self.touch(websocket)
+        self.throttles[websocket] = MessageThrottle(self.throttle_limits)
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.create_task(self._sweep_loop())
+        self.writers[websocket] = ConnectionWriter(
+            websocket,
+            max_size=settings.WS_SEND_QUEUE_SIZE,
+            policy=settings.WS_SLOW_CONSUMER_POLICY,
+            send_timeout=settings.WS_SEND_TIMEOUT,
+            on_failure=lambda ws: self._drop_connection(session_url, ws),
+        )
+        # Пропущенные события ставятся в очередь до первого await, чтобы новые рассылки пришли после них
+        replayed = None
+        if resume_epoch is not None and resume_epoch == buffer.epoch and last_seq is not None:
+            frames = buffer.since(last_seq)
+            if frames is not None:
+                for frame in frames:
+                    self._enqueue_frame([websocket], frame)
+                replayed = len(frames)
+                self.resumed_total += 1
+        await self.backend.subscribe(session_url)
+        return replayed
 
     def disconnect(self, session_url: str, websocket: WebSocket):
         conns = self.active_connections.get(session_url, [])
         if websocket in conns:
             conns.remove(websocket)
+        if not conns and session_url in self.active_connections:
+            del self.active_connections[session_url]
+            # Канал и буфер событий сохраняются WS_RESUME_GRACE секунд - участники могут вернуться
+            self.empty_since[session_url] = asyncio.get_running_loop().time()
         if websocket in self.connection_users:
             del self.connection_users[websocket]
+        self.binary_connections.discard(websocket)
+        self.last_seen.pop(websocket, None)
+        self.throttles.pop(websocket, None)
+        writer = self.writers.pop(websocket, None)
+        if writer is not None:
+            writer.close()
         # Удаляем из WebRTC структур
         if session_url in self.webrtc_hosts and self.webrtc_hosts[session_url] == websocket:
             viewers_count = len(self.webrtc_viewers.get(session_url, []))
@@ -40,13 +113,220 @@ class ConnectionManager:
                 viewers_count = len(self.webrtc_viewers[session_url])
                 logger.info(f"[WebRTC] Зритель отключен от сессии {session_url}. Осталось зрителей: {viewers_count}")
 
-    async def broadcast(self, session_url: str, message: dict):
-        conns = list(self.active_connections.get(session_url, []))
+    async def send_to_user(self, session_url: str, user_id: int, message: dict):
+        """Отправка сообщения всем сокетам пользователя в сессии на всех воркерах"""
+        await self.backend.publish(session_url, dumps(message), to_user_id=user_id)
+
+    def is_user_connected(self, session_url: str, user_id: int) -> bool:
+        return any(
+            self.connection_users.get(conn) is not None and self.connection_users[conn].id == user_id
+            for conn in self.active_connections.get(session_url, [])
+        )
+
+    def replay_buffer(self, session_url: str) -> ReplayBuffer:
+        buffer = self.replay.get(session_url)
+        if buffer is None:
+            buffer = self.replay[session_url] = ReplayBuffer(settings.WS_REPLAY_BUFFER_SIZE)
+        return buffer
+
+    def can_resume(self, session_url: str, epoch: Optional[str], last_seq: Optional[int]) -> bool:
+        """Можно ли вернуть клиенту пропущенные события вместо полного снимка сессии"""
+        if epoch is None or last_seq is None:
+            return False
+        buffer = self.replay.get(session_url)
+        return buffer is not None and buffer.epoch == epoch and buffer.since(last_seq) is not None
+
+    def defer_player_left(self, session_url: str, user_id: int, message: dict):
+        """player_left рассылается, только если участник не вернулся за WS_RESUME_GRACE"""
+        self.pending_left[(session_url, user_id)] = (asyncio.get_running_loop().time(), message)
+
+    def cancel_player_left(self, session_url: str, user_id: int) -> bool:
+        return self.pending_left.pop((session_url, user_id), None) is not None
+
+    async def announce_departures(self):
+        now = asyncio.get_running_loop().time()
+        expired = [
+            key for key, (since, _) in self.pending_left.items()
+            if now - since >= settings.WS_RESUME_GRACE
+        ]
+        for key in expired:
+            _, message = self.pending_left.pop(key)
+            session_url, user_id = key
+            if not self.is_user_connected(session_url, user_id):
+                await self.broadcast(session_url, message)
+
+    def allow_message(self, websocket: WebSocket, message_type: Optional[str]) -> bool:
+        """Проверка лимита входящих сообщений сокета; сверх лимита сообщение отбрасывается"""
+        throttle = self.throttles.get(websocket)
+        if throttle is None or throttle.allow(message_type):
+            return True
+        self.throttled_total += 1
+        return False
+
+    def touch(self, websocket: WebSocket):
+        self.last_seen[websocket] = asyncio.get_running_loop().time()
+
+    async def _sweep_loop(self):
+        # Одна задача на все сокеты воркера
+        interval = min(settings.WS_HEARTBEAT_INTERVAL, settings.WS_RESUME_GRACE)
+        while self.active_connections or self.empty_since or self.pending_left:
+            await asyncio.sleep(interval)
+            try:
+                self.sweep()
+                await self.announce_departures()
+            except Exception as e:
+                logger.error(f"Ошибка проверки простаивающих сокетов: {e}")
+
+    def sweep(self) -> int:
+        """Отключение сокетов, молчащих дольше WS_IDLE_TIMEOUT, и heartbeat остальным простаивающим"""
+        now = asyncio.get_running_loop().time()
+        stale = []
+        idle = []
+        for session_url, conns in self.active_connections.items():
+            for conn in conns:
+                silent = now - self.last_seen.get(conn, now)
+                if silent > settings.WS_IDLE_TIMEOUT:
+                    stale.append((session_url, conn))
+                elif silent >= settings.WS_HEARTBEAT_INTERVAL:
+                    idle.append(conn)
+        for session_url, conn in stale:
+            self._drop_connection(session_url, conn, code=1001, reason="Idle timeout")
+        if idle:
+            # Клиент отвечает на ping сообщением pong, которое обновляет last_seen
+            self._enqueue_frame(idle, dumps({"type": "ping"}))
+            self.heartbeats_sent += len(idle)
+        # Сессии, в которые никто не вернулся, теряют буфер событий и подписку на канал
+        abandoned = [
+            session_url for session_url, since in self.empty_since.items()
+            if now - since >= settings.WS_RESUME_GRACE
+        ]
+        for session_url in abandoned:
+            del self.empty_since[session_url]
+            self.replay.pop(session_url, None)
+            asyncio.ensure_future(self._unsubscribe_if_empty(session_url))
+        self.reaped_total += len(stale)
+        self.last_sweep_reaped = len(stale)
+        if stale:
+            logger.info(f"Отключено простаивающих сокетов: {len(stale)}")
+        return len(stale)
+
+    def stats(self) -> dict:
+        return {
+            "active_connections": len(self.connection_users),
+            "sessions": len(self.active_connections),
+            "reaped_total": self.reaped_total,
+            "last_sweep_reaped": self.last_sweep_reaped,
+            "heartbeats_sent": self.heartbeats_sent,
+            "throttled_total": self.throttled_total,
+            "replay_buffers": len(self.replay),
+            "resumed_total": self.resumed_total,
+            "pending_departures": len(self.pending_left)
+        }
+
+    def _drop_connection(self, session_url: str, websocket: WebSocket, code: int = 1013, reason: str = "Slow consumer"):
+        """Отключение сокета, который не успевает принимать сообщения или перестал отвечать"""
+        self.disconnect(session_url, websocket)
+        asyncio.ensure_future(self._close_quietly(websocket, code, reason))
+
+    async def _close_quietly(self, websocket: WebSocket, code: int, reason: str):
+        try:
+            await websocket.close(code=code, reason=reason)
+        except Exception:
+            pass
+
+    async def _unsubscribe_if_empty(self, session_url: str):
+        # За время ожидания в сессию мог зайти новый сокет
+        if self.active_connections.get(session_url):
+            return
+        try:
+            await self.backend.unsubscribe(session_url)
+        except Exception as e:
+            logger.warning(f"Не удалось отписаться от канала сессии {session_url}: {e}")
+
+    async def broadcast(self, session_url: str, message: dict, exclude_user_id: Optional[int] = None):
+        """Отправка сообщения всем участникам сессии на всех воркерах, кроме сокетов exclude_user_id"""
+        await self.backend.publish(session_url, dumps(message), exclude_user_id)
+
+    async def deliver_local(
+        self, session_url: str, frame: str, exclude_user_id: Optional[int] = None, to_user_id: Optional[int] = None
+    ):
+        """Постановка закодированного сообщения в очереди сокетов сессии этого воркера"""
+        if session_url not in self.active_connections and session_url not in self.empty_since:
+            return
+        started = time.perf_counter()
+        if to_user_id is not None:
+            # Личный кадр не попадает в общий буфер докачки - его получили бы и другие участники
+            conns = [conn for conn in self.active_connections.get(session_url, []) if self._user_id(conn) == to_user_id]
+        else:
+            # Событие получает номер и сохраняется для докачки переподключившимся клиентам
+            frame = self.replay_buffer(session_url).stamp(frame)
+            conns = [
+                conn for conn in self.active_connections.get(session_url, [])
+                if exclude_user_id is None or self._user_id(conn) != exclude_user_id
+            ]
+        self._enqueue_frame(conns, frame)
+        metrics.ws_broadcast_seconds.observe(time.perf_counter() - started)
+        metrics.ws_broadcast_recipients_total.inc(amount=len(conns))
+
+    def _user_id(self, websocket: WebSocket) -> Optional[int]:
+        user = self.connection_users.get(websocket)
+        return user.id if user is not None else None
+
+    def _enqueue_frame(self, conns: Iterable[WebSocket], frame: str):
+        # JSON-кадр перекодируется в MessagePack не более одного раза на рассылку
+        packed = None
+        pack_failed = False
         for conn in conns:
             try:
-                await conn.send_json(message)
-            except Exception:
-                self.disconnect(session_url, conn)
+                if conn in self.binary_connections:
+                    if pack_failed:
+                        continue
+                    if packed is None:
+                        packed = json_frame_to_msgpack(frame)
+                    self._enqueue(conn, packed)
+                else:
+                    self._enqueue(conn, frame)
+            except Exception as e:
+                # Кадр, который не удалось перекодировать или поставить в очередь, пропускается
+                # только для этого сокета - рассылка остальным и обработчик отправителя продолжают работу
+                if conn in self.binary_connections and packed is None:
+                    pack_failed = True
+                logger.warning(f"Не удалось поставить кадр в очередь сокета: {e}")
+
+    def encode(self, websocket: WebSocket, message: dict):
+        """Кадр в протоколе, согласованном с сокетом: MessagePack (bytes) или JSON (str)"""
+        if websocket in self.binary_connections:
+            return pack(message)
+        return dumps(message)
+
+    async def send_personal(self, websocket: WebSocket, message: dict):
+        """Отправка сообщения одному сокету с сохранением порядка относительно рассылок"""
+        if websocket in self.writers:
+            self._enqueue(websocket, self.encode(websocket, message))
+        else:
+            await self.send_direct(websocket, message)
+
+    async def send_direct(self, websocket: WebSocket, message: dict):
+        """Отправка в обход очереди (сокет еще не зарегистрирован или уже отключается)"""
+        frame = self.encode(websocket, message)
+        if isinstance(frame, bytes):
+            await websocket.send_bytes(frame)
+        else:
+            await websocket.send_text(frame)
+
+    def _enqueue(self, websocket: WebSocket, frame: str):
+        writer = self.writers.get(websocket)
+        if writer is not None:
+            writer.enqueue(frame)
+
+    async def close(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+        for writer in self.writers.values():
+            writer.close()
+        self.writers.clear()
+        await self.backend.close()
 
     def register_webrtc_host(self, session_url: str, websocket: WebSocket):
         """Регистрация источника WebRTC (ведущий)"""
@@ -67,32 +347,124 @@ class ConnectionManager:
     async def send_to_host(self, session_url: str, message: dict):
         """Отправка сообщения источнику"""
         if session_url in self.webrtc_hosts:
-            try:
-                await self.webrtc_hosts[session_url].send_json(message)
-            except Exception:
-                self.disconnect(session_url, self.webrtc_hosts[session_url])
+            host = self.webrtc_hosts[session_url]
+            self._enqueue(host, self.encode(host, message))
 
     async def send_to_viewers(self, session_url: str, message: dict):
         """Отправка сообщения всем зрителям"""
         if session_url in self.webrtc_viewers:
-            for viewer in list(self.webrtc_viewers[session_url]):
-                try:
-                    await viewer.send_json(message)
-                except Exception:
-                    self.disconnect(session_url, viewer)
+            self._enqueue_frame(list(self.webrtc_viewers[session_url]), dumps(message))
+
+manager = ConnectionManager(create_broadcast_backend())
+leaderboard.broadcast = manager.broadcast
+answer_progress.broadcast = manager.broadcast
+answer_progress.send_to_user = manager.send_to_user
+join_admission.broadcast = manager.broadcast
+metrics.registry.gauge_callback(
+    "quiz_ws_connections", "Открытые сокеты по сессиям", ("session",),
+    lambda: [((session_url,), len(conns)) for session_url, conns in manager.active_connections.items()]
+)
+metrics.registry.gauge_callback(
+    "quiz_ws_send_queue_messages", "Кадры в очередях отправки сокетов: всего и в самой длинной очереди", ("stat",),
+    lambda: [
+        (("total",), sum(writer.queue.qsize() for writer in manager.writers.values())),
+        (("max",), max((writer.queue.qsize() for writer in manager.writers.values()), default=0))
+    ]
+)
+
+async def ensure_context(db: AsyncSession, session_id: int) -> Optional[game_context.SessionContext]:
+    """Контекст игры; если он построен заново (перезапуск воркера, другой воркер),
+    таблица лидеров дополняется счетами из БД"""
+    existing = game_context.get_session_context(session_id)
+    ctx = await db.run_sync(game_context.ensure_session_context, session_id)
+    if ctx is not None and ctx is not existing:
+        await leaderboard.load(session_id, ctx.scores)
+    return ctx
+
+async def build_players_list(db: AsyncSession, session_id: int) -> List[dict]:
+    return [game_context.player_payload(player, username) for player, username in await crud_async.get_session_roster(db, session_id)]
+
+async def announce_question(session_id: int, session_url: str, question: models.Question):
+    """Рассылка нового вопроса со снимком и запуск его таймера"""
+    # Снимок вопроса рассылается вместе с событием - клиентам не нужен REST-запрос
+    snapshot = game_context.question_snapshot(question)
+    await answer_progress.reset_question(session_url, session_id, question.id)
+    await manager.broadcast(session_url, {
+        "type": "question_available",
+        "question_id": question.id,
+        "session_id": session_id,
+        "question": snapshot.data
+    })
+    await question_timer.open_question(session_id, session_url, question.id, snapshot.data["time_limit"])
 
-manager = ConnectionManager()
+async def on_question_closed(session_id: int, session_url: str, question_id: int, results: dict):
+    ctx = game_context.get_session_context(session_id)
+    key = ctx.questions.get(question_id) if ctx else None
+    await manager.broadcast(session_url, {
+        "type": "question_closed",
+        "session_id": session_id,
+        "question_id": question_id,
+        "correct_answer_ids": [answer_id for answer_id, correct in key.answers.items() if correct] if key else [],
+        **results
+    })
 
-async def get_user_from_token(token: Optional[str], db: Session) -> Optional[models.User]:
+async def on_question_advance(session_id: int, session_url: str, question_id: int):
+    """Автопереход по истечении времени вопроса (QUESTION_AUTO_ADVANCE)"""
+    async with async_session_scope() as db:
+        session = await db.get(models.SessionGame, session_id)
+        if not session or session.status != "active" or session.current_question_id != question_id:
+            return
+        ctx = await ensure_context(db, session_id)
+        try:
+            question = await crud_async.advance_question(db, session, question_ids=ctx.question_ids if ctx else None)
+        except HTTPException:
+            # Вопросы закончились - игру завершает хост
+            return
+    await announce_question(session_id, session_url, question)
+
+question_timer.on_close = on_question_closed
+question_timer.on_advance = on_question_advance
+
+def session_info_payload(session: models.SessionGame) -> dict:
+    return {
+        "id": session.id,
+        "quiz_id": session.quiz_id,
+        "url": session.url,
+        "status": session.status,
+        "started_at": session.started_at.isoformat() if session.started_at else None,
+        "ended_at": session.ended_at.isoformat() if session.ended_at else None,
+        "current_question_id": session.current_question_id
+    }
+
+async def build_join_state(db: AsyncSession, session: models.SessionGame, is_host: bool, players: Optional[List[dict]] = None) -> dict:
+    """Полный снимок сессии для входа без докачки: текущий вопрос, сведения о сессии и список игроков"""
+    # Игроку, зашедшему во время вопроса, вопрос отправляется сразу, без запроса по REST
+    current_question = None
+    if not is_host and session.status == "active" and session.current_question_id:
+        snapshot = await db.run_sync(game_context.get_question_snapshot, session.current_question_id)
+        current_question = snapshot.data if snapshot else None
+    return {
+        "session_status": session.status,
+        "current_question_id": session.current_question_id,
+        "current_question": current_question,
+        "session_info": session_info_payload(session),
+        # Список игроков отправляем всем участникам (и хосту, и игрокам)
+        "players": players if players is not None else await build_players_list(db, session.id)
+    }
+
+async def get_user_from_token(token: Optional[str], db: AsyncSession) -> Optional[models.User]:
     if not token:
         return None
     
     try:
-        payload = verify_token(token)
-        user_id: str = payload.get("sub")
+        user_id = user_id_from_token(token)
         if user_id is None:
             return None
-        user = crud.get_user(db, user_id=int(user_id))
+        user = auth_cache.get_user(user_id)
+        if user is None:
+            user = await crud_async.get_user(db, user_id=user_id)
+            if user is not None:
+                auth_cache.remember_user(user)
         return user
     except Exception:
         return None
@@ -101,107 +473,146 @@ async def get_user_from_token(token: Optional[str], db: Session) -> Optional[mod
 async def websocket_endpoint(
     websocket: WebSocket, 
     session_url: str,
-    token: Optional[str] = Query(None)
+    token: Optional[str] = Query(None),
+    last_seq: Optional[int] = Query(None),
+    epoch: Optional[str] = Query(None)
 ):
-    await websocket.accept()
+    # Протокол согласуется заголовком Sec-WebSocket-Protocol; по умолчанию JSON-текст
+    offered = websocket.scope.get("subprotocols", [])
+    binary = SUBPROTOCOL_MSGPACK in offered and msgpack_available()
+    if binary:
+        await websocket.accept(subprotocol=SUBPROTOCOL_MSGPACK)
+    elif SUBPROTOCOL_JSON in offered:
+        await websocket.accept(subprotocol=SUBPROTOCOL_JSON)
+    else:
+        await websocket.accept()
     
-    db = SessionLocal()
-    try:
+    # Соединение с БД берется из пула только на время отдельной операции,
+    # а не на все время жизни сокета; запросы асинхронные и не блокируют event loop
+    async with async_session_scope() as db:
         user = await get_user_from_token(token, db)
-        if not user:
-            await websocket.close(code=1008, reason="Authentication required")
-            return
-        
-        session = db.query(models.SessionGame).filter(
-            models.SessionGame.url == session_url
-        ).first()
-        
-        if not session:
-            await websocket.close(code=1008, reason="Session not found")
+        if user is not None and user in db:
+            # Пользователь нужен до конца соединения - отвязываем его от сессии БД
+            db.expunge(user)
+    if not user:
+        await websocket.close(code=1008, reason="Authentication required")
+        return
+    
+    # Клиент, вернувшийся после разрыва, получает только пропущенные события,
+    # если они еще есть в буфере сессии; тогда полный снимок не собирается
+    resume = manager.can_resume(session_url, epoch, last_seq)
+    
+    async with async_session_scope() as db:
+        session = await crud_async.get_session_by_url(db, session_url)
+    
+    if not session:
+        await websocket.close(code=1008, reason="Session not found")
+        return
+    
+    session_id = session.id
+    host_id = session.host_id
+    is_host = host_id == user.id
+    
+    # Игрок создается через очередь входа: при наплыве подключений одна пачка запросов
+    # на всех, и список игроков сессии читается один раз на пачку
+    session_player = None
+    players_data = None
+    if not is_host:
+        try:
+            session_player, _, players_data = await join_admission.admit(session_id, user, roster=not resume)
+        except Exception as e:
+            logger.error(f"Не удалось добавить пользователя {user.id} в сессию {session_id}: {e}")
+            await websocket.close(code=1011, reason="Failed to join session")
             return
+    
+    ctx = game_context.get_session_context(session_id)
+    joined_running_game = ctx is not None and session_player is not None
+    if joined_running_game:
+        ctx.add_player(session_player.id, user.id, session_player.score)
+        session_player_id = session_player.id
+    
+    session_status = session.status
+    current_question_id = session.current_question_id
+    player_score = game_context.player_score(session_player) if session_player else 0
+    joined_player = game_context.player_payload(session_player, user.username) if session_player else None
+    join_state = None
+    if not resume:
+        async with async_session_scope() as db:
+            join_state = await build_join_state(db, session, is_host, players_data)
+    
+    try:
+        replayed = await manager.connect(
+            session_url, websocket, user, binary=binary,
+            resume_epoch=epoch if resume else None, last_seq=last_seq
+        )
+        if joined_running_game:
+            await leaderboard.add_player(session_id, session_player_id)
         
-        is_host = session.host_id == user.id
-        
-        session_player = None
-        if not is_host:
-            session_player = db.query(models.SessionPlayer).filter(
-            models.SessionPlayer.session_id == session.id,
-            models.SessionPlayer.user_id == user.id
-            ).first()
-            
-            if not session_player:
-                session_player = models.SessionPlayer(
-                session_id=session.id,
-                user_id=user.id,
-                nickname=user.username,
-                score=0
-            )
-            db.add(session_player)
-            db.commit()
-            db.refresh(session_player)
-        
-        manager.active_connections.setdefault(session_url, []).append(websocket)
-        manager.connection_users[websocket] = user
-        
-        await websocket.send_json({
-            "type": "session_joined",
-            "session_id": session.id,
-            "user_id": user.id,
-            "is_host": is_host,
-            "session_status": session.status,
-            "current_question_id": session.current_question_id,
-            "player_score": session_player.score if session_player else 0
-        })
-        
-        if not is_host and session.status == "active" and session.current_question_id:
-            await websocket.send_json({
-                "type": "question_available",
-                "question_id": session.current_question_id,
-                "session_id": session.id
+        buffer = manager.replay_buffer(session_url)
+        if replayed is not None:
+            # Пропущенные события уже в очереди сокета; клиент сохраняет свое состояние
+            await manager.send_personal(websocket, {
+                "type": "session_resumed",
+                "session_id": session_id,
+                "user_id": user.id,
+                "is_host": is_host,
+                "epoch": buffer.epoch,
+                "last_seq": buffer.seq,
+                "replayed": replayed,
+                "player_score": player_score
             })
-        
-        if is_host:
-            await websocket.send_json({
-                "type": "session_info",
-                "session": {
-                    "id": session.id,
-                    "quiz_id": session.quiz_id,
-                    "url": session.url,
-                    "status": session.status,
-                    "started_at": session.started_at.isoformat() if session.started_at else None,
-                    "ended_at": session.ended_at.isoformat() if session.ended_at else None,
-                    "current_question_id": session.current_question_id
-                }
+        else:
+            if join_state is None:
+                # Буфер сменился, пока шла проверка пользователя - нужен полный снимок
+                async with async_session_scope() as db:
+                    session = await crud_async.get_session_by_url(db, session_url)
+                    join_state = await build_join_state(db, session, is_host)
+            session_status = join_state["session_status"]
+            current_question_id = join_state["current_question_id"]
+            
+            await manager.send_personal(websocket, {
+                "type": "session_joined",
+                "session_id": session_id,
+                "user_id": user.id,
+                "is_host": is_host,
+                "session_status": session_status,
+                "current_question_id": current_question_id,
+                "player_score": player_score,
+                "epoch": buffer.epoch,
+                "last_seq": buffer.seq
             })
-        
-        # Отправляем список игроков всем участникам (и хосту, и игрокам)
-        players = db.query(models.SessionPlayer).filter(
-            models.SessionPlayer.session_id == session.id
-        ).all()
-        players_data = []
-        for player in players:
-            player_user = db.query(models.User).filter(models.User.id == player.user_id).first()
-            players_data.append({
-                "id": player.id,
-                "user_id": player.user_id,
-                "nickname": player.nickname or (player_user.username if player_user else None),
-                "username": player_user.username if player_user else None,
-                "score": player.score or 0
+            
+            if not is_host and session_status == "active" and current_question_id:
+                await manager.send_personal(websocket, {
+                    "type": "question_available",
+                    "question_id": current_question_id,
+                    "session_id": session_id,
+                    "question": join_state["current_question"]
+                })
+            
+            if is_host:
+                await manager.send_personal(websocket, {
+                    "type": "session_info",
+                    "session": join_state["session_info"]
+                })
+            
+            await manager.send_personal(websocket, {
+                "type": "players_list",
+                "players": join_state["players"]
             })
-        await websocket.send_json({
-            "type": "players_list",
-            "players": players_data
-        })
         
-        await manager.broadcast(session_url, {
-            "type": "players_updated",
-            "message": f"Player {user.username} joined"
-        })
+        # Остальным участникам отправляется только изменение состава (пачкой players_joined);
+        # участник, вернувшийся до рассылки player_left, для них и не уходил
+        if joined_player and not manager.cancel_player_left(session_url, user.id):
+            join_admission.announce(session_url, joined_player)
         
         try:
             while True:
                 try:
-                    data = await websocket.receive_json()
+                    if binary:
+                        data = unpack(await websocket.receive_bytes())
+                    else:
+                        data = await websocket.receive_json()
                 except WebSocketDisconnect:
                     # Нормальное отключение - выходим из цикла
                     break
@@ -215,46 +626,46 @@ async def websocket_endpoint(
                     print(f"Ошибка при получении сообщения: {e}")
                     continue
                 
+                manager.touch(websocket)
                 message_type = data.get("type")
+                if not manager.allow_message(websocket, message_type):
+                    continue
                 
                 if message_type == "ping":
-                    await websocket.send_json({"type": "pong"})
+                    await manager.send_personal(websocket, {"type": "pong"})
+                elif message_type == "pong":
+                    pass  # Ответ на heartbeat сервера, last_seen уже обновлен
                 elif message_type == "get_session_info" and is_host:
-                    await websocket.send_json({
+                    async with async_session_scope() as db:
+                        session_info = session_info_payload(await db.get(models.SessionGame, session_id))
+                    await manager.send_personal(websocket, {
                         "type": "session_info",
-                        "session": {
-                            "id": session.id,
-                            "quiz_id": session.quiz_id,
-                            "url": session.url,
-                            "status": session.status,
-                            "started_at": session.started_at.isoformat() if session.started_at else None,
-                            "ended_at": session.ended_at.isoformat() if session.ended_at else None,
-                            "current_question_id": session.current_question_id
-                        }
+                        "session": session_info
+                    })
+                elif message_type == "get_leaderboard":
+                    top = await leaderboard.top(session_id)
+                    ctx = game_context.get_session_context(session_id)
+                    own_player_id = ctx.player_ids.get(user.id) if ctx and not is_host else None
+                    await manager.send_personal(websocket, {
+                        "type": "leaderboard",
+                        "session_id": session_id,
+                        "top": [
+                            {"player_id": player_id, "rank": index + 1, "score": score}
+                            for index, (player_id, score) in enumerate(top)
+                        ],
+                        "rank": await leaderboard.rank(session_id, own_player_id) if own_player_id else None
                     })
                 elif message_type == "get_players_list":
                     try:
                         # Разрешаем получение списка игроков всем участникам сессии
-                        players = db.query(models.SessionPlayer).filter(
-                            models.SessionPlayer.session_id == session.id
-                        ).all()
-                        players_data = []
-                        for player in players:
-                            player_user = db.query(models.User).filter(models.User.id == player.user_id).first()
-                            players_data.append({
-                                "id": player.id,
-                                "user_id": player.user_id,
-                                "nickname": player.nickname or (player_user.username if player_user else None),
-                                "username": player_user.username if player_user else None,
-                                "score": player.score or 0
-                            })
-                        await websocket.send_json({
+                        async with async_session_scope() as db:
+                            players_data = await build_players_list(db, session_id)
+                        await manager.send_personal(websocket, {
                             "type": "players_list",
                             "players": players_data
                         })
                     except Exception as e:
-                        db.rollback()
-                        await websocket.send_json({
+                        await manager.send_personal(websocket, {
                             "type": "error",
                             "message": f"Ошибка при получении списка игроков: {str(e)}"
                         })
@@ -269,254 +680,229 @@ async def websocket_endpoint(
                             "text": text
                         })
                     elif len(text) > 500:
-                        await websocket.send_json({
+                        await manager.send_personal(websocket, {
                             "type": "error",
                             "message": "Сообщение слишком длинное (максимум 500 символов)"
                         })
                 elif message_type == "submit_answer":
                     try:
                         if is_host:
-                            await websocket.send_json({
+                            await manager.send_personal(websocket, {
                                 "type": "error",
                                 "message": "Хост не может отправлять ответы"
                             })
                             continue
                         
-                        session_player = db.query(models.SessionPlayer).filter(
-                            models.SessionPlayer.session_id == session.id,
-                            models.SessionPlayer.user_id == user.id
-                        ).first()
-                        
-                        if not session_player:
-                            session_player = models.SessionPlayer(
-                                session_id=session.id,
-                                user_id=user.id,
-                                nickname=user.username,
-                                score=0
-                            )
-                            db.add(session_player)
-                            db.commit()
-                            db.refresh(session_player)
-                            
-                            await manager.broadcast(session_url, {
-                                "type": "players_updated",
-                                "message": f"Player {user.username} joined"
-                            })
-                        
                         question_id = data.get("question_id")
                         answer_id = data.get("answer_id")
                         text_answer = data.get("text_answer")
                         
                         if not question_id:
-                            await websocket.send_json({
+                            await manager.send_personal(websocket, {
                                 "type": "error",
                                 "message": "ID вопроса не указан"
                             })
                             continue
                         
-                        question = db.query(models.Question).filter(
-                            models.Question.id == question_id,
-                            models.Question.quiz_id == session.quiz_id
-                        ).first()
+                        # Ключи ответов, игроки и их счет берутся из контекста игры в памяти,
+                        # БД читается только если контекста нет или квиз изменили
+                        ctx = game_context.get_session_context(session_id)
+                        new_player = None
+                        if ctx is None or ctx.stale or user.id not in ctx.player_ids:
+                            async with async_session_scope() as db:
+                                ctx = await ensure_context(db, session_id)
+                            if user.id not in ctx.player_ids:
+                                session_player, created, _ = await join_admission.admit(session_id, user, roster=False)
+                                if created:
+                                    new_player = game_context.player_payload(session_player, user.username)
+                                ctx.add_player(session_player.id, user.id, session_player.score)
+                        
+                        if new_player:
+                            joined_player = new_player
+                            join_admission.announce(session_url, new_player)
+                        
+                        session_player_id = ctx.player_ids[user.id]
+                        question = ctx.questions.get(question_id)
                         
                         if not question:
-                            await websocket.send_json({
+                            await manager.send_personal(websocket, {
                                 "type": "error",
                                 "message": "Вопрос не найден"
                             })
                             continue
                         
-                        is_correct = None
-                        if answer_id:
-                            # Для тестовых вопросов проверяем правильность выбранного ответа
-                            answer = db.query(models.Answer).filter(
-                                models.Answer.id == answer_id,
-                                models.Answer.question_id == question_id
-                            ).first()
-                            if answer:
-                                is_correct = answer.is_correct
-                        elif text_answer:
-                            # Для открытых вопросов проверяем, есть ли правильный ответ в базе
-                            # Если есть правильные ответы, сравниваем с ними (регистронезависимо)
-                            correct_answers = db.query(models.Answer).filter(
-                                models.Answer.question_id == question_id,
-                                models.Answer.is_correct == True
-                            ).all()
-                            if correct_answers:
-                                # Сравниваем текст ответа с правильными ответами
-                                text_answer_normalized = text_answer.strip().lower()
-                                is_correct = any(
-                                    ans.text.strip().lower() == text_answer_normalized 
-                                    for ans in correct_answers
-                                )
-                            else:
-                                # Если нет правильных ответов в базе, считаем ответ неправильным
-                                is_correct = False
+                        # Вариант проверяется по ключу вопроса в памяти: чужой id не попадет в пачку записи
+                        if not answer_id:
+                            answer_id = None
+                        elif answer_id not in question.answers:
+                            await manager.send_personal(websocket, {
+                                "type": "error",
+                                "message": "Вариант ответа не найден"
+                            })
+                            continue
                         
-                        existing_answer = db.query(models.PlayerAnswer).filter(
-                            models.PlayerAnswer.session_player_id == session_player.id,
-                            models.PlayerAnswer.question_id == question_id
-                        ).first()
+                        # Проверка дедлайна по таймеру сервера, без обращения к БД
+                        if not question_timer.accepts(session_id, question_id):
+                            await manager.send_personal(websocket, {
+                                "type": "error",
+                                "message": "Время на ответ истекло"
+                            })
+                            continue
                         
-                        if existing_answer:
-                            await websocket.send_json({
+                        if (session_player_id, question_id) in ctx.answered:
+                            await manager.send_personal(websocket, {
                                 "type": "error",
                                 "message": "Вы уже отправили ответ на этот вопрос"
                             })
                             continue
                         
-                        player_answer = models.PlayerAnswer(
-                            session_player_id=session_player.id,
-                            question_id=question_id,
-                            answer_id=answer_id,
-                            text_answer=text_answer,
-                            is_correct=is_correct
-                        )
-                        db.add(player_answer)
+                        is_correct = question.check(answer_id, text_answer)
+                        # Отмечаем ответ до записи в БД, чтобы повторная отправка не прошла
+                        ctx.answered.add((session_player_id, question_id))
+                        question_timer.record_answer(session_id, question_id, answer_id, is_correct)
+                        metrics.answers_total.inc("correct" if is_correct is True else "wrong" if is_correct is False else "unchecked")
                         
                         question_score = None
                         # Начисляем баллы только если ответ правильный (is_correct == True)
                         if is_correct is True:
-                            # Используем score вопроса, если он задан, иначе 1 по умолчанию
-                            question_score = question.score if question.score is not None else 1
-                            old_score = session_player.score or 0
-                            session_player.score = old_score + question_score
-                            db.add(session_player)
-                            print(f"Начислено {question_score} баллов игроку {session_player.id}. Старый счет: {old_score}, новый счет: {session_player.score}")
+                            question_score = question.score
+                            old_score = ctx.scores[session_player_id]
+                            ctx.scores[session_player_id] = old_score + question_score
+                            logger.debug(f"Начислено {question_score} баллов игроку {session_player_id}. Старый счет: {old_score}, новый счет: {ctx.scores[session_player_id]}")
                         elif is_correct is None:
-                            print(f"Предупреждение: is_correct = None для вопроса {question_id}, ответа {answer_id}, текста '{text_answer}'")
+                            logger.warning(f"is_correct = None для вопроса {question_id}, ответа {answer_id}, текста '{text_answer}'")
                         
-                        db.commit()
-                        db.refresh(session_player)
+                        # Запись в БД отложенная и пакетная, игрок получает ответ сразу
+                        answer_buffer.add({
+                            "session_player_id": session_player_id,
+                            "question_id": question_id,
+                            "answer_id": answer_id,
+                            "text_answer": text_answer,
+                            "is_correct": is_correct,
+                            "answered_at": datetime.utcnow()
+                        }, score_delta=question_score or 0)
+                        if question_score:
+                            await leaderboard.increment(
+                                session_id, session_url, session_player_id,
+                                question_score, ctx.scores[session_player_id]
+                            )
                         
-                        await websocket.send_json({
+                        await manager.send_personal(websocket, {
                             "type": "answer_submitted",
                             "question_id": question_id,
                             "is_correct": is_correct,
                             "score": question_score if is_correct else None,
-                            "total_score": session_player.score or 0
+                            "total_score": ctx.scores[session_player_id],
+                            "rank": await leaderboard.rank(session_id, session_player_id)
                         })
                         
-                        await manager.broadcast(session_url, {
-                            "type": "answer_received",
-                            "user_id": user.id,
-                                "username": user.username,
-                                "question_id": question_id
-                            })
+                        # Вместо рассылки на каждый ответ (N^2 кадров на вопрос) -
+                        # один answers_progress на окно ANSWER_PROGRESS_WINDOW_MS
+                        answer_progress.add(session_url, session_id, host_id, question_id, user.id)
                         
                     except Exception as e:
-                        db.rollback()
-                        await websocket.send_json({
+                        await manager.send_personal(websocket, {
                             "type": "error",
                             "message": f"Ошибка при сохранении ответа: {str(e)}"
                     })
                 elif message_type == "start_game" and is_host:
                     try:
-                        session.status = "active"
-                        db.add(session)
-                        db.commit()
-                        db.refresh(session)
+                        async with async_session_scope() as db:
+                            session = await crud_async.set_session_status(db, session_id, "active")
+                            session_status = session.status
+                            # Вопросы, ключи ответов и игроки загружаются один раз на игру
+                            ctx = await db.run_sync(game_context.build_session_context, session)
+                            players_data = await build_players_list(db, session_id)
+                        await leaderboard.load(session_id, ctx.scores)
                         await manager.broadcast(session_url, {
                             "type": "game_started",
-                            "session_id": session.id
+                            "session_id": session_id
                         })
-                        await websocket.send_json({
+                        await manager.send_personal(websocket, {
                             "type": "status_updated",
-                            "status": session.status
+                            "status": session_status
                         })
-                        players = db.query(models.SessionPlayer).filter(
-                            models.SessionPlayer.session_id == session.id
-                        ).all()
-                        players_data = []
-                        for player in players:
-                            player_user = db.query(models.User).filter(models.User.id == player.user_id).first()
-                            players_data.append({
-                                "id": player.id,
-                                "user_id": player.user_id,
-                                "nickname": player.nickname or (player_user.username if player_user else None),
-                                "username": player_user.username if player_user else None,
-                                "score": player.score or 0
-                            })
-                        await websocket.send_json({
+                        await manager.send_personal(websocket, {
                             "type": "players_list",
                             "players": players_data
                         })
                     except Exception as e:
-                        db.rollback()
-                        await websocket.send_json({
+                        await manager.send_personal(websocket, {
                             "type": "error",
                             "message": f"Ошибка при запуске игры: {str(e)}"
                         })
                 elif message_type == "pause_game" and is_host:
                     try:
-                        session.status = "paused"
-                        db.add(session)
-                        db.commit()
-                        db.refresh(session)
+                        async with async_session_scope() as db:
+                            session = await crud_async.set_session_status(db, session_id, "paused")
+                            session_status = session.status
                         await manager.broadcast(session_url, {
                             "type": "game_paused",
-                            "session_id": session.id
+                            "session_id": session_id
                         })
-                        await websocket.send_json({
+                        await manager.send_personal(websocket, {
                             "type": "status_updated",
-                            "status": session.status
+                            "status": session_status
                         })
                     except Exception as e:
-                        db.rollback()
-                        await websocket.send_json({
+                        await manager.send_personal(websocket, {
                             "type": "error",
                             "message": f"Ошибка при паузе игры: {str(e)}"
                         })
                 elif message_type == "next_question" and is_host:
                     try:
-                        question = crud.set_next_question(db, session.id, user)
-                        db.refresh(session)
-                        await manager.broadcast(session_url, {
-                            "type": "question_available",
-                            "question_id": question.id,
-                            "session_id": session.id
-                        })
-                        await websocket.send_json({
+                        async with async_session_scope() as db:
+                            ctx = await ensure_context(db, session_id)
+                            question = await crud_async.set_next_question(
+                                db, session_id, user,
+                                question_ids=ctx.question_ids if ctx else None
+                            )
+                            question_id = question.id
+                        await announce_question(session_id, session_url, question)
+                        await manager.send_personal(websocket, {
                             "type": "question_sent",
-                            "question_id": question.id
+                            "question_id": question_id
                         })
                     except Exception as e:
-                        db.rollback()
-                        await websocket.send_json({
+                        await manager.send_personal(websocket, {
                             "type": "error",
                             "message": f"Ошибка при переходе к следующему вопросу: {str(e)}"
                         })
                 elif message_type == "end_game" and is_host:
                     try:
-                        session.status = "ended"
-                        db.add(session)
-                        db.commit()
-                        db.refresh(session)
+                        # Все отложенные ответы и баллы должны попасть в БД до завершения игры
+                        await answer_buffer.flush()
+                        async with async_session_scope() as db:
+                            session = await crud_async.set_session_status(db, session_id, "ended")
+                            session_status = session.status
+                        game_context.drop_session_context(session_id)
+                        await leaderboard.clear(session_id)
+                        await answer_progress.clear(session_url)
+                        question_timer.clear(session_id)
                         await manager.broadcast(session_url, {
                             "type": "game_ended",
-                            "session_id": session.id
+                            "session_id": session_id
                         })
-                        await websocket.send_json({
+                        await manager.send_personal(websocket, {
                             "type": "status_updated",
-                            "status": session.status
+                            "status": session_status
                         })
                     except Exception as e:
-                        db.rollback()
-                        await websocket.send_json({
+                        await manager.send_personal(websocket, {
                             "type": "error",
                             "message": f"Ошибка при завершении игры: {str(e)}"
                         })
                 elif message_type == "webrtc_register_host" and is_host:
                     # Регистрация источника WebRTC (ведущий)
                     manager.register_webrtc_host(session_url, websocket)
-                    await websocket.send_json({
+                    await manager.send_personal(websocket, {
                         "type": "webrtc_host_registered",
                         "session_url": session_url
                     })
                 elif message_type == "webrtc_register_viewer" and not is_host:
                     # Регистрация зрителя WebRTC
                     manager.register_webrtc_viewer(session_url, websocket)
-                    await websocket.send_json({
+                    await manager.send_personal(websocket, {
                         "type": "webrtc_viewer_registered",
                         "session_url": session_url
                     })
@@ -581,20 +967,17 @@ async def websocket_endpoint(
             # Обработка любых других ошибок
             print(f"Необработанная ошибка в WebSocket: {e}")
             try:
-                db.rollback()
-            except Exception:
-                pass
-            try:
-                await websocket.send_json({
+                await manager.send_direct(websocket, {
                     "type": "error",
                     "message": f"Произошла ошибка: {str(e)}"
                 })
             except Exception:
                 pass  # Если WebSocket уже закрыт, игнорируем
-            manager.disconnect(session_url, websocket)
-            await manager.broadcast(session_url, {
-                "type": "players_updated",
-                "message": f"Player {user.username} left"
-            })
     finally:
-        db.close()
+        manager.disconnect(session_url, websocket)
+        if joined_player and not manager.is_user_connected(session_url, user.id):
+            manager.defer_player_left(session_url, user.id, {
+                "type": "player_left",
+                "player_id": joined_player["id"],
+                "user_id": user.id
+            })
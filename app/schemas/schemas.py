@@ -94,6 +94,27 @@ class QuestionOut(BaseModel):
     class Config:
         model_config = {"from_attributes": True}
 
+class QuizFullOut(QuizOut):
+    """Квиз со всеми вопросами, ответами и медиа (GET /api/quizzes/{id}/full)"""
+    version: int
+    questions: List[QuestionOut] = []
+
+class AnswerPublicOut(BaseModel):
+    id: int
+    text: str
+
+class QuestionPublicOut(BaseModel):
+    """Вопрос для игроков: без признака правильности ответов"""
+    id: int
+    text: Optional[str]
+    type: str
+    time_limit: Optional[int]
+    order_index: int
+    media_id: Optional[int]
+    score: Optional[int] = None
+    media: Optional[MediaOut] = None
+    answers: List[AnswerPublicOut] = []
+
 class QuestionUpdate(BaseModel):
     text: Optional[str] = None
     type: Optional[str] = None
@@ -0,0 +1,124 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import redis
+import redis.asyncio as aioredis
+
+from app.core.config import settings
+from app.db.redis import get_async_redis
+
+logger = logging.getLogger(__name__)
+
+Broadcast = Callable[[str, dict, Optional[int]], Awaitable[None]]
+SendToUser = Callable[[str, int, dict], Awaitable[None]]
+
+
+class AnswerProgress:
+    """Сбор событий «игрок ответил» за окно window: вместо кадра на каждый ответ
+    в комнату уходит один answers_progress, а хост вместо него получает тот же кадр с id ответивших.
+
+    Ответы на вопрос принимают разные воркеры, поэтому общее число ответивших считается
+    в Redis (INCRBY на окно); без Redis - только ответы этого воркера"""
+
+    KEY_PREFIX = "answers_progress:"
+    # Счетчик нужен, пока вопрос открыт; ключ брошенной игры удалится сам
+    COUNT_TTL = 6 * 3600
+
+    def __init__(self, client: Optional[aioredis.Redis], window: float):
+        self.client = client
+        self.window = window
+        self.broadcast: Optional[Broadcast] = None
+        self.send_to_user: Optional[SendToUser] = None
+        self.pending: Dict[Tuple[str, int, int], List[int]] = {}  # (session_url, session_id, question_id) -> user_id
+        self.counts: Dict[Tuple[str, int, int], int] = {}  # ответов на вопрос на этом воркере
+        self.hosts: Dict[str, int] = {}  # session_url -> user_id хоста
+        self._task: Optional[asyncio.Task] = None
+
+    def add(self, session_url: str, session_id: int, host_id: int, question_id: int, user_id: int) -> None:
+        key = (session_url, session_id, question_id)
+        self.pending.setdefault(key, []).append(user_id)
+        self.counts[key] = self.counts.get(key, 0) + 1
+        self.hosts[session_url] = host_id
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        # Одна задача на все сессии: раз в window рассылается накопленный прогресс
+        while self.pending:
+            await asyncio.sleep(self.window)
+            pending, self.pending = self.pending, {}
+            for key, user_ids in pending.items():
+                try:
+                    await self.publish(key, user_ids)
+                except Exception as e:
+                    logger.error(f"Ошибка рассылки прогресса ответов сессии {key[0]}: {e}")
+
+    def redis_key(self, session_id: int, question_id: int) -> str:
+        return f"{self.KEY_PREFIX}{session_id}:{question_id}"
+
+    async def total(self, key: Tuple[str, int, int], new: int) -> int:
+        """Число ответивших на вопрос на всех воркерах вместе с new ответами этого окна"""
+        _, session_id, question_id = key
+        if self.client is not None:
+            try:
+                pipe = self.client.pipeline(transaction=False)
+                pipe.incrby(self.redis_key(session_id, question_id), new)
+                pipe.expire(self.redis_key(session_id, question_id), self.COUNT_TTL)
+                count, _ = await pipe.execute()
+                return int(count)
+            except (redis.ConnectionError, redis.TimeoutError) as e:
+                logger.warning(f"Redis error during answers progress count: {e}")
+        return self.counts.get(key, new)
+
+    async def publish(self, key: Tuple[str, int, int], user_ids: List[int]) -> None:
+        session_url, session_id, question_id = key
+        message = {
+            "type": "answers_progress",
+            "session_id": session_id,
+            "question_id": question_id,
+            "count": await self.total(key, len(user_ids)),
+            "new": len(user_ids)
+        }
+        host_id = self.hosts.get(session_url)
+        if self.broadcast is not None:
+            await self.broadcast(session_url, message, host_id)
+        if host_id is not None and self.send_to_user is not None:
+            await self.send_to_user(session_url, host_id, {**message, "user_ids": user_ids})
+
+    async def reset_question(self, session_url: str, session_id: int, question_id: int) -> None:
+        """Счет ответов заново: вопрос открывается (в том числе повторно)"""
+        key = (session_url, session_id, question_id)
+        self.counts.pop(key, None)
+        self.pending.pop(key, None)
+        if self.client is None:
+            return
+        try:
+            await self.client.delete(self.redis_key(session_id, question_id))
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            logger.warning(f"Redis error during answers progress reset: {e}")
+
+    async def clear(self, session_url: str) -> None:
+        keys = [key for key in self.counts if key[0] == session_url]
+        for key in keys:
+            self.counts.pop(key, None)
+            self.pending.pop(key, None)
+        self.hosts.pop(session_url, None)
+        if self.client is None or not keys:
+            return
+        try:
+            await self.client.delete(*[self.redis_key(session_id, question_id) for _, session_id, question_id in keys])
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            logger.warning(f"Redis error during answers progress clear: {e}")
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+answer_progress = AnswerProgress(get_async_redis(), window=settings.ANSWER_PROGRESS_WINDOW_MS / 1000)
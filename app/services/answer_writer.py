@@ -0,0 +1,140 @@
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, func
+from sqlalchemy.exc import IntegrityError
+
+from app.core.config import settings
+from app.db.session import async_session_scope
+from app.models import models
+
+logger = logging.getLogger(__name__)
+
+
+class AnswerWriteBuffer:
+    """Отложенная пакетная запись ответов игроков и начислений баллов.
+
+    Ответ подтверждается игроку сразу (по контексту игры в памяти), а строки
+    PlayerAnswer и приращения SessionPlayer.score записываются пачками каждые
+    flush_interval секунд или при накоплении max_batch ответов.
+    """
+
+    MAX_FAILURES = 3
+
+    def __init__(self, flush_interval: float, max_batch: int):
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.pending_answers: List[dict] = []
+        self.pending_scores: Dict[int, int] = defaultdict(int)  # session_player_id -> приращение
+        self.failures = 0
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+
+    def add(self, answer: dict, score_delta: int = 0) -> None:
+        self.pending_answers.append(answer)
+        if score_delta:
+            self.pending_scores[answer["session_player_id"]] += score_delta
+        self._ensure_started()
+        if len(self.pending_answers) >= self.max_batch:
+            self._wakeup.set()
+
+    def _ensure_started(self) -> None:
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Запись всего накопленного; вызывается по таймеру, в конце игры и при остановке"""
+        if self._flush_lock is None:
+            return
+        async with self._flush_lock:
+            if not self.pending_answers and not self.pending_scores:
+                return
+            answers, scores = self.pending_answers, dict(self.pending_scores)
+            self.pending_answers = []
+            self.pending_scores = defaultdict(int)
+            try:
+                await self._write(answers, scores)
+                self.failures = 0
+                return
+            except Exception as e:
+                logger.warning(f"Ошибка записи пачки из {len(answers)} ответов, запись по одной строке: {e}")
+            # Одна ошибочная строка не должна отменять уже подтвержденные ответы остальных игроков
+            answers, scores, error = await self._write_rows(answers, scores)
+            if error is None:
+                self.failures = 0
+                return
+            self.failures += 1
+            if self.failures >= self.MAX_FAILURES:
+                logger.error(f"Не удалось записать {len(answers)} ответов и {len(scores)} начислений после {self.failures} попыток, отброшены: {error}")
+                self.failures = 0
+                return
+            logger.warning(f"Ошибка записи ответов, {len(answers)} ответов и {len(scores)} начислений повторятся при следующем сбросе: {error}")
+            self.pending_answers = answers + self.pending_answers
+            for player_id, delta in scores.items():
+                self.pending_scores[player_id] += delta
+
+    async def _write_rows(self, answers: List[dict], scores: Dict[int, int]) -> Tuple[List[dict], Dict[int, int], Optional[Exception]]:
+        """Запись по одной строке в отдельных транзакциях. Строки, нарушающие ограничения БД,
+        пропускаются; при другой ошибке (например, БД недоступна) запись останавливается.
+        Возвращает незаписанные ответы и начисления для повтора и ошибку, из-за которой остановились"""
+        for index, answer in enumerate(answers):
+            try:
+                await self._write([answer], {})
+            except IntegrityError as e:
+                logger.error(f"Ответ игрока {answer['session_player_id']} на вопрос {answer['question_id']} не записан: {e}")
+            except Exception as e:
+                return answers[index:], scores, e
+        players = list(scores.items())
+        for index, (player_id, delta) in enumerate(players):
+            try:
+                await self._write([], {player_id: delta})
+            except IntegrityError as e:
+                logger.error(f"Начисление {delta} баллов игроку {player_id} не записано: {e}")
+            except Exception as e:
+                return [], dict(players[index:]), e
+        return [], {}, None
+
+    @staticmethod
+    async def _write(answers: List[dict], scores: Dict[int, int]) -> None:
+        players = models.SessionPlayer.__table__
+        async with async_session_scope() as db:
+            if answers:
+                await db.execute(models.PlayerAnswer.__table__.insert(), answers)
+            if scores:
+                await db.execute(
+                    players.update()
+                    .where(players.c.id == bindparam("b_player_id"))
+                    .values(score=func.coalesce(players.c.score, 0) + bindparam("b_delta")),
+                    [{"b_player_id": player_id, "b_delta": delta} for player_id, delta in scores.items()]
+                )
+            await db.commit()
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+answer_buffer = AnswerWriteBuffer(
+    flush_interval=settings.ANSWER_FLUSH_INTERVAL_MS / 1000,
+    max_batch=settings.ANSWER_FLUSH_BATCH_SIZE,
+)
@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Union
+
+import redis
+from sqlalchemy.orm import make_transient_to_detached
+
+from app.core.config import settings
+from app.db import redis as redis_store
+from app.models import models
+
+logger = logging.getLogger(__name__)
+
+USER_COLUMNS = ("id", "username", "email", "password_hash", "role", "created_at")
+
+
+class TTLCache:
+    """Словарь ограниченного размера с временем жизни записей; при переполнении
+    вытесняются давно не использованные. Доступ из пула потоков защищен блокировкой"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items: "OrderedDict[Hashable, tuple]" = OrderedDict()  # ключ -> (значение, истекает)
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            if item[1] <= time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return item[0]
+
+    def set(self, key: Hashable, value: Any, ttl: float) -> None:
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._items[key] = (value, time.monotonic() + ttl)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._items.pop(key, None)
+
+    def pop_value(self, value: Any) -> None:
+        """Удаление всех записей с этим значением (полный проход, для редких сбросов)"""
+        with self._lock:
+            for key in [key for key, item in self._items.items() if item[0] == value]:
+                del self._items[key]
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class AuthCache:
+    """Кэш проверенных JWT (токен -> id пользователя) и данных пользователей.
+
+    Проверка токена не меняется, пока он не истек, поэтому токен хранится до своего exp.
+    Пользователь хранится AUTH_CACHE_TTL секунд; invalidate_token из app/db/redis.py
+    сбрасывает его и его токены на всех воркерах через канал Redis. Это обновление
+    закэшированных данных, а не отзыв: отдельного списка отозванных токенов нет.
+    """
+
+    def __init__(self, max_size: int, user_ttl: float):
+        self.user_ttl = user_ttl
+        self.tokens = TTLCache(max_size)
+        self.users = TTLCache(max_size)
+        self.hits = 0
+        self.misses = 0
+        self._task: Optional[asyncio.Task] = None
+        self._pubsub = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.user_ttl > 0
+
+    def token_user_id(self, token: str) -> Optional[int]:
+        return self.tokens.get(token)
+
+    def remember_token(self, token: str, payload: dict, user_id: int) -> None:
+        exp = payload.get("exp")
+        ttl = exp - time.time() if exp else self.user_ttl
+        self.tokens.set(token, user_id, ttl)
+
+    def get_user(self, user_id: int) -> Optional[models.User]:
+        """Пользователь из кэша в виде отсоединенного объекта, без запроса к БД"""
+        if not self.enabled:
+            return None
+        values = self.users.get(user_id)
+        if values is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        user = models.User(**values)
+        make_transient_to_detached(user)
+        return user
+
+    def remember_user(self, user: models.User) -> None:
+        if self.enabled:
+            self.users.set(user.id, {column: getattr(user, column) for column in USER_COLUMNS}, self.user_ttl)
+
+    def forget_user(self, user_id: Union[int, str]) -> None:
+        """Сброс данных пользователя и его проверенных токенов: следующий запрос заново проверит
+        JWT и прочитает пользователя из БД (новая роль, удаленный пользователь не пройдет).
+        Токен этим не отзывается: подписанный JWT с неистекшим exp по-прежнему действителен"""
+        user_id = int(user_id)
+        self.users.pop(user_id)
+        self.tokens.pop_value(user_id)
+
+    def stats(self) -> dict:
+        return {
+            "tokens": len(self.tokens),
+            "users": len(self.users),
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+    async def start(self) -> None:
+        """Подписка на сбросы кэша с других воркеров"""
+        client = redis_store.get_async_redis()
+        if client is None or not self.enabled or settings.USE_INMEMORY_REDIS:
+            # In-memory Redis живет внутри процесса - сброс уже выполнен локально
+            return
+        try:
+            self._pubsub = client.pubsub()
+            await self._pubsub.subscribe(redis_store.TOKEN_INVALIDATION_CHANNEL)
+        except (redis.ConnectionError, redis.TimeoutError, OSError) as e:
+            logger.warning(f"Не удалось подписаться на сбросы кэша пользователей: {e}")
+            self._pubsub = None
+            return
+        self._task = asyncio.create_task(self._listen())
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except (redis.ConnectionError, redis.TimeoutError) as e:
+                logger.warning(f"Redis error during auth cache listen: {e}")
+                await asyncio.sleep(1.0)
+                continue
+            if message is not None:
+                try:
+                    self.forget_user(message["data"])
+                except (TypeError, ValueError):
+                    pass
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._pubsub is not None:
+            try:
+                await self._pubsub.aclose()
+            except Exception:
+                pass
+            self._pubsub = None
+
+
+auth_cache = AuthCache(max_size=settings.AUTH_CACHE_SIZE, user_ttl=settings.AUTH_CACHE_TTL)
+redis_store.token_invalidation_hooks.append(auth_cache.forget_user)
@@ -0,0 +1,156 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional, Set, Tuple
+
+import redis
+import redis.asyncio as aioredis
+
+from app.core.config import settings
+from app.db.redis import get_async_redis
+
+logger = logging.getLogger(__name__)
+
+# Сообщения передаются уже закодированными в JSON-текст (кадр), чтобы не кодировать
+# одно и то же сообщение для каждого получателя. Аргументы после кадра - exclude_user_id
+# (кадр не доставляется сокетам этого пользователя) и to_user_id (только его сокетам);
+# None - без ограничения
+Deliver = Callable[[str, str, Optional[int], Optional[int]], Awaitable[None]]
+
+
+class BroadcastBackend:
+    """Транспорт широковещательных сообщений между воркерами"""
+
+    def __init__(self):
+        self._deliver: Optional[Deliver] = None
+
+    def set_deliver(self, deliver: Deliver) -> None:
+        self._deliver = deliver
+
+    async def subscribe(self, session_url: str) -> None:
+        pass
+
+    async def unsubscribe(self, session_url: str) -> None:
+        pass
+
+    async def publish(
+        self, session_url: str, frame: str, exclude_user_id: Optional[int] = None, to_user_id: Optional[int] = None
+    ) -> None:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class InMemoryBroadcastBackend(BroadcastBackend):
+    """Доставка только сокетам текущего процесса (один воркер)"""
+
+    async def publish(
+        self, session_url: str, frame: str, exclude_user_id: Optional[int] = None, to_user_id: Optional[int] = None
+    ) -> None:
+        if self._deliver is not None:
+            await self._deliver(session_url, frame, exclude_user_id, to_user_id)
+
+
+class RedisBroadcastBackend(BroadcastBackend):
+    """Redis pub/sub: канал на каждую сессию, сообщение получают все воркеры"""
+
+    CHANNEL_PREFIX = "ws:session:"
+    # Кадр - всегда JSON-объект и начинается с "{"; сообщение вида "!<user_id>!<кадр>"
+    # доставляется всем, кроме сокетов этого пользователя, "@<user_id>@<кадр>" - только им
+    EXCLUDE_MARK = "!"
+    TO_USER_MARK = "@"
+
+    def __init__(self, client: aioredis.Redis):
+        super().__init__()
+        self.client = client
+        self.pubsub = client.pubsub()
+        self.channels: Set[str] = set()
+        self._listener: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    def channel(self, session_url: str) -> str:
+        return f"{self.CHANNEL_PREFIX}{session_url}"
+
+    async def subscribe(self, session_url: str) -> None:
+        channel = self.channel(session_url)
+        async with self._lock:
+            if channel in self.channels:
+                return
+            await self.pubsub.subscribe(channel)
+            self.channels.add(channel)
+            if self._listener is None or self._listener.done():
+                self._listener = asyncio.create_task(self._listen())
+
+    async def unsubscribe(self, session_url: str) -> None:
+        channel = self.channel(session_url)
+        async with self._lock:
+            if channel not in self.channels:
+                return
+            self.channels.discard(channel)
+            await self.pubsub.unsubscribe(channel)
+
+    async def publish(
+        self, session_url: str, frame: str, exclude_user_id: Optional[int] = None, to_user_id: Optional[int] = None
+    ) -> None:
+        data = frame
+        if to_user_id is not None:
+            data = f"{self.TO_USER_MARK}{to_user_id}{self.TO_USER_MARK}{frame}"
+        elif exclude_user_id is not None:
+            data = f"{self.EXCLUDE_MARK}{exclude_user_id}{self.EXCLUDE_MARK}{frame}"
+        try:
+            await self.client.publish(self.channel(session_url), data)
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            # Redis недоступен - доставляем хотя бы локальным сокетам
+            logger.warning(f"Redis error during broadcast publish: {e}")
+            if self._deliver is not None:
+                await self._deliver(session_url, frame, exclude_user_id, to_user_id)
+
+    def unpack(self, data: str) -> Tuple[str, Optional[int], Optional[int]]:
+        """(кадр, exclude_user_id, to_user_id) из сообщения канала"""
+        mark = data[:1]
+        if mark not in (self.EXCLUDE_MARK, self.TO_USER_MARK):
+            return data, None, None
+        user_id, frame = data[1:].split(mark, 1)
+        if mark == self.TO_USER_MARK:
+            return frame, None, int(user_id)
+        return frame, int(user_id), None
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except (redis.ConnectionError, redis.TimeoutError) as e:
+                logger.warning(f"Redis error in broadcast listener: {e}")
+                await asyncio.sleep(1)
+                continue
+            if message is None or message.get("type") != "message":
+                continue
+            session_url = message["channel"][len(self.CHANNEL_PREFIX):]
+            try:
+                if self._deliver is not None:
+                    await self._deliver(session_url, *self.unpack(message["data"]))
+            except Exception as e:
+                logger.error(f"Ошибка доставки сообщения сессии {session_url}: {e}")
+
+    async def close(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        self.channels.clear()
+        await self.pubsub.aclose()
+
+
+def create_broadcast_backend() -> BroadcastBackend:
+    if settings.BROADCAST_BACKEND == "redis":
+        client = get_async_redis()
+        if client is not None:
+            logger.info("Broadcast backend: Redis pub/sub")
+            return RedisBroadcastBackend(client)
+        logger.warning("Redis недоступен, используется локальный broadcast backend")
+    return InMemoryBroadcastBackend()
@@ -0,0 +1,86 @@
+import asyncio
+import logging
+from typing import Any, Callable, Optional
+
+from fastapi import WebSocket
+
+logger = logging.getLogger(__name__)
+
+# Политики для медленных клиентов, у которых переполнилась очередь отправки
+POLICY_DROP_OLDEST = "drop_oldest"
+POLICY_DROP_NEWEST = "drop_newest"
+POLICY_DISCONNECT = "disconnect"
+
+
+class ConnectionWriter:
+    """Ограниченная очередь исходящих сообщений сокета и задача, которая ее отправляет"""
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        max_size: int,
+        policy: str,
+        send_timeout: float,
+        on_failure: Callable[[WebSocket], Any],
+    ):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_size)
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self.on_failure = on_failure
+        self.dropped = 0
+        self.closed = False
+        self._task: Optional[asyncio.Task] = asyncio.create_task(self._run())
+
+    def enqueue(self, message: Any) -> bool:
+        """Постановка сообщения в очередь без ожидания. False - сообщение не принято"""
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            pass
+
+        if self.policy == POLICY_DROP_OLDEST:
+            self.queue.get_nowait()
+            self.queue.put_nowait(message)
+            self.dropped += 1
+            return True
+        if self.policy == POLICY_DISCONNECT:
+            logger.warning("Очередь отправки переполнена, медленный клиент отключается")
+            self._fail()
+            return False
+        self.dropped += 1
+        return False
+
+    async def _run(self):
+        while True:
+            message = await self.queue.get()
+            try:
+                await asyncio.wait_for(self._send(message), timeout=self.send_timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self._fail()
+                return
+
+    async def _send(self, message: Any):
+        if isinstance(message, str):
+            await self.websocket.send_text(message)
+        elif isinstance(message, bytes):
+            await self.websocket.send_bytes(message)
+        else:
+            await self.websocket.send_json(message)
+
+    def _fail(self):
+        if self.closed:
+            return
+        self.close()
+        self.on_failure(self.websocket)
+
+    def close(self):
+        self.closed = True
+        if self._task is not None and self._task is not asyncio.current_task():
+            self._task.cancel()
+        self._task = None
@@ -1,4 +1,6 @@
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import and_, or_, select, tuple_, update
+from sqlalchemy.orm import Session, joinedload, selectinload
+from datetime import datetime
 from typing import List, Optional
 from fastapi import HTTPException, status
 from app.models import models
@@ -6,6 +8,13 @@ from app.schemas import schemas
 from passlib.context import CryptContext
 from app.utils.common import *
 from app.core.config import settings
+from app.services import game_context, ownership
+from app.utils.pagination import Keyset
+
+# Ключи keyset-пагинации списков (курсоры ?cursor=...): совпадают с сортировкой запросов
+QUIZZES_KEYSET = Keyset("quizzes", (int,), lambda quiz: (quiz.id,))
+QUESTIONS_KEYSET = Keyset("questions", (int, int), lambda question: (question.order_index, question.id))
+SESSIONS_KEYSET = Keyset("sessions", (datetime, int), lambda session: (session.started_at, session.id), nullable=(0,))
 
 def create_user(db: Session, user_in: schemas.UserCreate) -> models.User:
     hashed = hash_password(user_in.password)
@@ -53,104 +62,85 @@ def create_quiz(db: Session, quiz_in: schemas.QuizCreate, current_user: Optional
 def get_quiz(db: Session, quiz_id: int) -> Optional[models.Quiz]:
     return db.get(models.Quiz, quiz_id)
 
-def list_quizzes(db: Session, skip: int = 0, limit: int = 100) -> List[models.Quiz]:
-    return db.query(models.Quiz).offset(skip).limit(limit).all()
+def list_quizzes(db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> List[models.Quiz]:
+    query = db.query(models.Quiz)
+    if cursor:
+        (after_id,) = QUIZZES_KEYSET.decode(cursor)
+        query = query.filter(models.Quiz.id > after_id)
+    return query.order_by(models.Quiz.id).offset(skip).limit(limit).all()
 
 def update_quiz(db: Session, quiz_id: int, quiz_in: schemas.QuizUpdate, current_user: Optional[models.User] = None) -> models.Quiz:
-    quiz = get_quiz(db, quiz_id)
-    if not quiz:
+    if not ownership.authorize(db, models.Quiz, quiz_id, current_user):
         return None
-    if settings.REQUIRE_AUTH:
-        if not current_user:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Authentication required"
-            )
-        if quiz.author_id != current_user.id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Not enough permissions"
-            )
+    quiz = get_quiz(db, quiz_id)
     update_data = quiz_in.dict(exclude_unset=True)
     for k, v in update_data.items():
         if not v is None:
             setattr(quiz, k, v)
     db.add(quiz)
+    bump_quiz_version(db, quiz_id)
     db.commit()
     db.refresh(quiz)
+    if "author_id" in update_data:
+        ownership.forget(db)
     return quiz
 
 def delete_quiz(db: Session, quiz_id: int, current_user: Optional[models.User] = None) -> None:
-    quiz = get_quiz(db, quiz_id)
-    if not quiz:
+    if not ownership.authorize(db, models.Quiz, quiz_id, current_user):
         return None
-    if settings.REQUIRE_AUTH:
-        if not current_user:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Authentication required"
-            )
-        if quiz.author_id != current_user.id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Not enough permissions"
-            )
+    quiz = get_quiz(db, quiz_id)
     db.delete(quiz)
     db.commit()
+    ownership.forget(db)
     return None
 
+def get_quiz_version(db: Session, quiz_id: int) -> Optional[int]:
+    return db.execute(select(models.Quiz.version).where(models.Quiz.id == quiz_id)).scalar()
+
+def get_quiz_tree(db: Session, quiz_id: int) -> Optional[models.Quiz]:
+    """Квиз с вопросами, ответами и медиа: по запросу на уровень дерева, без запроса на каждый вопрос"""
+    return db.query(models.Quiz).options(
+        selectinload(models.Quiz.questions).selectinload(models.Question.answers),
+        selectinload(models.Quiz.questions).selectinload(models.Question.media)
+    ).filter(models.Quiz.id == quiz_id).first()
+
+def bump_quiz_version(db: Session, quiz_id) -> None:
+    """Новая версия квиза в той же транзакции, что и правка; quiz_id - число или question_quiz_id(...)"""
+    db.execute(update(models.Quiz).where(models.Quiz.id == quiz_id).values(version=models.Quiz.version + 1))
+
+def question_quiz_id(question_id: int):
+    return select(models.Question.quiz_id).where(models.Question.id == question_id).scalar_subquery()
+
 def create_question_with_answers(db: Session, quiz_id: int, q_in: schemas.QuestionCreate, current_user: Optional[models.User] = None) -> models.Question:
-    if settings.REQUIRE_AUTH:
-        quiz = get_quiz(db, quiz_id)
-        if not quiz:
-            raise HTTPException(status_code=404, detail="Quiz not found")
-        if not current_user:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Authentication required"
-            )
-        if quiz.author_id != current_user.id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Not enough permissions"
-            )
+    if settings.REQUIRE_AUTH and not ownership.authorize(db, models.Quiz, quiz_id, current_user):
+        raise HTTPException(status_code=404, detail="Quiz not found")
     q = models.Question(quiz_id=quiz_id, text=q_in.text, type=q_in.type, time_limit=q_in.time_limit, order_index=q_in.order_index, media_id=q_in.media_id, score=q_in.score)
     db.add(q)
     db.flush()
     for a in q_in.answers or []:
         ans = models.Answer(question_id=q.id, text=a.text, is_correct=a.is_correct)
         db.add(ans)
+    bump_quiz_version(db, quiz_id)
     db.commit()
     db.refresh(q)
+    game_context.invalidate_quiz(quiz_id)
     return q
 
 def get_question(db: Session, question_id: int) -> Optional[models.Question]:
     return db.query(models.Question).options(joinedload(models.Question.media)).filter(models.Question.id == question_id).first()
 
-def get_questions(db: Session, quiz_id: Optional[int] = None, skip: int = 0, limit: int = 100) -> List[models.Question]:
+def get_questions(db: Session, quiz_id: Optional[int] = None, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> List[models.Question]:
     query = db.query(models.Question).options(joinedload(models.Question.media))
     if quiz_id is not None:
         query = query.filter(models.Question.quiz_id == quiz_id)
-    return query.order_by(models.Question.order_index).offset(skip).limit(limit).all()
+    if cursor:
+        query = query.filter(tuple_(models.Question.order_index, models.Question.id) > QUESTIONS_KEYSET.decode(cursor))
+    return query.order_by(models.Question.order_index, models.Question.id).offset(skip).limit(limit).all()
 
 def update_question(db: Session, question_id: int, q_in: schemas.QuestionUpdate, current_user: Optional[models.User] = None) -> Optional[models.Question]:
-    q = get_question(db, question_id)
-    if not q:
+    if not ownership.authorize(db, models.Question, question_id, current_user):
         return None
-    if settings.REQUIRE_AUTH:
-        quiz = get_quiz(db, q.quiz_id)
-        if not quiz:
-            raise HTTPException(status_code=404, detail="Quiz not found")
-        if not current_user:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Authentication required"
-            )
-        if quiz.author_id != current_user.id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Not enough permissions"
-            )
+    q = db.get(models.Question, question_id)
     update_data = q_in.dict(exclude_unset=True)
 
     if q_in.answers is not None:
@@ -168,111 +158,62 @@ def update_question(db: Session, question_id: int, q_in: schemas.QuestionUpdate,
             continue
         setattr(q, k, v)
     db.add(q)
+    bump_quiz_version(db, q.quiz_id)
     db.commit()
     db.refresh(q)
+    game_context.invalidate_quiz(q.quiz_id)
     return q
 
 def delete_question(db: Session, question_id: int, current_user: Optional[models.User] = None) -> None:
-    q = get_question(db, question_id)
-    if not q:
+    if not ownership.authorize(db, models.Question, question_id, current_user):
         return None
-    if settings.REQUIRE_AUTH:
-        quiz = get_quiz(db, q.quiz_id)
-        if not quiz:
-            raise HTTPException(status_code=404, detail="Quiz not found")
-        if not current_user:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Authentication required"
-            )
-        if quiz.author_id != current_user.id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Not enough permissions"
-            )
+    q = db.get(models.Question, question_id)
+    quiz_id = q.quiz_id
     db.delete(q)
+    bump_quiz_version(db, quiz_id)
     db.commit()
+    ownership.forget(db)
+    game_context.invalidate_quiz(quiz_id)
     return None
 
 def create_answer(db: Session, ans_in: schemas.AnswerCreate, current_user: Optional[models.User] = None) -> models.Answer:
-    if settings.REQUIRE_AUTH:
-        question = get_question(db, ans_in.question_id)
-        if not question:
-            raise HTTPException(status_code=404, detail="Question not found")
-        quiz = get_quiz(db, question.quiz_id)
-        if not quiz:
-            raise HTTPException(status_code=404, detail="Quiz not found")
-        if not current_user:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Authentication required"
-            )
-        if quiz.author_id != current_user.id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Not enough permissions"
-            )
+    if settings.REQUIRE_AUTH and not ownership.authorize(db, models.Question, ans_in.question_id, current_user):
+        raise HTTPException(status_code=404, detail="Question not found")
     ans = models.Answer(question_id=ans_in.question_id, text=ans_in.text, is_correct=ans_in.is_correct)
     db.add(ans)
+    bump_quiz_version(db, question_quiz_id(ans_in.question_id))
     db.commit()
     db.refresh(ans)
+    game_context.invalidate_question(ans.question_id)
     return ans
 
 def get_answer(db: Session, answer_id: int) -> Optional[models.Answer]:
     return db.get(models.Answer, answer_id)
 
 def update_answer(db: Session, answer_id: int, ans_in: schemas.AnswerUpdate, current_user: Optional[models.User] = None) -> Optional[models.Answer]:
-    ans = get_answer(db, answer_id)
-    if not ans:
+    if not ownership.authorize(db, models.Answer, answer_id, current_user):
         return None
-    if settings.REQUIRE_AUTH:
-        question = get_question(db, ans.question_id)
-        if not question:
-            raise HTTPException(status_code=404, detail="Question not found")
-        quiz = get_quiz(db, question.quiz_id)
-        if not quiz:
-            raise HTTPException(status_code=404, detail="Quiz not found")
-        if not current_user:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Authentication required"
-            )
-        if quiz.author_id != current_user.id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Not enough permissions"
-            )
+    ans = get_answer(db, answer_id)
     update_data = ans_in.dict(exclude_unset=True)
     for k, v in update_data.items():
         setattr(ans, k, v)
     db.add(ans)
+    bump_quiz_version(db, question_quiz_id(ans.question_id))
     db.commit()
     db.refresh(ans)
+    game_context.invalidate_question(ans.question_id)
     return ans
 
 def delete_answer(db: Session, answer_id: int, current_user: Optional[models.User] = None) -> None:
-    ans = get_answer(db, answer_id)
-    if not ans:
+    if not ownership.authorize(db, models.Answer, answer_id, current_user):
         return None
-    if settings.REQUIRE_AUTH:
-        question = get_question(db, ans.question_id)
-        if not question:
-            raise HTTPException(status_code=404, detail="Question not found")
-        quiz = get_quiz(db, question.quiz_id)
-        if not quiz:
-            raise HTTPException(status_code=404, detail="Quiz not found")
-        if not current_user:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Authentication required"
-            )
-        if quiz.author_id != current_user.id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Not enough permissions"
-            )
+    ans = get_answer(db, answer_id)
+    question_id = ans.question_id
     db.delete(ans)
+    bump_quiz_version(db, question_quiz_id(question_id))
     db.commit()
+    ownership.forget(db)
+    game_context.invalidate_question(question_id)
     return None
 
 def create_media(db: Session, media_in: schemas.MediaCreate) -> models.Media:
@@ -299,18 +240,19 @@ def create_session(db: Session, s_in: schemas.SessionCreate, current_user: model
     db.refresh(s)
     return s
 
-def list_sessions(db: Session, current_user: models.User, skip: int = 0, limit: int = 100) -> List[models.SessionGame]:
+def list_sessions(db: Session, current_user: models.User, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> List[models.SessionGame]:
     if not current_user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Authentication required"
         )
     # Возвращаем только сессии, созданные текущим пользователем (host_id)
-    return db.query(models.SessionGame).filter(
+    query = db.query(models.SessionGame).filter(
         models.SessionGame.host_id == current_user.id
-    ).order_by(models.SessionGame.started_at.desc()).offset(skip).limit(limit).all()
+    )
+    return sessions_page(query, skip, limit, cursor)
 
-def list_ended_sessions(db: Session, current_user: models.User, skip: int = 0, limit: int = 100) -> List[models.SessionGame]:
+def list_ended_sessions(db: Session, current_user: models.User, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> List[models.SessionGame]:
     if not current_user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -318,10 +260,29 @@ def list_ended_sessions(db: Session, current_user: models.User, skip: int = 0, l
         )
     # Возвращаем только завершенные сессии, созданные текущим пользователем
     # Используем started_at для сортировки (ended_at может быть NULL)
-    return db.query(models.SessionGame).filter(
+    query = db.query(models.SessionGame).filter(
         models.SessionGame.host_id == current_user.id,
         models.SessionGame.status == 'ended'
-    ).order_by(models.SessionGame.started_at.desc()).offset(skip).limit(limit).all()
+    )
+    return sessions_page(query, skip, limit, cursor)
+
+def sessions_page(query, skip: int, limit: int, cursor: Optional[str]) -> List[models.SessionGame]:
+    """Страница сессий от новых к старым; id различает сессии с одинаковым started_at.
+    Сессии без started_at идут первыми (как DESC в PostgreSQL и обратный проход индекса)"""
+    if cursor:
+        started_at, session_id = SESSIONS_KEYSET.decode(cursor)
+        if started_at is None:
+            # Курсор внутри сессий без started_at: оставшиеся из них, затем все с started_at
+            query = query.filter(or_(
+                and_(models.SessionGame.started_at.is_(None), models.SessionGame.id < session_id),
+                models.SessionGame.started_at.isnot(None)
+            ))
+        else:
+            # Сравнение с NULL не истинно, поэтому сессии без started_at сюда не попадают
+            query = query.filter(tuple_(models.SessionGame.started_at, models.SessionGame.id) < (started_at, session_id))
+    return query.order_by(
+        models.SessionGame.started_at.desc().nulls_first(), models.SessionGame.id.desc()
+    ).offset(skip).limit(limit).all()
 
 def get_session(db: Session, session_id: int, current_user: models.User) -> Optional[models.SessionGame]:
     if not current_user:
@@ -369,6 +330,7 @@ def delete_session(db: Session, session_id: int, current_user: models.User) -> N
         )
     db.delete(session)
     db.commit()
+    game_context.drop_session_context(session_id)
     return None
 
 def add_rule_to_session(db: Session, session_id: int, current_user: models.User) -> Optional[models.SessionGame]:
@@ -418,7 +380,7 @@ def get_session_statistics(db: Session, session_id: int, current_user: models.Us
         players_data.append({
             "id": player.id,
             "nickname": player.nickname or f"Игрок #{player.id}",
-            "score": player.score or 0,
+            "score": game_context.player_score(player),
             "joined_at": player.joined_at
         })
     
@@ -429,7 +391,7 @@ def get_session_statistics(db: Session, session_id: int, current_user: models.Us
         "players": players_data
     }
 
-def get_current_question(db: Session, session_id: int, current_user: models.User) -> Optional[models.Question]:
+def get_current_question_id(db: Session, session_id: int, current_user: models.User) -> Optional[int]:
     if not current_user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -452,62 +414,5 @@ def get_current_question(db: Session, session_id: int, current_user: models.User
                 detail="Not a participant of this session"
             )
     
-    if not session.current_question_id:
-        return None
-    
-    question = db.get(models.Question, session.current_question_id)
-    return question
+    return session.current_question_id
 
-def set_next_question(db: Session, session_id: int, current_user: models.User) -> Optional[models.Question]:
-    if not current_user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Authentication required"
-        )
-    session = db.get(models.SessionGame, session_id)
-    if not session:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Session not found"
-        )
-    if session.host_id != current_user.id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Not enough permissions"
-        )
-    
-    questions = db.query(models.Question).filter(
-        models.Question.quiz_id == session.quiz_id
-    ).order_by(models.Question.order_index).all()
-    
-    if not questions:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="No questions found in this quiz"
-        )
-    
-    if not session.current_question_id:
-        next_question = questions[0]
-    else:
-        current_index = None
-        for idx, q in enumerate(questions):
-            if q.id == session.current_question_id:
-                current_index = idx
-                break
-        
-        if current_index is None:
-            next_question = questions[0]
-        elif current_index + 1 < len(questions):
-            next_question = questions[current_index + 1]
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="No more questions available"
-            )
-    
-    session.current_question_id = next_question.id
-    db.add(session)
-    db.commit()
-    db.refresh(session)
-    
-    return next_question
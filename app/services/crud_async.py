@@ -0,0 +1,136 @@
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import and_, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.models import models
+
+# Асинхронные версии запросов горячего пути (WebSocket и REST-переход к следующему вопросу).
+# Остальные REST-эндпоинты работают через синхронный crud в пуле потоков.
+
+# INSERT ... ON CONFLICT есть только в диалектах PostgreSQL и SQLite
+UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+async def get_user(db: AsyncSession, user_id: int) -> Optional[models.User]:
+    return await db.get(models.User, user_id)
+
+async def get_session_by_url(db: AsyncSession, url: str) -> Optional[models.SessionGame]:
+    result = await db.execute(
+        select(models.SessionGame).where(models.SessionGame.url == url)
+    )
+    return result.scalars().first()
+
+async def ensure_session_players(db: AsyncSession, entries: List[Tuple[int, int, str]]) -> Dict[Tuple[int, int], tuple]:
+    """Игроки сессий для (session_id, user_id, nickname): недостающие создаются одной вставкой
+    ON CONFLICT DO NOTHING (уникальность (session_id, user_id)), все читаются одним запросом.
+    Возвращает {(session_id, user_id): (игрок, создан ли)}"""
+    players = models.SessionPlayer.__table__
+    now = datetime.utcnow()
+    rows = {
+        (session_id, user_id): {"session_id": session_id, "user_id": user_id, "nickname": nickname, "score": 0, "joined_at": now}
+        for session_id, user_id, nickname in entries
+    }
+    stmt = UPSERT_INSERTS[db.bind.dialect.name](players).values(list(rows.values()))
+    result = await db.execute(stmt.on_conflict_do_nothing().returning(players.c.id))
+    created_ids = set(result.scalars().all())
+
+    user_ids: Dict[int, List[int]] = {}
+    for session_id, user_id in rows:
+        user_ids.setdefault(session_id, []).append(user_id)
+    result = await db.execute(
+        select(models.SessionPlayer).where(or_(*(
+            and_(models.SessionPlayer.session_id == session_id, models.SessionPlayer.user_id.in_(ids))
+            for session_id, ids in user_ids.items()
+        ))).order_by(models.SessionPlayer.id)
+    )
+    found: Dict[Tuple[int, int], tuple] = {}
+    for player in result.scalars().all():
+        # Дубликаты, созданные до ограничения уникальности, не мешают: берется самый ранний
+        found.setdefault((player.session_id, player.user_id), (player, player.id in created_ids))
+    await db.commit()
+    return found
+
+async def get_session_roster(db: AsyncSession, session_id: int) -> List[tuple]:
+    """Игроки сессии вместе с именами пользователей одним запросом: [(SessionPlayer, username)]"""
+    result = await db.execute(
+        select(models.SessionPlayer, models.User.username).outerjoin(
+            models.User, models.User.id == models.SessionPlayer.user_id
+        ).where(
+            models.SessionPlayer.session_id == session_id
+        ).order_by(models.SessionPlayer.id)
+    )
+    return result.all()
+
+async def set_session_status(db: AsyncSession, session_id: int, new_status: str) -> models.SessionGame:
+    session = await db.get(models.SessionGame, session_id)
+    if not session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Session not found"
+        )
+    session.status = new_status
+    await db.commit()
+    return session
+
+def get_next_question_id(current_question_id: Optional[int], question_ids: List[int]) -> int:
+    if not question_ids:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No questions found in this quiz"
+        )
+
+    if not current_question_id or current_question_id not in question_ids:
+        return question_ids[0]
+    current_index = question_ids.index(current_question_id)
+    if current_index + 1 < len(question_ids):
+        return question_ids[current_index + 1]
+    raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="No more questions available"
+    )
+
+async def set_next_question(db: AsyncSession, session_id: int, current_user: models.User, question_ids: Optional[List[int]] = None) -> Optional[models.Question]:
+    if not current_user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Authentication required"
+        )
+    session = await db.get(models.SessionGame, session_id)
+    if not session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Session not found"
+        )
+    if session.host_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+
+    return await advance_question(db, session, question_ids)
+
+async def advance_question(db: AsyncSession, session: models.SessionGame, question_ids: Optional[List[int]] = None) -> Optional[models.Question]:
+    """Переход сессии к следующему вопросу без проверки прав (хостом или по таймеру)"""
+    # Порядок вопросов можно передать из контекста игры, чтобы не перечитывать весь квиз
+    if question_ids is None:
+        result = await db.execute(
+            select(models.Question.id).where(
+                models.Question.quiz_id == session.quiz_id
+            ).order_by(models.Question.order_index)
+        )
+        question_ids = list(result.scalars().all())
+
+    # Ответы и медиа загружаются сразу: ленивая загрузка в AsyncSession недоступна
+    next_question = await db.get(
+        models.Question,
+        get_next_question_id(session.current_question_id, question_ids),
+        options=[selectinload(models.Question.answers), selectinload(models.Question.media)]
+    )
+    session.current_question_id = next_question.id
+    await db.commit()
+
+    return next_question
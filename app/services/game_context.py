@@ -0,0 +1,310 @@
+import asyncio
+import logging
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+import redis
+from sqlalchemy.orm import Session, selectinload
+
+from app.core.config import settings
+from app.core.metrics import RedisCall
+from app.db import redis as redis_store
+from app.models import models
+from app.utils.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+# Правка квиза приходит через REST в любой воркер, а игра идет в другом:
+# сброс контекстов и снимков рассылается всем воркерам ("quiz:<id>" или "question:<id>")
+INVALIDATION_CHANNEL = "game:invalidate"
+
+
+def normalize_text_answer(text: str) -> str:
+    return text.strip().lower()
+
+
+class QuestionKey:
+    """Ключ ответов вопроса: баллы, правильность вариантов и правильные тексты"""
+
+    def __init__(self, question: models.Question):
+        self.id = question.id
+        self.score = question.score if question.score is not None else 1
+        self.answers: Dict[int, bool] = {a.id: a.is_correct for a in question.answers}
+        self.correct_texts: Set[str] = {
+            normalize_text_answer(a.text) for a in question.answers if a.is_correct
+        }
+
+    def check(self, answer_id: Optional[int], text_answer: Optional[str]) -> Optional[bool]:
+        if answer_id:
+            # Для тестовых вопросов проверяем правильность выбранного ответа
+            return self.answers.get(answer_id)
+        if text_answer:
+            # Для открытых вопросов сравниваем с правильными ответами (регистронезависимо),
+            # если правильных ответов нет - ответ неправильный
+            return normalize_text_answer(text_answer) in self.correct_texts
+        return None
+
+
+def render_question_snapshot(question: models.Question) -> dict:
+    """Вопрос в виде, безопасном для игроков: ответы без признака правильности"""
+    media = question.media
+    return {
+        "id": question.id,
+        "text": question.text,
+        "type": question.type,
+        "time_limit": question.time_limit,
+        "order_index": question.order_index,
+        "media_id": question.media_id,
+        "score": question.score,
+        "media": {"id": media.id, "title": media.title, "uri": media.uri} if media else None,
+        "answers": [{"id": a.id, "text": a.text} for a in sorted(question.answers, key=lambda a: a.id)]
+    }
+
+
+class QuestionSnapshot:
+    """Снимок вопроса, отрисованный один раз: для рассылки (data) и для REST (уже закодированный frame)"""
+
+    def __init__(self, question: models.Question):
+        self.quiz_id = question.quiz_id
+        self.data = render_question_snapshot(question)
+        self.frame = dumps(self.data)
+
+
+class SessionContext:
+    """Состояние идущей игры в памяти воркера, чтобы не читать БД на каждый ответ"""
+
+    def __init__(self, session: models.SessionGame):
+        self.session_id = session.id
+        self.quiz_id = session.quiz_id
+        self.host_id = session.host_id
+        self.question_ids: List[int] = []
+        self.questions: Dict[int, QuestionKey] = {}
+        self.player_ids: Dict[int, int] = {}  # user_id -> session_player_id
+        self.scores: Dict[int, int] = {}  # session_player_id -> score
+        self.answered: Set[Tuple[int, int]] = set()  # (session_player_id, question_id)
+        self.stale = False
+
+    def load_questions(self, db: Session) -> None:
+        questions = db.query(models.Question).options(
+            selectinload(models.Question.answers)
+        ).filter(
+            models.Question.quiz_id == self.quiz_id
+        ).order_by(models.Question.order_index).all()
+        self.question_ids = [q.id for q in questions]
+        self.questions = {q.id: QuestionKey(q) for q in questions}
+        self.stale = False
+
+    def load_players(self, db: Session) -> None:
+        players = db.query(models.SessionPlayer).filter(
+            models.SessionPlayer.session_id == self.session_id
+        ).all()
+        for player in players:
+            self.add_player(player.id, player.user_id, player.score)
+        if players:
+            rows = db.query(
+                models.PlayerAnswer.session_player_id, models.PlayerAnswer.question_id
+            ).filter(
+                models.PlayerAnswer.session_player_id.in_([p.id for p in players])
+            ).all()
+            self.answered.update((row[0], row[1]) for row in rows)
+
+    def add_player(self, session_player_id: int, user_id: Optional[int], score: Optional[int]) -> None:
+        if user_id is not None:
+            self.player_ids[user_id] = session_player_id
+        self.scores.setdefault(session_player_id, score or 0)
+
+
+_contexts: Dict[int, SessionContext] = {}
+# Кэши модуля (_contexts и _snapshots) меняются и из event loop (WebSocket),
+# и из пула потоков (синхронные CRUD при правке квиза, REST текущего вопроса)
+_lock = threading.Lock()
+_snapshots: Dict[int, QuestionSnapshot] = {}  # question_id -> снимок
+
+
+def build_session_context(db: Session, session: models.SessionGame) -> SessionContext:
+    ctx = SessionContext(session)
+    # Снимки вопросов перечитываются к каждой игре: сброс из другого процесса мог потеряться
+    # (Redis был недоступен)
+    drop_quiz_snapshots(session.quiz_id)
+    ctx.load_questions(db)
+    ctx.load_players(db)
+    with _lock:
+        _contexts[session.id] = ctx
+    logger.info(f"Контекст игры построен для сессии {session.id}: {len(ctx.question_ids)} вопросов, {len(ctx.scores)} игроков")
+    return ctx
+
+
+def get_session_context(session_id: int) -> Optional[SessionContext]:
+    with _lock:
+        return _contexts.get(session_id)
+
+
+def ensure_session_context(db: Session, session_id: int) -> Optional[SessionContext]:
+    """Контекст из памяти; строится из БД, если его нет (например, после перезапуска воркера)"""
+    ctx = get_session_context(session_id)
+    if ctx is None:
+        session = db.get(models.SessionGame, session_id)
+        if not session:
+            return None
+        return build_session_context(db, session)
+    if ctx.stale:
+        ctx.load_questions(db)
+    return ctx
+
+
+def player_score(session_player: models.SessionPlayer) -> int:
+    """Счет игрока с учетом начислений, которые еще не записаны в БД"""
+    ctx = get_session_context(session_player.session_id)
+    if ctx is not None and session_player.id in ctx.scores:
+        return ctx.scores[session_player.id]
+    return session_player.score or 0
+
+
+def player_payload(player: models.SessionPlayer, username: Optional[str]) -> dict:
+    return {
+        "id": player.id,
+        "user_id": player.user_id,
+        "nickname": player.nickname or username,
+        "username": username,
+        "score": player_score(player)
+    }
+
+
+def question_snapshot(question: models.Question) -> QuestionSnapshot:
+    """Снимок уже загруженного вопроса (ответы и медиа должны быть загружены)"""
+    with _lock:
+        snapshot = _snapshots.get(question.id)
+    if snapshot is None:
+        # Снимок отрисовывается вне блокировки; если его успел создать другой поток, берется тот
+        rendered = QuestionSnapshot(question)
+        with _lock:
+            snapshot = _snapshots.setdefault(question.id, rendered)
+    return snapshot
+
+
+def get_question_snapshot(db: Session, question_id: int) -> Optional[QuestionSnapshot]:
+    with _lock:
+        snapshot = _snapshots.get(question_id)
+    if snapshot is not None:
+        return snapshot
+    question = db.query(models.Question).options(
+        selectinload(models.Question.answers),
+        selectinload(models.Question.media)
+    ).filter(models.Question.id == question_id).first()
+    if not question:
+        return None
+    return question_snapshot(question)
+
+
+def drop_session_context(session_id: int) -> None:
+    with _lock:
+        _contexts.pop(session_id, None)
+
+
+def invalidate_quiz(quiz_id: int) -> None:
+    """Вопросы квиза изменились - ключи ответов будут перечитаны при следующем обращении на всех воркерах"""
+    forget_quiz(quiz_id)
+    publish_invalidation(f"quiz:{quiz_id}")
+
+
+def invalidate_question(question_id: int) -> None:
+    forget_question(question_id)
+    publish_invalidation(f"question:{question_id}")
+
+
+def forget_quiz(quiz_id: int) -> None:
+    with _lock:
+        contexts = list(_contexts.values())
+    for ctx in contexts:
+        if ctx.quiz_id == quiz_id:
+            ctx.stale = True
+    drop_quiz_snapshots(quiz_id)
+
+
+def drop_quiz_snapshots(quiz_id: int) -> None:
+    with _lock:
+        for question_id in [qid for qid, snapshot in _snapshots.items() if snapshot.quiz_id == quiz_id]:
+            del _snapshots[question_id]
+
+
+def forget_question(question_id: int) -> None:
+    with _lock:
+        contexts = list(_contexts.values())
+    for ctx in contexts:
+        if question_id in ctx.questions:
+            ctx.stale = True
+    with _lock:
+        _snapshots.pop(question_id, None)
+
+
+def publish_invalidation(message: str) -> None:
+    # In-memory Redis живет внутри процесса - других воркеров за ним нет
+    r = redis_store.get_redis()
+    if r is None or settings.USE_INMEMORY_REDIS:
+        return
+    try:
+        with RedisCall("game_invalidate"):
+            r.publish(INVALIDATION_CHANNEL, message)
+    except (redis.ConnectionError, redis.TimeoutError) as e:
+        logger.warning(f"Redis error during game context invalidation: {e}")
+
+
+def apply_invalidation(message: str) -> None:
+    kind, _, object_id = message.partition(":")
+    if kind == "quiz":
+        forget_quiz(int(object_id))
+    elif kind == "question":
+        forget_question(int(object_id))
+
+
+class InvalidationListener:
+    """Подписка на сбросы контекстов игр и снимков вопросов с других воркеров"""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._pubsub = None
+
+    async def start(self) -> None:
+        client = redis_store.get_async_redis()
+        if client is None or settings.USE_INMEMORY_REDIS:
+            return
+        try:
+            self._pubsub = client.pubsub()
+            await self._pubsub.subscribe(INVALIDATION_CHANNEL)
+        except (redis.ConnectionError, redis.TimeoutError, OSError) as e:
+            logger.warning(f"Не удалось подписаться на сбросы контекстов игр: {e}")
+            self._pubsub = None
+            return
+        self._task = asyncio.create_task(self._listen())
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except (redis.ConnectionError, redis.TimeoutError) as e:
+                logger.warning(f"Redis error during game context invalidation listen: {e}")
+                await asyncio.sleep(1.0)
+                continue
+            if message is not None:
+                try:
+                    apply_invalidation(message["data"])
+                except (TypeError, ValueError):
+                    pass
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._pubsub is not None:
+            try:
+                await self._pubsub.aclose()
+            except Exception:
+                pass
+            self._pubsub = None
+
+
+invalidation_listener = InvalidationListener()
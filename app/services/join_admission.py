@@ -0,0 +1,130 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.db.session import async_session_scope
+from app.models import models
+from app.services import crud_async, game_context
+
+logger = logging.getLogger(__name__)
+
+Broadcast = Callable[[str, dict], Awaitable[None]]
+
+
+class JoinAdmission:
+    """Очередь входа игроков в сессии: подключения, пришедшие за window, обрабатываются
+    одной пачкой - одна вставка ON CONFLICT DO NOTHING, одна выборка игроков
+    и один список игроков на сессию вместо запросов на каждое подключение.
+    Новые игроки объявляются остальным одним кадром players_joined за announce_window"""
+
+    def __init__(self, window: float, max_batch: int, announce_window: float):
+        self.window = window
+        self.max_batch = max_batch
+        self.announce_window = announce_window
+        self.broadcast: Optional[Broadcast] = None
+        self.pending: List[tuple] = []  # (session_id, user_id, nickname, нужен ли список игроков, future)
+        self.joined: Dict[str, Dict[int, dict]] = {}  # session_url -> {player_id: игрок}
+        self.batches = 0
+        self.admitted = 0
+        self._task: Optional[asyncio.Task] = None
+        self._announce_task: Optional[asyncio.Task] = None
+
+    async def admit(self, session_id: int, user: models.User, roster: bool = True) -> Tuple[models.SessionPlayer, bool, Optional[List[dict]]]:
+        """Игрок сессии для пользователя (создается при первом входе).
+        Возвращает (игрок, создан ли, список игроков сессии или None, если он не запрошен)"""
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((session_id, user.id, user.username, roster, future))
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return await future
+
+    async def _run(self) -> None:
+        # Одна задача на все подключения воркера; следующая пачка ждет завершения предыдущей,
+        # поэтому при медленной БД пачки укрупняются, а не множатся
+        while self.pending:
+            await asyncio.sleep(self.window)
+            while self.pending:
+                batch, self.pending = self.pending[:self.max_batch], self.pending[self.max_batch:]
+                await self._process(batch)
+
+    async def _process(self, batch: List[tuple]) -> None:
+        # Каждая сессия пачки - отдельная транзакция: ошибка одной сессии (например, ее удалили
+        # между проверкой и вставкой) отклоняет только ее подключения
+        groups: Dict[int, List[tuple]] = {}
+        for entry in batch:
+            groups.setdefault(entry[0], []).append(entry)
+        for session_id, entries in groups.items():
+            await self._process_session(session_id, entries)
+        self.batches += 1
+
+    async def _process_session(self, session_id: int, entries: List[tuple]) -> None:
+        roster = None
+        try:
+            async with async_session_scope() as db:
+                players = await crud_async.ensure_session_players(
+                    db, [(session_id, user_id, nickname) for _, user_id, nickname, _, _ in entries]
+                )
+                if any(wants_roster for _, _, _, wants_roster, _ in entries):
+                    roster = [
+                        game_context.player_payload(player, username)
+                        for player, username in await crud_async.get_session_roster(db, session_id)
+                    ]
+        except Exception as e:
+            logger.error(f"Ошибка приема {len(entries)} игроков в сессию {session_id}: {e}")
+            for *_, future in entries:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.admitted += len(entries)
+        for _, user_id, _, wants_roster, future in entries:
+            if future.done():
+                continue
+            player, created = players[(session_id, user_id)]
+            future.set_result((player, created, roster if wants_roster else None))
+
+    def announce(self, session_url: str, player: dict) -> None:
+        self.joined.setdefault(session_url, {})[player["id"]] = player
+        if self._announce_task is None or self._announce_task.done():
+            self._announce_task = asyncio.create_task(self._announce())
+
+    async def _announce(self) -> None:
+        # При наплыве подключений каждый участник получает кадр на окно, а не на каждого вошедшего
+        while self.joined:
+            await asyncio.sleep(self.announce_window)
+            joined, self.joined = self.joined, {}
+            for session_url, players in joined.items():
+                try:
+                    if self.broadcast is not None:
+                        await self.broadcast(session_url, {
+                            "type": "players_joined",
+                            "players": list(players.values())
+                        })
+                except Exception as e:
+                    logger.error(f"Ошибка рассылки новых игроков сессии {session_url}: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self.pending),
+            "batches": self.batches,
+            "admitted": self.admitted
+        }
+
+    async def close(self) -> None:
+        for task in (self._task, self._announce_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = None
+        self._announce_task = None
+
+
+join_admission = JoinAdmission(
+    window=settings.JOIN_ADMISSION_WINDOW_MS / 1000,
+    max_batch=settings.JOIN_ADMISSION_BATCH,
+    announce_window=settings.JOIN_ANNOUNCE_WINDOW_MS / 1000,
+)
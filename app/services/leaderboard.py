@@ -0,0 +1,165 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import redis
+import redis.asyncio as aioredis
+
+from app.core.config import settings
+from app.db.redis import get_async_redis
+
+logger = logging.getLogger(__name__)
+
+Broadcast = Callable[[str, dict], Awaitable[None]]
+
+
+class Leaderboard:
+    """Таблица лидеров сессии в Redis sorted set: member - id игрока сессии, score - его счет.
+
+    Только для рассылки мест: счет в sessions_players записывает буфер ответов (answer_writer),
+    таблица может отставать (ошибки Redis) и в БД не переносится"""
+
+    KEY_PREFIX = "leaderboard:"
+
+    def __init__(self, client: Optional[aioredis.Redis], top_n: int, tick_interval: float):
+        self.client = client
+        self.top_n = top_n
+        self.tick_interval = tick_interval
+        self.broadcast: Optional[Broadcast] = None
+        self.dirty: Dict[int, str] = {}  # session_id -> session_url
+        self.last_top: Dict[int, Dict[int, Tuple[int, int]]] = {}  # session_id -> {player_id: (rank, score)}
+        self.changed_scores: Dict[int, Dict[int, int]] = {}  # session_id -> {player_id: score}
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.client is not None
+
+    def key(self, session_id: int) -> str:
+        return f"{self.KEY_PREFIX}{session_id}"
+
+    async def load(self, session_id: int, scores: Dict[int, int]) -> None:
+        """Заполнение таблицы счетами игроков из контекста игры (старт игры или его пересборка)"""
+        if not self.enabled or not scores:
+            return
+        try:
+            # GT: счет, уже начисленный в таблице другим воркером, не уменьшается
+            await self.client.zadd(self.key(session_id), {str(player_id): score for player_id, score in scores.items()}, gt=True)
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            logger.warning(f"Redis error during leaderboard load: {e}")
+
+    async def add_player(self, session_id: int, player_id: int, score: int = 0) -> None:
+        if not self.enabled:
+            return
+        try:
+            await self.client.zadd(self.key(session_id), {str(player_id): score}, nx=True)
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            logger.warning(f"Redis error during leaderboard add: {e}")
+
+    async def increment(self, session_id: int, session_url: str, player_id: int, delta: int, total: int) -> None:
+        """Начисление баллов; новый счет игрока попадет в ближайшую рассылку score_changed"""
+        if not delta:
+            return
+        self.changed_scores.setdefault(session_id, {})[player_id] = total
+        self.mark_dirty(session_id, session_url)
+        if not self.enabled:
+            return
+        try:
+            await self.client.zincrby(self.key(session_id), delta, str(player_id))
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            logger.warning(f"Redis error during leaderboard increment: {e}")
+
+    async def top(self, session_id: int, n: Optional[int] = None) -> List[Tuple[int, int]]:
+        if not self.enabled:
+            return []
+        try:
+            rows = await self.client.zrevrange(self.key(session_id), 0, (n or self.top_n) - 1, withscores=True)
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            logger.warning(f"Redis error during leaderboard read: {e}")
+            return []
+        return [(int(member), int(score)) for member, score in rows]
+
+    async def rank(self, session_id: int, player_id: int) -> Optional[int]:
+        """Место игрока, начиная с 1"""
+        if not self.enabled:
+            return None
+        try:
+            rank = await self.client.zrevrank(self.key(session_id), str(player_id))
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            logger.warning(f"Redis error during leaderboard rank: {e}")
+            return None
+        return rank + 1 if rank is not None else None
+
+    def mark_dirty(self, session_id: int, session_url: str) -> None:
+        self.dirty[session_id] = session_url
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        # Одна задача на все сессии: раз в tick_interval рассылаются изменения мест
+        while self.dirty:
+            await asyncio.sleep(self.tick_interval)
+            dirty, self.dirty = self.dirty, {}
+            for session_id, session_url in dirty.items():
+                try:
+                    await self.publish_changes(session_id, session_url)
+                except Exception as e:
+                    logger.error(f"Ошибка рассылки таблицы лидеров сессии {session_id}: {e}")
+
+    async def publish_changes(self, session_id: int, session_url: str) -> None:
+        """Рассылка изменившихся счетов и только тех мест top-N, которые изменились с прошлой рассылки"""
+        scores = self.changed_scores.pop(session_id, None)
+        if scores and self.broadcast is not None:
+            await self.broadcast(session_url, {
+                "type": "score_changed",
+                "session_id": session_id,
+                "scores": [{"player_id": player_id, "score": score} for player_id, score in scores.items()]
+            })
+        if not self.enabled:
+            return
+        current = {
+            player_id: (index + 1, score)
+            for index, (player_id, score) in enumerate(await self.top(session_id))
+        }
+        previous = self.last_top.get(session_id, {})
+        changes = [
+            {"player_id": player_id, "rank": rank, "score": score}
+            for player_id, (rank, score) in current.items()
+            if previous.get(player_id) != (rank, score)
+        ]
+        removed = [player_id for player_id in previous if player_id not in current]
+        self.last_top[session_id] = current
+        if (changes or removed) and self.broadcast is not None:
+            await self.broadcast(session_url, {
+                "type": "leaderboard_update",
+                "session_id": session_id,
+                "changes": changes,
+                "removed": removed
+            })
+
+    async def clear(self, session_id: int) -> None:
+        self.dirty.pop(session_id, None)
+        self.last_top.pop(session_id, None)
+        self.changed_scores.pop(session_id, None)
+        if not self.enabled:
+            return
+        try:
+            await self.client.delete(self.key(session_id))
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            logger.warning(f"Redis error during leaderboard clear: {e}")
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+leaderboard = Leaderboard(
+    get_async_redis(),
+    top_n=settings.LEADERBOARD_TOP_N,
+    tick_interval=settings.LEADERBOARD_TICK_MS / 1000,
+)
@@ -0,0 +1,63 @@
+"""Проверка прав на редактирование квиза, вопроса или ответа.
+
+Автор квиза определяется одним запросом с JOIN до quizzes вместо цепочки
+ответ -> вопрос -> квиз. Тот же запрос загружает сам объект в identity map сессии,
+поэтому следующий db.get в crud.py не обращается к БД. Результат запоминается
+в db.info: сессия БД создается на запрос (get_db), и роутер, проверивший
+существование объекта, и crud.py, проверяющий права, делят один запрос.
+"""
+from typing import Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models import models
+
+_AUTHOR_QUERIES = {
+    models.Quiz: lambda: select(models.Quiz, models.Quiz.author_id),
+    models.Question: lambda: select(models.Question, models.Quiz.author_id)
+        .join(models.Quiz, models.Question.quiz_id == models.Quiz.id),
+    models.Answer: lambda: select(models.Answer, models.Quiz.author_id)
+        .join(models.Question, models.Answer.question_id == models.Question.id)
+        .join(models.Quiz, models.Question.quiz_id == models.Quiz.id),
+}
+
+_MEMO_KEY = "quiz_authors"
+
+
+def resolve_author(db: Session, model, object_id: int) -> Optional[int]:
+    """author_id квиза, к которому относится объект model (Quiz, Question, Answer); None, если объекта нет"""
+    memo = db.info.setdefault(_MEMO_KEY, {})
+    key = (model, object_id)
+    if key not in memo:
+        statement = _AUTHOR_QUERIES[model]().where(model.id == object_id)
+        # Объект хранится вместе с автором: identity map держит объекты по слабым ссылкам
+        memo[key] = db.execute(statement).first()
+    row = memo[key]
+    return row[1] if row is not None else None
+
+
+def authorize(db: Session, model, object_id: int, current_user: Optional[models.User]) -> bool:
+    """False, если объекта нет; при REQUIRE_AUTH 401 без пользователя и 403, если он не автор квиза"""
+    author_id = resolve_author(db, model, object_id)
+    if author_id is None:
+        return False
+    if settings.REQUIRE_AUTH:
+        if not current_user:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Authentication required"
+            )
+        if author_id != current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Not enough permissions"
+            )
+    return True
+
+
+def forget(db: Session) -> None:
+    """Сбросить запомненных авторов (после удаления или смены автора квиза)"""
+    db.info.pop(_MEMO_KEY, None)
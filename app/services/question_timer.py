@@ -0,0 +1,157 @@
+import asyncio
+import heapq
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+OnClose = Callable[[int, str, int, dict], Awaitable[None]]
+OnAdvance = Callable[[int, str, int], Awaitable[None]]
+
+# Виды записей в куче дедлайнов
+EVENT_CLOSE = 0
+EVENT_ADVANCE = 1
+
+
+class QuestionState:
+    """Открытый вопрос сессии и статистика ответов на него"""
+
+    def __init__(self, session_url: str):
+        self.session_url = session_url
+        self.question_id: Optional[int] = None
+        self.deadline: Optional[float] = None  # время loop.time(), после которого ответы не принимаются
+        self.closed: Set[int] = set()
+        self.answered = 0
+        self.correct = 0
+        self.answer_counts: Dict[int, int] = {}  # answer_id -> сколько раз выбран
+
+
+class QuestionTimer:
+    """Закрытие вопросов по Question.time_limit: одна куча дедлайнов и одна задача на все сессии"""
+
+    def __init__(self, grace: float, auto_advance: bool, advance_delay: float):
+        self.grace = grace
+        self.auto_advance = auto_advance
+        self.advance_delay = advance_delay
+        self.on_close: Optional[OnClose] = None
+        self.on_advance: Optional[OnAdvance] = None
+        self.sessions: Dict[int, QuestionState] = {}
+        self._heap: List[Tuple[float, int, int, int, int]] = []  # (время, seq, вид, session_id, question_id)
+        self._seq = 0
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def accepts(self, session_id: int, question_id: int) -> bool:
+        """Принимается ли сейчас ответ на вопрос: только на открытый вопрос сессии и до дедлайна.
+        Без ограничения по времени принимаются ответы на открытый вопрос без time_limit.
+        Если в этом процессе сессия еще не открывала вопрос, ответ не принимается"""
+        state = self.sessions.get(session_id)
+        if state is None or question_id != state.question_id or question_id in state.closed:
+            return False
+        if state.deadline is None:
+            return True
+        return asyncio.get_running_loop().time() <= state.deadline
+
+    def record_answer(self, session_id: int, question_id: int, answer_id: Optional[int], is_correct: Optional[bool]) -> None:
+        state = self.sessions.get(session_id)
+        if state is None or state.question_id != question_id:
+            return
+        state.answered += 1
+        if is_correct:
+            state.correct += 1
+        if answer_id:
+            state.answer_counts[answer_id] = state.answer_counts.get(answer_id, 0) + 1
+
+    async def open_question(self, session_id: int, session_url: str, question_id: int, time_limit: Optional[int]) -> None:
+        """Открытие нового вопроса; предыдущий открытый вопрос сессии закрывается"""
+        state = self.sessions.get(session_id)
+        if state is None:
+            state = self.sessions[session_id] = QuestionState(session_url)
+        elif state.question_id is not None and state.question_id not in state.closed:
+            await self._close(session_id, state, expired=False)
+
+        state.question_id = question_id
+        state.answered = 0
+        state.correct = 0
+        state.answer_counts = {}
+        state.closed.discard(question_id)
+        if time_limit and time_limit > 0:
+            state.deadline = asyncio.get_running_loop().time() + time_limit + self.grace
+            self._schedule(state.deadline, EVENT_CLOSE, session_id, question_id)
+        else:
+            state.deadline = None
+
+    def _schedule(self, when: float, kind: int, session_id: int, question_id: int) -> None:
+        self._seq += 1
+        heapq.heappush(self._heap, (when, self._seq, kind, session_id, question_id))
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        elif self._heap[0][1] == self._seq:
+            # Новая запись раньше всех ожидающих - будим задачу, чтобы пересчитать ожидание
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while self._heap:
+            delay = self._heap[0][0] - loop.time()
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            _, _, kind, session_id, question_id = heapq.heappop(self._heap)
+            try:
+                await self._fire(kind, session_id, question_id)
+            except Exception as e:
+                logger.error(f"Ошибка таймера вопроса {question_id} сессии {session_id}: {e}")
+
+    async def _fire(self, kind: int, session_id: int, question_id: int) -> None:
+        # Записи, устаревшие после перехода к другому вопросу или конца игры, пропускаются
+        state = self.sessions.get(session_id)
+        if state is None or state.question_id != question_id:
+            return
+        if kind == EVENT_CLOSE:
+            if question_id not in state.closed:
+                await self._close(session_id, state, expired=True)
+        elif kind == EVENT_ADVANCE and self.on_advance is not None:
+            await self.on_advance(session_id, state.session_url, question_id)
+
+    async def _close(self, session_id: int, state: QuestionState, expired: bool) -> None:
+        question_id = state.question_id
+        state.closed.add(question_id)
+        state.deadline = None
+        results = {
+            "answered": state.answered,
+            "correct": state.correct,
+            "answer_counts": [
+                {"answer_id": answer_id, "count": count} for answer_id, count in state.answer_counts.items()
+            ]
+        }
+        if self.on_close is not None:
+            await self.on_close(session_id, state.session_url, question_id, results)
+        if expired and self.auto_advance:
+            self._schedule(asyncio.get_running_loop().time() + self.advance_delay, EVENT_ADVANCE, session_id, question_id)
+
+    def clear(self, session_id: int) -> None:
+        self.sessions.pop(session_id, None)
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+question_timer = QuestionTimer(
+    grace=settings.QUESTION_TIMER_GRACE_MS / 1000,
+    auto_advance=settings.QUESTION_AUTO_ADVANCE,
+    advance_delay=settings.QUESTION_AUTO_ADVANCE_DELAY,
+)
@@ -0,0 +1,77 @@
+"""Полный квиз (GET /api/quizzes/{id}/full): JSON собирается один раз на версию квиза.
+
+Версия хранится в quizzes.version и растет в той же транзакции, что и правка квиза,
+вопроса или ответа, поэтому ее видят все воркеры. Запрос читает только версию; если
+у клиента та же версия (If-None-Match), отвечаем 304, если она есть в кэше воркера -
+отдаем готовые байты, иначе загружаем дерево через selectinload и сериализуем.
+"""
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.schemas import schemas
+from app.services import crud
+
+
+class TreeCache:
+    """quiz_id -> (версия, JSON); хранится только последняя версия, давно не запрошенные вытесняются"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items: "OrderedDict[int, Tuple[int, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, quiz_id: int, version: int) -> Optional[bytes]:
+        with self._lock:
+            item = self._items.get(quiz_id)
+            if item is None or item[0] != version:
+                return None
+            self._items.move_to_end(quiz_id)
+            return item[1]
+
+    def set(self, quiz_id: int, version: int, body: bytes) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            current = self._items.get(quiz_id)
+            # Ответ, собранный по более старой версии, не вытесняет новую
+            if current is not None and current[0] > version:
+                return
+            self._items[quiz_id] = (version, body)
+            self._items.move_to_end(quiz_id)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+
+tree_cache = TreeCache(settings.QUIZ_TREE_CACHE_SIZE)
+
+
+def etag(quiz_id: int, version: int) -> str:
+    return f'"quiz-{quiz_id}-v{version}"'
+
+
+def etag_matches(if_none_match: Optional[str], current: str) -> bool:
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == "*" or candidate == current:
+            return True
+    return False
+
+
+def render(db: Session, quiz_id: int) -> Optional[Tuple[int, bytes]]:
+    """(версия, JSON) квиза; None, если квиза нет"""
+    quiz = crud.get_quiz_tree(db, quiz_id)
+    if quiz is None:
+        return None
+    tree = schemas.QuizFullOut.model_validate(quiz, from_attributes=True)
+    tree.questions.sort(key=lambda question: (question.order_index, question.id))
+    body = tree.model_dump_json().encode()
+    tree_cache.set(quiz_id, quiz.version, body)
+    return quiz.version, body
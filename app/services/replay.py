@@ -0,0 +1,39 @@
+import uuid
+from collections import deque
+from itertools import islice
+from typing import Deque, List, Optional, Tuple
+
+
+class ReplayBuffer:
+    """Последние события сессии с порядковыми номерами для докачки после переподключения.
+
+    Номера выдает воркер, доставляющий события своим сокетам; epoch меняется при
+    пересоздании буфера (перезапуск воркера, другой воркер), и тогда клиент
+    получает полный снимок вместо докачки.
+    """
+
+    def __init__(self, size: int):
+        self.epoch = uuid.uuid4().hex[:12]
+        self.seq = 0
+        self.frames: Deque[Tuple[int, str]] = deque(maxlen=size)  # (seq, кадр)
+
+    def stamp(self, frame: str) -> str:
+        """Добавление seq в JSON-кадр (объект) без повторного кодирования и запись в буфер"""
+        self.seq += 1
+        body = frame[:-1].rstrip()
+        # У пустого объекта ({}) нет полей, перед seq запятая не нужна
+        separator = "" if body.endswith("{") else ","
+        stamped = f'{body}{separator}"seq":{self.seq}}}'
+        self.frames.append((self.seq, stamped))
+        return stamped
+
+    def since(self, last_seq: int) -> Optional[List[str]]:
+        """Кадры после last_seq; None, если часть из них уже вытеснена из буфера"""
+        if last_seq < 0 or last_seq > self.seq:
+            return None
+        if last_seq == self.seq:
+            return []
+        first_seq = self.frames[0][0] if self.frames else self.seq + 1
+        if first_seq > last_seq + 1:
+            return None
+        return [frame for _, frame in islice(self.frames, last_seq + 1 - first_seq, None)]
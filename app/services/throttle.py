@@ -0,0 +1,82 @@
+import time
+from typing import Dict, Optional, Tuple
+
+from app.core.config import settings
+
+# Категории входящих сообщений, для каждой свой лимит
+CATEGORY_CHAT = "chat"
+CATEGORY_ANSWER = "answer"
+CATEGORY_WEBRTC = "webrtc"
+CATEGORY_UNKNOWN = "unknown"
+CATEGORY_DEFAULT = "default"
+
+MESSAGE_CATEGORIES = {
+    "chat_message": CATEGORY_CHAT,
+    "submit_answer": CATEGORY_ANSWER,
+    "webrtc_offer": CATEGORY_WEBRTC,
+    "webrtc_answer": CATEGORY_WEBRTC,
+    "webrtc_ice_candidate": CATEGORY_WEBRTC,
+    "webrtc_register_host": CATEGORY_WEBRTC,
+    "webrtc_register_viewer": CATEGORY_WEBRTC,
+    "ping": CATEGORY_DEFAULT,
+    "pong": CATEGORY_DEFAULT,
+    "get_session_info": CATEGORY_DEFAULT,
+    "get_leaderboard": CATEGORY_DEFAULT,
+    "get_players_list": CATEGORY_DEFAULT,
+    "start_game": CATEGORY_DEFAULT,
+    "pause_game": CATEGORY_DEFAULT,
+    "next_question": CATEGORY_DEFAULT,
+    "end_game": CATEGORY_DEFAULT,
+}
+
+
+def default_limits() -> Dict[str, Tuple[float, float]]:
+    """Лимиты из настроек: категория -> (сообщений в секунду, размер всплеска)"""
+    return {
+        CATEGORY_CHAT: (settings.WS_RATE_CHAT_PER_SEC, settings.WS_RATE_CHAT_BURST),
+        CATEGORY_ANSWER: (settings.WS_RATE_ANSWER_PER_SEC, settings.WS_RATE_ANSWER_BURST),
+        CATEGORY_WEBRTC: (settings.WS_RATE_WEBRTC_PER_SEC, settings.WS_RATE_WEBRTC_BURST),
+        CATEGORY_UNKNOWN: (settings.WS_RATE_UNKNOWN_PER_SEC, settings.WS_RATE_UNKNOWN_BURST),
+        CATEGORY_DEFAULT: (settings.WS_RATE_DEFAULT_PER_SEC, settings.WS_RATE_DEFAULT_BURST),
+    }
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def allow(self, now: float) -> bool:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class MessageThrottle:
+    """Лимиты входящих сообщений одного сокета: отдельный token bucket на каждую категорию"""
+
+    __slots__ = ("limits", "buckets", "dropped")
+
+    def __init__(self, limits: Dict[str, Tuple[float, float]]):
+        self.limits = limits
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.dropped = 0
+
+    def allow(self, message_type: Optional[str]) -> bool:
+        category = MESSAGE_CATEGORIES.get(message_type, CATEGORY_UNKNOWN) if isinstance(message_type, str) else CATEGORY_UNKNOWN
+        now = time.monotonic()
+        bucket = self.buckets.get(category)
+        if bucket is None:
+            rate, burst = self.limits[category]
+            bucket = self.buckets[category] = TokenBucket(rate, burst, now)
+        if bucket.allow(now):
+            return True
+        self.dropped += 1
+        return False
@@ -0,0 +1,57 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Response, status
+
+# Курсор keyset-пагинации: ключ сортировки последней строки страницы в base64url(JSON).
+# Следующая страница выбирается условием WHERE (ключ) > курсор по индексу, а не OFFSET,
+# поэтому глубокие страницы не медленнее первых и строки не сдвигаются при вставках
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class Keyset:
+    """Ключ сортировки списка: kind - вид списка в курсоре, чтобы курсор одного списка
+    не подставили в другой; types - типы значений ключа; key - значения ключа строки;
+    nullable - номера значений ключа, которые могут быть NULL (столбец без NOT NULL)"""
+
+    def __init__(self, kind: str, types: Sequence[type], key: Callable[[Any], Sequence[Any]], nullable: Sequence[int] = ()):
+        self.kind = kind
+        self.types = tuple(types)
+        self.key = key
+        self.nullable = frozenset(nullable)
+
+    def encode(self, values: Sequence[Any]) -> str:
+        payload = [self.kind] + [value.isoformat() if isinstance(value, datetime) else value for value in values]
+        return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode().rstrip("=")
+
+    def decode(self, cursor: str) -> Tuple[Any, ...]:
+        """Значения ключа из курсора; 400, если курсор поврежден или от другого списка"""
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+            if payload[0] != self.kind or len(payload) != len(self.types) + 1:
+                raise ValueError(cursor)
+            return tuple(
+                None if value is None and position in self.nullable
+                else datetime.fromisoformat(value) if value_type is datetime else value_type(value)
+                for position, (value_type, value) in enumerate(zip(self.types, payload[1:]))
+            )
+        except (ValueError, TypeError, IndexError, KeyError):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor"
+            )
+
+    def next_cursor(self, rows: List[Any], limit: int) -> Optional[str]:
+        """Курсор следующей страницы; None, если страница неполная (дальше строк нет)"""
+        if limit <= 0 or len(rows) < limit:
+            return None
+        return self.encode(self.key(rows[-1]))
+
+
+def set_next_cursor(response: Response, keyset: Keyset, rows: List[Any], limit: int) -> None:
+    cursor = keyset.next_cursor(rows, limit)
+    if cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
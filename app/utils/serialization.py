@@ -0,0 +1,77 @@
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+def dumps(obj: Any) -> str:
+    """Кодирование сообщения в JSON-текст: orjson, если установлен, иначе stdlib json"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj).decode("utf-8")
+        except TypeError:
+            # Например, целые за пределами 64 бит - их умеет только stdlib
+            pass
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+# Подпротоколы WebSocket сессии. Без заголовка Sec-WebSocket-Protocol используется JSON
+SUBPROTOCOL_JSON = "quiz.json.v1"
+SUBPROTOCOL_MSGPACK = "quiz.msgpack.v1"
+
+# Коды типов сообщений для MessagePack-кадров [код, тело без поля type].
+# Список только дополняется: код - позиция в списке, 0 - тип не из списка (type остается в теле)
+MESSAGE_TYPES = [
+    None,
+    # сервер -> клиент
+    "session_joined", "session_info", "players_list", "player_joined", "player_left",
+    "score_changed", "leaderboard_update", "leaderboard", "question_available", "question_sent",
+    "answer_submitted", "answers_progress", "game_started", "game_paused", "game_ended",
+    "status_updated", "chat_message", "error", "pong",
+    "webrtc_host_registered", "webrtc_viewer_registered", "webrtc_viewer_connected",
+    "webrtc_offer", "webrtc_answer", "webrtc_ice_candidate",
+    # клиент -> сервер
+    "ping", "get_session_info", "get_leaderboard", "get_players_list", "submit_answer",
+    "start_game", "pause_game", "next_question", "end_game",
+    "webrtc_register_host", "webrtc_register_viewer",
+    # сервер -> клиент (добавлены позже)
+    "question_closed", "session_resumed", "players_joined",
+]
+MESSAGE_TYPE_CODES = {name: code for code, name in enumerate(MESSAGE_TYPES) if name}
+
+
+def msgpack_available() -> bool:
+    return msgpack is not None
+
+
+def pack(message: dict) -> bytes:
+    """Кодирование сообщения в MessagePack-кадр [код типа, тело]"""
+    code = MESSAGE_TYPE_CODES.get(message.get("type"), 0)
+    body = {key: value for key, value in message.items() if key != "type"} if code else message
+    return msgpack.packb([code, body], use_bin_type=True)
+
+
+def unpack(data: bytes) -> dict:
+    code, body = msgpack.unpackb(data, raw=False)
+    if code:
+        body["type"] = MESSAGE_TYPES[code]
+    return body
+
+
+def json_frame_to_msgpack(frame: str) -> bytes:
+    """Перекодирование уже закодированного JSON-кадра рассылки для MessagePack-клиентов"""
+    return pack(loads(frame))
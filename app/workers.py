@@ -0,0 +1,105 @@
+"""Запуск нескольких процессов uvicorn с привязкой сессий к процессам.
+
+nginx выбирает процесс по consistent hash от session_url (upstream из render_upstream):
+сокеты сессии и управляющие REST-запросы хоста (заголовок X-Session-Url) попадают
+в один процесс, поэтому рассылке в пределах сессии не нужен Redis pub/sub. Остальное общее
+состояние (ограничения частоты входа, сброс кэшей авторизации и контекстов игр) хранится
+в Redis, поэтому несколько процессов требуют USE_INMEMORY_REDIS=false и REDIS_URL.
+
+    python -m app.workers --workers 4 --base-port 8001 --upstream-host backend --upstream-file nginx.upstream.conf
+"""
+import argparse
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import List
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+UPSTREAM_NAME = "quiz_backend"
+
+
+def render_upstream(host: str, ports: List[int]) -> str:
+    """Блок upstream для nginx; ключ $session_affinity_key задается в nginx.conf"""
+    servers = "".join(f"    server {host}:{port};\n" for port in ports)
+    return (
+        f"# Сгенерировано: python -m app.workers --workers {len(ports)} --base-port {ports[0]} --upstream-host {host}\n"
+        f"upstream {UPSTREAM_NAME} {{\n"
+        f"    hash $session_affinity_key consistent;\n"
+        f"{servers}"
+        f"}}\n"
+    )
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Несколько процессов uvicorn с привязкой сессий к процессам")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--base-port", type=int, default=8001)
+    parser.add_argument("--upstream-host", default="127.0.0.1", help="адрес процессов, как его видит nginx")
+    parser.add_argument("--upstream-file", help="куда записать upstream для nginx")
+    parser.add_argument("--print-upstream", action="store_true", help="только вывести upstream и выйти")
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str]) -> int:
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    args = parse_args(argv)
+    ports = [args.base_port + i for i in range(max(args.workers, 1))]
+    upstream = render_upstream(args.upstream_host, ports)
+    if args.print_upstream:
+        sys.stdout.write(upstream)
+        return 0
+    if len(ports) > 1 and settings.USE_INMEMORY_REDIS:
+        # У каждого процесса был бы свой fakeredis: лимиты и сброс кэшей не видны другим процессам
+        logger.error("Несколько процессов требуют общий Redis: задайте USE_INMEMORY_REDIS=false и REDIS_URL")
+        return 2
+    if args.upstream_file:
+        with open(args.upstream_file, "w") as f:
+            f.write(upstream)
+        logger.info(f"Upstream для nginx записан в {args.upstream_file}")
+
+    processes = [
+        subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--host", args.host, "--port", str(port)])
+        for port in ports
+    ]
+    logger.info(f"Запущено процессов: {len(processes)}, порты {ports[0]}-{ports[-1]}")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    # Сессии привязаны к процессам, поэтому упавший процесс не подменяется другим:
+    # останавливаем все и отдаем перезапуск супервизору (docker, systemd)
+    exit_code = 0
+    while not stopping:
+        exited = [p for p in processes if p.poll() is not None]
+        if exited:
+            exit_code = exited[0].returncode or 1
+            logger.error(f"Процесс {exited[0].pid} завершился с кодом {exited[0].returncode}, останавливаем остальные")
+            break
+        time.sleep(0.5)
+
+    for process in processes:
+        if process.poll() is None:
+            process.send_signal(signal.SIGINT)
+    for process in processes:
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,169 @@
+"""Рассылка одного события на N сокетов: кодирование для каждого сокета против одного кадра на рассылку.
+
+    python -m bench.broadcast_encode --sockets 5000 --repeat 5
+
+Сокеты ненастоящие: send_text только считает кадры, поэтому замер показывает работу самого
+воркера. Сообщение - question_available с вопросом на четыре варианта ответа.
+
+- кодирование: json.dumps на каждого получателя (как send_json в цикле) против одного
+  app.utils.serialization.dumps;
+- рассылка целиком через ConnectionManager (InMemoryBroadcastBackend, очереди ConnectionWriter):
+  json.dumps для каждого сокета против broadcast с одним кадром; время до получения кадра
+  последним сокетом.
+
+Печатается медиана из --repeat повторов. Сервер и БД не нужны; DATABASE_URL, если не задан,
+указывает на SQLite во временном каталоге (app.db.session создает движок при импорте).
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, List
+
+SESSION_URL = "bench-broadcast"
+
+
+class CountingWebSocket:
+    """Сокет, который только считает полученные кадры"""
+
+    def __init__(self, on_frame: Callable[[], None]):
+        self.on_frame = on_frame
+
+    async def send_text(self, frame: str):
+        self.on_frame()
+
+    async def send_bytes(self, frame: bytes):
+        self.on_frame()
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        pass
+
+
+class Delivery:
+    """Счетчик доставленных кадров одной рассылки"""
+
+    def __init__(self):
+        self.received = 0
+        self.expected = 0
+        self.done = asyncio.Event()
+
+    def reset(self, expected: int) -> None:
+        self.received = 0
+        self.expected = expected
+        self.done.clear()
+
+    def frame(self) -> None:
+        self.received += 1
+        if self.received >= self.expected:
+            self.done.set()
+
+
+def question_message(question_id: int = 1) -> dict:
+    return {
+        "type": "question_available",
+        "question_id": question_id,
+        "session_id": 1,
+        "question": {
+            "id": question_id,
+            "quiz_id": 1,
+            "text": "Какая планета Солнечной системы самая большая по массе и по объему?",
+            "type": "test",
+            "time_limit": 30,
+            "order_index": 0,
+            "score": 1,
+            "media": {"id": 7, "url": "/media/quiz/1/question-1.jpg", "type": "image"},
+            "answers": [
+                {"id": question_id * 10 + option, "text": text}
+                for option, text in enumerate(["Юпитер", "Сатурн", "Нептун", "Земля"])
+            ]
+        }
+    }
+
+
+def median_ms(samples: List[float]) -> float:
+    return round(statistics.median(samples) * 1000, 3)
+
+
+def measure_encoding(message: dict, sockets: int, repeat: int) -> dict:
+    from app.utils.serialization import dumps
+
+    per_socket, once = [], []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(sockets):
+            json.dumps(message)
+        per_socket.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        dumps(message)
+        once.append(time.perf_counter() - started)
+    return {"per_socket_ms": median_ms(per_socket), "once_ms": median_ms(once)}
+
+
+async def measure_fanout(message: dict, sockets: int, repeat: int) -> dict:
+    from app.models import models
+    from app.routers.websocket import ConnectionManager
+
+    delivery = Delivery()
+    manager = ConnectionManager()
+    per_socket, encode_once = [], []
+
+    async def timed(send) -> float:
+        delivery.reset(sockets)
+        started = time.perf_counter()
+        await send()
+        await asyncio.wait_for(delivery.done.wait(), timeout=60)
+        return time.perf_counter() - started
+
+    async def send_per_socket():
+        # Прежняя рассылка: свой json.dumps для каждого сокета, те же очереди отправки
+        for ws in manager.active_connections[SESSION_URL]:
+            manager._enqueue(ws, json.dumps(message))
+
+    async def send_once():
+        await manager.broadcast(SESSION_URL, message)
+
+    try:
+        for user_id in range(1, sockets + 1):
+            await manager.connect(SESSION_URL, CountingWebSocket(delivery.frame), models.User(id=user_id))
+        for _ in range(repeat):
+            per_socket.append(await timed(send_per_socket))
+            encode_once.append(await timed(send_once))
+    finally:
+        await manager.close()
+    return {"per_socket_ms": median_ms(per_socket), "encode_once_ms": median_ms(encode_once)}
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Кодирование рассылки: на каждый сокет или один раз")
+    parser.add_argument("--sockets", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    workdir = tempfile.TemporaryDirectory(prefix="quiz-bench-")
+    try:
+        os.environ.setdefault("DATABASE_URL", f"sqlite:///{workdir.name}/bench.db")
+        os.environ.setdefault("SECRET_KEY", "bench-secret")
+        message = question_message()
+
+        encoding = measure_encoding(message, args.sockets, args.repeat)
+        fanout = asyncio.run(measure_fanout(message, args.sockets, args.repeat))
+
+        print(f"Сокетов: {args.sockets}, кадр {len(json.dumps(message))} байт, медиана из {args.repeat}")
+        print(f"Кодирование: json.dumps на сокет {encoding['per_socket_ms']} мс, один dumps {encoding['once_ms']} мс")
+        print(f"Рассылка целиком: json.dumps на сокет {fanout['per_socket_ms']} мс, "
+              f"ConnectionManager.broadcast {fanout['encode_once_ms']} мс")
+        return 0
+    finally:
+        workdir.cleanup()
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,181 @@
+"""Простаивающие сокеты сессии не держат соединения пула БД.
+
+    python -m bench.idle_sockets --sockets 1000 --hold 5
+
+Поднимает сервер так же, как bench.loadgen (или использует --url), подключает к одной сессии
+хоста и --sockets игроков, ждет, пока каждый получит players_list, и держит сокеты открытыми
+--hold секунд, отвечая только на ping. Затем читает quiz_db_pool_connections из /api/metrics
+(checked_out синхронного и асинхронного пула) и замеряет --requests запросов GET /api/quizzes/:
+пока соединение БД держит каждый сокет, пул исчерпан и REST ждет pool_timeout.
+
+Код возврата 1, если подключились не все игроки или в пуле остались выданные соединения.
+"""
+import argparse
+import asyncio
+import json
+import re
+import sys
+import tempfile
+import time
+import urllib.request
+from typing import Dict, List, Tuple
+
+import websockets
+
+from bench.loadgen import Api, create_game, latency_summary, raise_fd_limit, seed_players, start_server, stop_server
+
+POOL_METRIC = re.compile(r'^quiz_db_pool_connections\{engine="(\w+)",state="(\w+)"\} (\S+)$', re.M)
+
+
+class Room:
+    """Сокеты, дошедшие до players_list, и задержка входа каждого"""
+
+    def __init__(self, expected: int):
+        self.expected = expected
+        self.joined = 0
+        self.failed: List[str] = []
+        self.join_latency: List[float] = []
+        self.ready = asyncio.Event()
+
+    def settle(self) -> None:
+        if self.joined + len(self.failed) >= self.expected:
+            self.ready.set()
+
+
+async def idle_client(room: Room, url: str, connect_at: float) -> None:
+    await asyncio.sleep(max(0.0, connect_at - time.perf_counter()))
+    started = time.perf_counter()
+    joined = False
+    try:
+        async with websockets.connect(url, open_timeout=120, max_size=None, ping_interval=None) as ws:
+            async for raw in ws:
+                message_type = json.loads(raw).get("type")
+                if message_type == "ping":
+                    await ws.send('{"type":"pong"}')
+                elif message_type == "players_list" and not joined:
+                    joined = True
+                    room.joined += 1
+                    room.join_latency.append(time.perf_counter() - started)
+                    room.settle()
+    except (OSError, asyncio.TimeoutError, websockets.WebSocketException) as e:
+        if not joined:
+            room.failed.append(f"{type(e).__name__}: {e}")
+            room.settle()
+
+
+def pool_usage(api: Api) -> Dict[Tuple[str, str], int]:
+    # /api/metrics отдает текст Prometheus, а не JSON, поэтому мимо Api.request
+    with urllib.request.urlopen(api.base_url + "/api/metrics", timeout=60) as response:
+        text = response.read().decode()
+    return {(engine, state): int(float(value)) for engine, state, value in POOL_METRIC.findall(text)}
+
+
+def time_requests(api: Api, token: str, count: int) -> List[float]:
+    latencies = []
+    for _ in range(count):
+        started = time.perf_counter()
+        api.request("GET", "/api/quizzes/", token=token)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+async def run(args, api: Api) -> dict:
+    run_id = f"{int(time.time()):x}"
+    session_url = f"bench-idle-{run_id}"
+    host = api.signup(f"bench_idle_host_{run_id}")
+    tokens = seed_players(f"bench_idle_{run_id}_p", args.sockets)
+    create_game(api, host, session_url, questions=1, time_limit=60)
+    ws_url = f"{api.base_url.replace('http', 'ws', 1)}/api/ws/{session_url}"
+
+    room = Room(len(tokens) + 1)
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    clients = [asyncio.create_task(idle_client(room, f"{ws_url}?token={host['token']}", started))]
+    clients += [
+        asyncio.create_task(idle_client(room, f"{ws_url}?token={token}", started + i / args.connect_rate))
+        for i, token in enumerate(tokens)
+    ]
+    try:
+        await asyncio.wait_for(room.ready.wait(), timeout=args.sockets / args.connect_rate + 120)
+        join_seconds = time.perf_counter() - started
+        await asyncio.sleep(args.hold)
+        # urllib блокирует, поэтому запросы идут из пула потоков, пока сокеты отвечают на ping
+        pool = await loop.run_in_executor(None, pool_usage, api)
+        rest = await loop.run_in_executor(None, time_requests, api, host["token"], args.requests)
+    finally:
+        for task in clients:
+            task.cancel()
+        await asyncio.gather(*clients, return_exceptions=True)
+
+    result = {
+        "sockets": room.expected,
+        "joined": room.joined,
+        "join_errors": len(room.failed),
+        "join_seconds": round(join_seconds, 2),
+        "join_latency": latency_summary(room.join_latency),
+        "pool": {f"{engine}_{state}": value for (engine, state), value in sorted(pool.items())},
+        "rest_latency": latency_summary(rest),
+    }
+    if room.failed:
+        result["first_join_error"] = room.failed[0]
+    return result
+
+
+def print_report(result: dict) -> None:
+    def latency(summary: dict) -> str:
+        if not summary["count"]:
+            return "нет данных"
+        return f"p50 {summary['p50_ms']} мс, p99 {summary['p99_ms']} мс, max {summary['max_ms']} мс ({summary['count']})"
+
+    print(f"Сокеты: {result['joined']}/{result['sockets']} подключены за {result['join_seconds']} с, ошибок {result['join_errors']}")
+    print(f"Вход (до players_list): {latency(result['join_latency'])}")
+    pool = result["pool"]
+    for engine in ("sync", "async"):
+        if f"{engine}_size" in pool:
+            print(f"Пул {engine}: выдано {pool[f'{engine}_checked_out']} из {pool[f'{engine}_size']}, overflow {pool[f'{engine}_overflow']}")
+    if not pool:
+        print("Пул: метрики quiz_db_pool_connections недоступны (METRICS_ENABLED=false или пул без счетчиков)")
+    print(f"GET /api/quizzes/ при открытых сокетах: {latency(result['rest_latency'])}")
+    if "first_join_error" in result:
+        print(f"Первая ошибка подключения: {result['first_join_error']}")
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Пул соединений БД при простаивающих сокетах")
+    parser.add_argument("--sockets", type=int, default=1000)
+    parser.add_argument("--hold", type=float, default=5.0, help="сколько секунд держать сокеты до замера, с")
+    parser.add_argument("--requests", type=int, default=50, help="REST-запросов при открытых сокетах")
+    parser.add_argument("--connect-rate", type=float, default=500.0, help="подключений в секунду")
+    parser.add_argument("--url", help="адрес запущенного сервера; без него сервер поднимается локально")
+    parser.add_argument("--database-url", help="БД локального сервера; по умолчанию SQLite во временном каталоге")
+    parser.add_argument("--port", type=int, default=8791)
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    raise_fd_limit()
+    server_proc = None
+    workdir = tempfile.TemporaryDirectory(prefix="quiz-bench-")
+    try:
+        if args.url:
+            base_url = args.url
+        else:
+            server_proc = start_server(args, workdir.name)
+            base_url = f"http://127.0.0.1:{args.port}"
+        api = Api(base_url)
+        api.wait_ready(60)
+
+        result = asyncio.run(run(args, api))
+
+        print_report(result)
+        checked_out = sum(value for key, value in result["pool"].items() if key.endswith("_checked_out"))
+        return 0 if result["joined"] == result["sockets"] and checked_out == 0 else 1
+    finally:
+        if server_proc is not None:
+            stop_server(server_proc)
+        workdir.cleanup()
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,491 @@
+"""Нагрузочный прогон протокола сессии: хост и N игроков в одной сессии через /api/ws/{session_url}.
+
+    python -m bench.loadgen --players 2000 --questions 5 --json result.json
+
+Без --url поднимается uvicorn app.main:app на SQLite во временном каталоге с in-memory Redis
+(fakeredis); --database-url подставляет другую БД (например, Postgres). Хост и первые --signup
+игроков проходят /api/auth/signup и /api/auth/token, остальные игроки создаются напрямую в БД
+и получают токен через create_access_token: bcrypt на тысячах регистраций измерял бы только его.
+Для чужого сервера (--url) DATABASE_URL и SECRET_KEY берутся из окружения, как у самого сервера.
+
+Прогон: подключение игроков со скоростью --connect-rate, start_game, затем --questions раз
+next_question; каждый игрок отвечает через случайную задержку до --answer-spread секунд.
+С --count-frames считаются кадры, полученные игроками и хостом, по типам в среднем на вопрос
+(например, answers_progress: сколько кадров прогресса ответов уходит в комнату).
+Генератор работает в одном процессе и на одной машине с сервером делит с ним CPU.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import websockets
+
+PASSWORD = "bench-password"
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def latency_summary(values: List[float]) -> dict:
+    """Сводка задержек в миллисекундах"""
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 0.50) * 1000, 1),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 1),
+        "max_ms": round(max(values) * 1000, 1)
+    }
+
+
+class ServerProcess:
+    """Замеры RSS и CPU процесса сервера через /proc (Linux)"""
+
+    def __init__(self, pid: Optional[int]):
+        self.pid = pid
+        self.peak_rss = 0
+        self.samples: Dict[str, int] = {}
+
+    def rss(self) -> Optional[int]:
+        if self.pid is None:
+            return None
+        try:
+            with open(f"/proc/{self.pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            return None
+        return None
+
+    def cpu_seconds(self) -> Optional[float]:
+        if self.pid is None:
+            return None
+        try:
+            with open(f"/proc/{self.pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            return None
+        # utime и stime - 14 и 15 поля stat, считая от pid
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+    def mark(self, name: str) -> None:
+        rss = self.rss()
+        if rss is not None:
+            self.samples[name] = rss
+            self.peak_rss = max(self.peak_rss, rss)
+
+    async def sample(self, interval: float = 0.5) -> None:
+        while True:
+            self.mark("last")
+            await asyncio.sleep(interval)
+
+    def summary(self) -> dict:
+        mb = lambda value: round(value / 2**20, 1)
+        result = {f"rss_{name}_mb": mb(value) for name, value in self.samples.items() if name != "last"}
+        if self.peak_rss:
+            result["rss_peak_mb"] = mb(self.peak_rss)
+        return result
+
+
+class Api:
+    """Минимальный HTTP-клиент на urllib, чтобы генератору хватало зависимостей сервера"""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip("/")
+
+    def request(self, method: str, path: str, body=None, form=None, token: Optional[str] = None):
+        headers = {}
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+        elif form is not None:
+            data = urllib.parse.urlencode(form).encode()
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        request = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                return json.loads(response.read() or b"null")
+        except urllib.error.HTTPError as e:
+            raise RuntimeError(f"{method} {path}: {e.code} {e.read().decode(errors='replace')}") from None
+
+    def wait_ready(self, timeout: float) -> None:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                self.request("GET", "/api")
+                return
+            except (OSError, RuntimeError):
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"Сервер {self.base_url} не ответил за {timeout:.0f} с")
+                time.sleep(0.2)
+
+    def signup(self, username: str) -> dict:
+        email = f"{username}@quiz-bench.io"
+        user = self.request("POST", "/api/auth/signup", {"username": username, "email": email, "password": PASSWORD})
+        token = self.request("POST", "/api/auth/token", form={"username": email, "password": PASSWORD})["access_token"]
+        return {"id": user["id"], "token": token}
+
+
+def seed_players(prefix: str, count: int) -> List[str]:
+    """Игроки без регистрации через API: одна вставка и токены, выписанные локально"""
+    if count <= 0:
+        return []
+    from app.core.security import create_access_token
+    from app.db.session import SessionLocal
+    from app.models import models
+    from app.utils.common import hash_password
+
+    password_hash = hash_password(PASSWORD)
+    with SessionLocal() as db:
+        users = [
+            models.User(username=f"{prefix}{i}", email=f"{prefix}{i}@quiz-bench.io", password_hash=password_hash, role="player")
+            for i in range(count)
+        ]
+        db.add_all(users)
+        db.flush()
+        user_ids = [user.id for user in users]
+        db.commit()
+    return [create_access_token(str(user_id)) for user_id in user_ids]
+
+
+def create_game(api: Api, host: dict, session_url: str, questions: int, time_limit: int) -> List[dict]:
+    quiz = api.request("POST", "/api/quizzes/", {"title": f"Нагрузочный прогон {session_url}"}, token=host["token"])
+    for index in range(questions):
+        api.request("POST", f"/api/questions/quiz/{quiz['id']}", {
+            "text": f"Вопрос {index + 1}",
+            "type": "test",
+            "time_limit": time_limit,
+            "order_index": index,
+            "media_id": None,
+            "score": 1,
+            "answers": [
+                {"question_id": 0, "text": f"Вариант {option + 1}", "is_correct": option == 0}
+                for option in range(4)
+            ]
+        }, token=host["token"])
+    api.request("POST", "/api/sessions/", {
+        "quiz_id": quiz["id"], "host_id": host["id"], "url": session_url, "status": "waiting"
+    }, token=host["token"])
+    return api.request("GET", f"/api/questions/?quiz_id={quiz['id']}", token=host["token"])
+
+
+class Game:
+    """Общее состояние прогона: замеры и события, которых ждет хост"""
+
+    def __init__(self, players: int, questions: List[dict], answer_spread: float, count_frames: bool = False):
+        self.players = players
+        self.answers_by_question = {question["id"]: [answer["id"] for answer in question["answers"]] for question in questions}
+        self.answer_spread = answer_spread
+        self.joined = 0
+        self.all_joined = asyncio.Event()
+        self.join_latency: List[float] = []
+        self.join_errors: List[str] = []
+        self.question_sent_at = 0.0
+        self.delivery_latency: List[float] = []
+        self.answer_latency: List[float] = []
+        self.answered = 0
+        self.all_answered = asyncio.Event()
+        self.answer_windows: List[float] = []
+        self.errors: Dict[str, int] = {}
+        self.disconnects = 0
+        self.count_frames = count_frames
+        self.frames: Dict[str, Dict[str, int]] = {"players": {}, "host": {}}  # получатель -> тип -> кадров
+
+    def player_joined(self, latency: float) -> None:
+        self.join_latency.append(latency)
+        self.joined += 1
+        if self.joined >= self.players:
+            self.all_joined.set()
+
+    def player_failed(self, error: str) -> None:
+        self.join_errors.append(error)
+        self.players -= 1
+        if self.joined >= self.players:
+            self.all_joined.set()
+
+    def begin_question(self) -> None:
+        self.answered = 0
+        self.all_answered.clear()
+        self.question_sent_at = time.perf_counter()
+
+    def answer_acknowledged(self, latency: float) -> None:
+        self.answer_latency.append(latency)
+        self.answered += 1
+        if self.answered >= self.joined:
+            self.all_answered.set()
+
+    def error(self, message: str) -> None:
+        self.errors[message] = self.errors.get(message, 0) + 1
+
+    def frame(self, receiver: str, message_type: Optional[str]) -> None:
+        if self.count_frames:
+            counts = self.frames[receiver]
+            counts[message_type] = counts.get(message_type, 0) + 1
+
+
+async def play(game: Game, ws_url: str, token: str, connect_at: float) -> None:
+    await asyncio.sleep(max(0.0, connect_at - time.perf_counter()))
+    started = time.perf_counter()
+    joined = False
+    pending: Dict[int, float] = {}  # question_id -> время отправки ответа
+    answer_tasks = []
+
+    async def answer(ws, question_id: int) -> None:
+        await asyncio.sleep(random.uniform(0, game.answer_spread))
+        pending[question_id] = time.perf_counter()
+        await ws.send(json.dumps({
+            "type": "submit_answer",
+            "question_id": question_id,
+            "answer_id": random.choice(game.answers_by_question[question_id])
+        }))
+
+    try:
+        async with websockets.connect(f"{ws_url}?token={token}", open_timeout=120, max_size=None, ping_interval=None) as ws:
+            async for raw in ws:
+                message = json.loads(raw)
+                message_type = message.get("type")
+                game.frame("players", message_type)
+                if message_type == "ping":
+                    await ws.send('{"type":"pong"}')
+                elif message_type == "players_list" and not joined:
+                    joined = True
+                    game.player_joined(time.perf_counter() - started)
+                elif message_type == "question_available" and message.get("question_id") not in pending:
+                    question_id = message["question_id"]
+                    pending[question_id] = 0.0
+                    game.delivery_latency.append(time.perf_counter() - game.question_sent_at)
+                    answer_tasks.append(asyncio.create_task(answer(ws, question_id)))
+                elif message_type == "answer_submitted":
+                    game.answer_acknowledged(time.perf_counter() - pending[message["question_id"]])
+                elif message_type == "error":
+                    game.error(message.get("message", ""))
+    except (OSError, asyncio.TimeoutError, websockets.WebSocketException) as e:
+        if not joined:
+            game.player_failed(f"{type(e).__name__}: {e}")
+            return
+    finally:
+        for task in answer_tasks:
+            task.cancel()
+    if joined:
+        game.disconnects += 1
+
+
+async def host_loop(game: Game, ws_url: str, token: str, questions: int, server: ServerProcess, timeline: dict) -> None:
+    async with websockets.connect(f"{ws_url}?token={token}", open_timeout=120, max_size=None, ping_interval=None) as ws:
+        async def read() -> None:
+            async for raw in ws:
+                message = json.loads(raw)
+                game.frame("host", message.get("type"))
+                if message.get("type") == "ping":
+                    await ws.send('{"type":"pong"}')
+                elif message.get("type") == "error":
+                    game.error(f"host: {message.get('message', '')}")
+
+        reader = asyncio.create_task(read())
+        try:
+            await game.all_joined.wait()
+            timeline["joined"] = time.perf_counter()
+            server.mark("joined")
+            await ws.send('{"type":"start_game"}')
+            for _ in range(questions):
+                game.begin_question()
+                await ws.send('{"type":"next_question"}')
+                try:
+                    await asyncio.wait_for(game.all_answered.wait(), timeout=game.answer_spread + 60)
+                except asyncio.TimeoutError:
+                    pass
+                game.answer_windows.append(time.perf_counter() - game.question_sent_at)
+            timeline["played"] = time.perf_counter()
+            await ws.send('{"type":"end_game"}')
+            await asyncio.sleep(0.5)
+        finally:
+            reader.cancel()
+
+
+async def run_load(args, api: Api, server: ServerProcess) -> dict:
+    run_id = f"{int(time.time()):x}{random.randrange(16**4):04x}"
+    session_url = f"bench-{run_id}"
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        host = api.signup(f"bench_host_{run_id}")
+        signups = min(args.signup, args.players)
+        tokens = [user["token"] for user in pool.map(api.signup, [f"bench_{run_id}_s{i}" for i in range(signups)])]
+    tokens += seed_players(f"bench_{run_id}_p", args.players - signups)
+    questions = create_game(api, host, session_url, args.questions, args.time_limit)
+    server.mark("idle")
+
+    ws_base = api.base_url.replace("http", "ws", 1)
+    ws_url = f"{ws_base}/api/ws/{session_url}"
+    game = Game(len(tokens), questions, args.answer_spread, args.count_frames)
+    timeline = {"start": time.perf_counter()}
+    sampler = asyncio.create_task(server.sample())
+    players = [
+        asyncio.create_task(play(game, ws_url, token, timeline["start"] + i / args.connect_rate))
+        for i, token in enumerate(tokens)
+    ]
+    try:
+        await asyncio.wait_for(
+            host_loop(game, ws_url, host["token"], args.questions, server, timeline),
+            timeout=args.players / args.connect_rate + args.questions * (args.answer_spread + 60) + 120
+        )
+    finally:
+        server.mark("end")
+        sampler.cancel()
+        for task in players:
+            task.cancel()
+        await asyncio.gather(*players, sampler, return_exceptions=True)
+
+    answer_time = sum(game.answer_windows)
+    result = {
+        "players": args.players,
+        "joined": game.joined,
+        "join_errors": len(game.join_errors),
+        "join_seconds": round(timeline.get("joined", time.perf_counter()) - timeline["start"], 2),
+        "join_latency": latency_summary(game.join_latency),
+        "question_delivery": latency_summary(game.delivery_latency),
+        "answer_ack": latency_summary(game.answer_latency),
+        "answers": len(game.answer_latency),
+        "answers_per_sec": round(len(game.answer_latency) / answer_time, 1) if answer_time else None,
+        "errors": game.errors,
+        **server.summary()
+    }
+    if args.count_frames:
+        result["frames_per_question"] = {
+            receiver: {message_type: round(count / args.questions, 1) for message_type, count in sorted(counts.items())}
+            for receiver, counts in game.frames.items()
+        }
+    if game.join_errors:
+        result["first_join_error"] = game.join_errors[0]
+    return result
+
+
+def print_report(result: dict) -> None:
+    def latency(name: str) -> str:
+        summary = result[name]
+        if not summary["count"]:
+            return "нет данных"
+        return f"p50 {summary['p50_ms']} мс, p99 {summary['p99_ms']} мс, max {summary['max_ms']} мс ({summary['count']})"
+
+    print(f"Игроки: {result['joined']}/{result['players']} подключены за {result['join_seconds']} с, ошибок {result['join_errors']}")
+    print(f"Вход (до players_list): {latency('join_latency')}")
+    print(f"Доставка вопроса: {latency('question_delivery')}")
+    print(f"Подтверждение ответа: {latency('answer_ack')}")
+    print(f"Ответов: {result['answers']}, {result['answers_per_sec']} в секунду")
+    if "rss_peak_mb" in result:
+        rss = ", ".join(f"{key[4:-3]} {value} МБ" for key, value in result.items() if key.startswith("rss_"))
+        print(f"RSS сервера: {rss}")
+    if "server_cpu_seconds" in result:
+        print(f"CPU сервера: {result['server_cpu_seconds']} с, генератора: {result['client_cpu_seconds']} с")
+    if "frames_per_question" in result:
+        for receiver, name in (("players", "игроки"), ("host", "хост")):
+            frames = result["frames_per_question"][receiver]
+            details = ", ".join(f"{message_type} {count}" for message_type, count in frames.items())
+            print(f"Кадров на вопрос ({name}): всего {round(sum(frames.values()), 1)}; {details}")
+    if result["errors"]:
+        print(f"Ошибки от сервера: {result['errors']}")
+    if "first_join_error" in result:
+        print(f"Первая ошибка подключения: {result['first_join_error']}")
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон протокола сессии")
+    parser.add_argument("--players", type=int, default=1000)
+    parser.add_argument("--questions", type=int, default=5)
+    parser.add_argument("--connect-rate", type=float, default=500.0, help="подключений в секунду")
+    parser.add_argument("--answer-spread", type=float, default=2.0, help="разброс времени ответа игроков, с")
+    parser.add_argument("--time-limit", type=int, default=120, help="time_limit вопросов, с")
+    parser.add_argument("--signup", type=int, default=20, help="сколько игроков регистрируется через API")
+    parser.add_argument("--url", help="адрес запущенного сервера; без него сервер поднимается локально")
+    parser.add_argument("--server-pid", type=int, help="pid запущенного сервера для замера RSS")
+    parser.add_argument("--database-url", help="БД локального сервера; по умолчанию SQLite во временном каталоге")
+    parser.add_argument("--port", type=int, default=8790)
+    parser.add_argument("--count-frames", action="store_true", help="считать полученные кадры по типам на вопрос")
+    parser.add_argument("--json", help="куда записать результат для сравнения прогонов")
+    return parser.parse_args(argv)
+
+
+def raise_fd_limit() -> None:
+    # Каждый игрок - сокет у генератора и у сервера; лимит наследует и запущенный сервер
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def start_server(args: argparse.Namespace, workdir: str) -> subprocess.Popen:
+    """uvicorn app.main:app на --port; БД - --database-url или SQLite в workdir, Redis - fakeredis"""
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{workdir}/bench.db"
+    os.environ.setdefault("USE_INMEMORY_REDIS", "true")
+    os.environ.setdefault("SECRET_KEY", "bench-secret")
+    with open(os.path.join(workdir, "server.log"), "w") as log:
+        return subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.port),
+             "--log-level", "warning", "--backlog", "4096"],
+            stdout=log, stderr=subprocess.STDOUT
+        )
+
+
+def stop_server(server_proc: subprocess.Popen) -> None:
+    server_proc.send_signal(signal.SIGINT)
+    try:
+        server_proc.wait(30)
+    except subprocess.TimeoutExpired:
+        server_proc.kill()
+
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    raise_fd_limit()
+    server_proc = None
+    workdir = tempfile.TemporaryDirectory(prefix="quiz-bench-")
+    try:
+        if args.url:
+            base_url = args.url
+            server = ServerProcess(args.server_pid)
+        else:
+            server_proc = start_server(args, workdir.name)
+            base_url = f"http://127.0.0.1:{args.port}"
+            server = ServerProcess(server_proc.pid)
+        api = Api(base_url)
+        api.wait_ready(60)
+        cpu_before = server.cpu_seconds()
+
+        result = asyncio.run(run_load(args, api, server))
+
+        cpu_after = server.cpu_seconds()
+        if cpu_before is not None and cpu_after is not None:
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            result["server_cpu_seconds"] = round(cpu_after - cpu_before, 1)
+            result["client_cpu_seconds"] = round(usage.ru_utime + usage.ru_stime, 1)
+        print_report(result)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+        return 0 if result["joined"] == result["players"] else 1
+    finally:
+        if server_proc is not None:
+            stop_server(server_proc)
+        workdir.cleanup()
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,163 @@
+"""Постраничный обход сессий хоста: OFFSET (skip) против курсора (cursor) в crud.list_sessions.
+
+    python -m bench.pagination --sessions 1000000 --limit 100
+
+Создает в пустой БД (по умолчанию SQLite во временном каталоге) схему из моделей с индексами
+миграции b3e71f2a6c90 и --sessions сессий одного хоста, часть с одинаковым started_at.
+Печатает время страницы на разной глубине для обоих способов, время полного обхода курсором
+и сколько строк повторяется или теряется, если во время обхода создаются новые сессии.
+"""
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+
+from app.db.base import Base
+from app.models import models
+from app.services import crud
+
+HOST_ID = 1
+
+
+def seed(engine, count: int, same_time: int) -> None:
+    start = datetime.utcnow() - timedelta(seconds=count)
+    with engine.begin() as conn:
+        conn.execute(models.User.__table__.insert(), [
+            {"id": HOST_ID, "username": "host", "email": "host@quiz-bench.io", "password_hash": "x", "role": "host", "created_at": start}
+        ])
+        conn.execute(models.Quiz.__table__.insert(), [
+            {"id": 1, "title": "Квиз", "author_id": HOST_ID, "is_public": False, "created_at": start}
+        ])
+        chunk = 20000
+        for first in range(1, count + 1, chunk):
+            conn.execute(models.SessionGame.__table__.insert(), [
+                # по same_time сессий подряд стартуют в одну секунду - порядок внутри задает id
+                {"id": i, "quiz_id": 1, "host_id": HOST_ID, "url": f"s{i}", "status": "ended",
+                 "started_at": start + timedelta(seconds=i // same_time)}
+                for i in range(first, min(first + chunk, count + 1))
+            ])
+        conn.execute(text("ANALYZE"))
+
+
+def timed(SessionLocal, page, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        with SessionLocal() as db:
+            started = time.perf_counter()
+            page(db)
+            timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def cursor_at(SessionLocal, host: models.User, offset: int) -> Optional[str]:
+    """Курсор, с которого начинается страница на глубине offset"""
+    if offset == 0:
+        return None
+    with SessionLocal() as db:
+        row = crud.list_sessions(db, host, skip=offset - 1, limit=1)[0]
+        return crud.SESSIONS_KEYSET.encode(crud.SESSIONS_KEYSET.key(row))
+
+
+def walk_with_inserts(SessionLocal, engine, host: models.User, limit: int, pages: int, inserted: int, use_cursor: bool) -> tuple:
+    """Обход pages страниц; после трети из них создаются inserted новых сессий.
+    Возвращает (повторы, пропуски) среди сессий, существовавших до начала обхода"""
+    with SessionLocal() as db:
+        expected = {s.id for s in crud.list_sessions(db, host, skip=0, limit=limit * pages)}
+    seen: List[int] = []
+    cursor = None
+    for page in range(pages):
+        if page == pages // 3:
+            with engine.begin() as conn:
+                max_id = conn.execute(text("SELECT MAX(id) FROM sessions")).scalar()
+                conn.execute(models.SessionGame.__table__.insert(), [
+                    {"id": max_id + i, "quiz_id": 1, "host_id": HOST_ID, "url": f"new{max_id + i}", "status": "ended",
+                     "started_at": datetime.utcnow() + timedelta(days=1)}
+                    for i in range(1, inserted + 1)
+                ])
+        with SessionLocal() as db:
+            if use_cursor:
+                rows = crud.list_sessions(db, host, limit=limit, cursor=cursor)
+                cursor = crud.SESSIONS_KEYSET.next_cursor(rows, limit)
+            else:
+                rows = crud.list_sessions(db, host, skip=page * limit, limit=limit)
+        seen.extend(s.id for s in rows)
+    old = [session_id for session_id in seen if session_id in expected]
+    duplicates = len(old) - len(set(old))
+    missing = len(expected - set(old))
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM sessions WHERE url LIKE 'new%'"))
+    return duplicates, missing
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="OFFSET против курсора на списке сессий")
+    parser.add_argument("--database-url", help="пустая БД; по умолчанию SQLite во временном каталоге")
+    parser.add_argument("--sessions", type=int, default=1000000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--same-time", type=int, default=10, help="сессий с одинаковым started_at подряд")
+    parser.add_argument("--repeat", type=int, default=5)
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    workdir: Optional[tempfile.TemporaryDirectory] = None
+    database_url = args.database_url
+    if database_url is None:
+        workdir = tempfile.TemporaryDirectory(prefix="quiz-pagination-")
+        database_url = f"sqlite:///{workdir.name}/pagination.db"
+    engine = create_engine(database_url, future=True)
+    try:
+        if inspect(engine).get_table_names():
+            print(f"В {engine.url.render_as_string(hide_password=True)} уже есть таблицы, нужна пустая БД", file=sys.stderr)
+            return 2
+        Base.metadata.create_all(engine)
+        started = time.perf_counter()
+        seed(engine, args.sessions, args.same_time)
+        print(f"Сессий: {args.sessions}, заполнено за {time.perf_counter() - started:.1f} с, страница {args.limit}")
+
+        SessionLocal = sessionmaker(bind=engine, autoflush=False, future=True)
+        host = models.User(id=HOST_ID)
+        last_page = max(args.sessions - args.limit, 0)
+        depths = sorted({depth for depth in (0, 1000, 10000, 100000, args.sessions // 2) if depth < last_page} | {last_page})
+        print(f"\n{'глубина':>10} {'skip, мс':>10} {'cursor, мс':>11}")
+        for offset in depths:
+            cursor = cursor_at(SessionLocal, host, offset)
+            by_offset = timed(SessionLocal, lambda db: crud.list_sessions(db, host, skip=offset, limit=args.limit), args.repeat)
+            by_cursor = timed(SessionLocal, lambda db: crud.list_sessions(db, host, limit=args.limit, cursor=cursor), args.repeat)
+            print(f"{offset:>10} {by_offset * 1000:>10.2f} {by_cursor * 1000:>11.2f}")
+
+        started = time.perf_counter()
+        pages = 0
+        total = 0
+        cursor = None
+        while True:
+            with SessionLocal() as db:
+                rows = crud.list_sessions(db, host, limit=args.limit, cursor=cursor)
+            pages += 1
+            total += len(rows)
+            cursor = crud.SESSIONS_KEYSET.next_cursor(rows, args.limit)
+            if cursor is None:
+                break
+        elapsed = time.perf_counter() - started
+        print(f"\nПолный обход курсором: {pages} страниц, {total} сессий за {elapsed:.1f} с ({elapsed / pages * 1000:.2f} мс на страницу)")
+
+        for use_cursor in (False, True):
+            duplicates, missing = walk_with_inserts(SessionLocal, engine, host, args.limit, 30, args.limit * 3 + 7, use_cursor)
+            name = "cursor" if use_cursor else "skip"
+            print(f"Новые сессии во время обхода ({name}): повторов {duplicates}, пропусков {missing}")
+        return 0
+    finally:
+        engine.dispose()
+        if workdir is not None:
+            workdir.cleanup()
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,145 @@
+"""Задержка доставки рассылки быстрым клиентам, когда в комнате есть медленные.
+
+    python -m bench.slow_consumers --rooms 100 500 2000 --slow 5 --delay 0.2
+
+В комнате N ненастоящих сокетов, --slow из них тратят на каждую отправку --delay секунд.
+В комнату --messages раз с интервалом --interval рассылается сообщение; для остальных
+клиентов считается время от рассылки до получения. Два способа:
+
+- последовательно: await send_text по сокетам по очереди (рассылка до ConnectionWriter),
+  медленный клиент задерживает всех, кто стоит после него;
+- ConnectionManager.broadcast: кадр ставится в очереди ConnectionWriter, каждую отправляет
+  своя задача (WS_SEND_QUEUE_SIZE, WS_SLOW_CONSUMER_POLICY из настроек).
+
+Сервер и БД не нужны; DATABASE_URL, если не задан, указывает на SQLite во временном
+каталоге (app.db.session создает движок при импорте).
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from bench.loadgen import latency_summary
+
+SESSION_URL = "bench-slow-consumers"
+
+
+class TimedWebSocket:
+    """Сокет, который запоминает время получения каждого сообщения"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.received: Dict[int, float] = {}  # номер сообщения -> время получения
+
+    async def send_text(self, frame: str):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        received_at = time.perf_counter()
+        self.received[json.loads(frame)["n"]] = received_at
+
+    async def send_bytes(self, frame: bytes):
+        raise RuntimeError("бенчмарк использует только JSON-кадры")
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        pass
+
+
+def make_room(size: int, slow: int, delay: float) -> List[TimedWebSocket]:
+    # Медленные клиенты распределены по комнате, а не стоят в конце списка
+    step = max(1, size // max(slow, 1))
+    return [TimedWebSocket(delay if i % step == 0 and i // step < slow else 0.0) for i in range(size)]
+
+
+def fast_latencies(clients: List[TimedWebSocket], sent_at: Dict[int, float]) -> List[float]:
+    return [
+        ws.received[number] - sent
+        for ws in clients if not ws.delay
+        for number, sent in sent_at.items() if number in ws.received
+    ]
+
+
+async def wait_fast(clients: List[TimedWebSocket], count: int, timeout: float) -> None:
+    deadline = time.perf_counter() + timeout
+    while any(len(ws.received) < count for ws in clients if not ws.delay):
+        if time.perf_counter() > deadline:
+            return
+        await asyncio.sleep(0.01)
+
+
+async def run_sequential(size: int, args) -> dict:
+    clients = make_room(size, args.slow, args.delay)
+    sent_at: Dict[int, float] = {}
+    for number in range(args.messages):
+        sent_at[number] = time.perf_counter()
+        frame = json.dumps({"type": "chat_message", "n": number, "text": "bench"})
+        for ws in clients:
+            await ws.send_text(frame)
+        await asyncio.sleep(args.interval)
+    return latency_summary(fast_latencies(clients, sent_at))
+
+
+async def run_manager(size: int, args) -> dict:
+    from app.models import models
+    from app.routers.websocket import ConnectionManager
+
+    clients = make_room(size, args.slow, args.delay)
+    manager = ConnectionManager()
+    sent_at: Dict[int, float] = {}
+    try:
+        for user_id, ws in enumerate(clients, start=1):
+            await manager.connect(SESSION_URL, ws, models.User(id=user_id))
+        # Полная сборка мусора после импорта приложения иначе попадает в первые замеры
+        gc.collect()
+        for number in range(args.messages):
+            sent_at[number] = time.perf_counter()
+            await manager.broadcast(SESSION_URL, {"type": "chat_message", "n": number, "text": "bench"})
+            await asyncio.sleep(args.interval)
+        await wait_fast(clients, args.messages, timeout=30)
+    finally:
+        await manager.close()
+    return latency_summary(fast_latencies(clients, sent_at))
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Задержка рассылки при медленных клиентах")
+    parser.add_argument("--rooms", type=int, nargs="+", default=[100, 500, 2000], help="размеры комнат")
+    parser.add_argument("--slow", type=int, default=5, help="медленных клиентов в комнате")
+    parser.add_argument("--delay", type=float, default=0.2, help="задержка отправки медленному клиенту, с")
+    parser.add_argument("--messages", type=int, default=10)
+    parser.add_argument("--interval", type=float, default=0.05, help="пауза между рассылками, с")
+    parser.add_argument("--skip-sequential", action="store_true", help="не замерять последовательную рассылку")
+    return parser.parse_args(argv)
+
+
+def format_latency(summary: Optional[dict]) -> str:
+    if not summary or not summary["count"]:
+        return "нет данных"
+    return f"p50 {summary['p50_ms']} мс, p99 {summary['p99_ms']} мс, max {summary['max_ms']} мс"
+
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    workdir = tempfile.TemporaryDirectory(prefix="quiz-bench-")
+    try:
+        os.environ.setdefault("DATABASE_URL", f"sqlite:///{workdir.name}/bench.db")
+        os.environ.setdefault("SECRET_KEY", "bench-secret")
+        print(f"Медленных клиентов: {args.slow} по {args.delay * 1000:.0f} мс на отправку, сообщений: {args.messages}")
+        for size in args.rooms:
+            sequential = None if args.skip_sequential else asyncio.run(run_sequential(size, args))
+            queued = asyncio.run(run_manager(size, args))
+            print(f"Комната {size}:")
+            if sequential is not None:
+                print(f"  последовательно: {format_latency(sequential)}")
+            print(f"  очереди ConnectionWriter: {format_latency(queued)}")
+        return 0
+    finally:
+        workdir.cleanup()
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
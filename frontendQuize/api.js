@@ -26,8 +26,8 @@ class ApiService {
         }
         
         const config = {
-            headers,
             ...options,
+            headers,
         };
 
         try {
@@ -83,6 +83,12 @@ class ApiService {
     }
 
     
+    async getQuizFull(id) {
+        
+        return this.request(`/quizzes/${id}/full`);
+    }
+
+    
     
     async createQuiz({ title, description }) {
         const payload = {
@@ -233,34 +239,47 @@ class ApiService {
     }
 
     
-    async updateSession(sessionId, sessionData) {
+    // Заголовок X-Session-Url направляет запрос в процесс бэкенда, который ведет сессию
+    sessionHeaders(sessionUrl) {
+        return sessionUrl ? { 'X-Session-Url': sessionUrl } : {};
+    }
+
+    
+    async updateSession(sessionId, sessionData, sessionUrl = null) {
         return this.request(`/sessions/${sessionId}`, {
             method: 'PUT',
             body: JSON.stringify(sessionData),
+            headers: this.sessionHeaders(sessionUrl),
         });
     }
 
     
-    async deleteSession(sessionId) {
+    async deleteSession(sessionId, sessionUrl = null) {
         return this.request(`/sessions/${sessionId}`, {
             method: 'DELETE',
+            headers: this.sessionHeaders(sessionUrl),
         });
     }
 
     
-    async getCurrentQuestion(sessionId) {
-        return this.request(`/sessions/${sessionId}/current-question`);
+    async getCurrentQuestion(sessionId, sessionUrl = null) {
+        return this.request(`/sessions/${sessionId}/current-question`, {
+            headers: this.sessionHeaders(sessionUrl),
+        });
     }
 
     
-    async getSessionStatistics(sessionId) {
-        return this.request(`/sessions/${sessionId}/statistics`);
+    async getSessionStatistics(sessionId, sessionUrl = null) {
+        return this.request(`/sessions/${sessionId}/statistics`, {
+            headers: this.sessionHeaders(sessionUrl),
+        });
     }
 
     
-    async nextQuestion(sessionId) {
+    async nextQuestion(sessionId, sessionUrl = null) {
         return this.request(`/sessions/${sessionId}/questions/next`, {
             method: 'POST',
+            headers: this.sessionHeaders(sessionUrl),
         });
     }
 
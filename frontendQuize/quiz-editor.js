@@ -23,16 +23,16 @@ class QuizEditor {
             
             if (this.quizId && typeof apiService !== 'undefined') {
                 try {
-                    const quiz = await apiService.getQuiz(this.quizId);
+                    const quiz = await apiService.getQuizFull(this.quizId);
                     quizTitle = quiz.title || quizTitle;
 
                     
-                    const questionsFromApi = await apiService.getQuestions(this.quizId);
+                    const questionsFromApi = quiz.questions || [];
 
                     this.initialQuestionIds = questionsFromApi.map(q => q.id);
 
                     
-                    this.questions = await Promise.all(questionsFromApi.map(async (q, idx) => {
+                    this.questions = questionsFromApi.map((q, idx) => {
                         const answers = Array.isArray(q.answers) ? q.answers : [];
 
                         
@@ -52,14 +52,7 @@ class QuizEditor {
                         }
 
                         
-                        let mediaInfo = null;
-                        if (q.media_id) {
-                            try {
-                                mediaInfo = await apiService.getMedia(q.media_id);
-                            } catch (e) {
-                                console.error(`Не удалось загрузить медиа ${q.media_id}:`, e);
-                            }
-                        }
+                        const mediaInfo = q.media || null;
 
                         return {
                             id: q.id,
@@ -73,7 +66,7 @@ class QuizEditor {
                             media_info: mediaInfo,
                             orderIndex: q.order_index ?? idx,
                         };
-                    }));
+                    });
                 } catch (e) {
                     console.error('Не удалось загрузить квиз/вопросы из бекенда, используем локальные данные:', e);
                 }
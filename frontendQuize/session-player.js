@@ -14,6 +14,10 @@ class PlayerSessionManager {
         this.reconnectDelay = 1000; 
         this.reconnectTimer = null;
         this.isManualClose = false; 
+        // Номер последнего полученного события сессии: при переподключении сервер
+        // досылает только пропущенные события
+        this.lastSeq = null;
+        this.epoch = null;
         this.answerSubmitted = false; 
         this.players = []; 
         // WebRTC
@@ -123,13 +127,10 @@ class PlayerSessionManager {
 
             
             const wsProtocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-            let wsUrl;
-            
-            if (window.location.hostname === 'localhost' && window.location.port === '8080') {
-                wsUrl = `${wsProtocol}//${window.location.host}/api/ws/${this.sessionUrl}?token=${encodeURIComponent(token)}`;
-            } else {
-                const wsHost = `${window.location.hostname}:8000`;
-                wsUrl = `${wsProtocol}//${wsHost}/api/ws/${this.sessionUrl}?token=${encodeURIComponent(token)}`;
+            // Через тот же nginx, что и REST: он направляет все сокеты сессии в один процесс бэкенда
+            let wsUrl = `${wsProtocol}//${window.location.host}/api/ws/${this.sessionUrl}?token=${encodeURIComponent(token)}`;
+            if (this.epoch && this.lastSeq !== null) {
+                wsUrl += `&epoch=${encodeURIComponent(this.epoch)}&last_seq=${this.lastSeq}`;
             }
             
             console.log('Подключение к WebSocket:', wsUrl);
@@ -169,6 +170,9 @@ class PlayerSessionManager {
 
             this.websocket.onmessage = (event) => {
                 const message = JSON.parse(event.data);
+                if (message.seq !== undefined) {
+                    this.lastSeq = message.seq;
+                }
                 // Логируем только важные сообщения
                 if (message.type === 'error' || message.type === 'webrtc_offer') {
                     console.log('Получено сообщение:', message.type);
@@ -233,11 +237,18 @@ class PlayerSessionManager {
 
     handleWebSocketMessage(message) {
         switch (message.type) {
+            case 'ping':
+                // Heartbeat сервера: без ответа соединение будет закрыто как простаивающее
+                this.websocket.send(JSON.stringify({ type: 'pong' }));
+                break;
+
             case 'session_joined':
                 
                 if (message.session_id) {
                     this.sessionId = message.session_id;
                 }
+                this.epoch = message.epoch || null;
+                this.lastSeq = message.last_seq !== undefined ? message.last_seq : null;
                 
                 
                 if (message.player_score !== undefined) {
@@ -252,9 +263,8 @@ class PlayerSessionManager {
                     this.showGameScreen();
                     
                     
-                    if (message.current_question_id && this.sessionId) {
-                        this.loadCurrentQuestion(message.current_question_id, this.sessionId);
-                    } else {
+                    // Текущий вопрос, если он есть, придет следующим сообщением question_available
+                    if (!message.current_question_id) {
                         
                         const questionText = document.getElementById('question-text');
                         if (questionText) {
@@ -270,6 +280,18 @@ class PlayerSessionManager {
                 }
                 break;
 
+            case 'session_resumed':
+                // Пропущенные события уже пришли; экран не перерисовывается
+                this.lastSeq = message.last_seq;
+                if (message.player_score !== undefined) {
+                    this.playerScore = message.player_score || 0;
+                    this.updateScore(this.playerScore);
+                }
+                if (this.currentQuestion && !this.answerSubmitted && this.timeLeft > 0) {
+                    this.startTimer(this.timeLeft);
+                }
+                break;
+
             case 'game_started':
                 this.showGameScreen();
                 break;
@@ -277,7 +299,11 @@ class PlayerSessionManager {
             case 'question_available':
                 
                 const sessionIdToUse = message.session_id || this.sessionId;
-                if (sessionIdToUse) {
+                if (message.question) {
+                    // Снимок вопроса приходит вместе с событием - без запроса к API
+                    this.currentQuestion = message.question;
+                    this.displayQuestion(message.question);
+                } else if (sessionIdToUse) {
                     
                     this.showGameScreen();
                     this.loadCurrentQuestion(message.question_id, sessionIdToUse);
@@ -288,7 +314,14 @@ class PlayerSessionManager {
                 this.handleTimeUp();
                 break;
 
-            case 'answer_received':
+            case 'question_closed':
+                
+                if (this.currentQuestion && message.question_id === this.currentQuestion.id) {
+                    this.handleTimeUp();
+                }
+                break;
+
+            case 'answers_progress':
                 
                 break;
 
@@ -338,6 +371,40 @@ class PlayerSessionManager {
                 this.requestPlayersList();
                 break;
 
+            case 'player_joined':
+                
+                if (message.player) {
+                    this.upsertPlayer(message.player);
+                }
+                break;
+
+            case 'players_joined':
+                // Игроки, вошедшие за последнее окно, приходят одним сообщением
+                if (message.players) {
+                    this.upsertPlayers(message.players);
+                }
+                break;
+
+            case 'player_left':
+                
+                this.players = this.players.filter(p => p.id !== message.player_id);
+                this.updatePlayersList();
+                break;
+
+            case 'score_changed':
+                
+                if (message.scores) {
+                    this.applyLeaderboardChanges(message.scores);
+                }
+                break;
+
+            case 'leaderboard_update':
+                
+                if (message.changes) {
+                    this.applyLeaderboardChanges(message.changes);
+                }
+                break;
+
             case 'chat_message':
                 
                 if (message.username && message.text) {
@@ -419,7 +486,7 @@ class PlayerSessionManager {
             }
 
             
-            const question = await apiService.getCurrentQuestion(sessionIdToUse);
+            const question = await apiService.getCurrentQuestion(sessionIdToUse, this.sessionUrl);
             this.currentQuestion = question;
             this.displayQuestion(question);
         } catch (error) {
@@ -568,7 +635,6 @@ class PlayerSessionManager {
                 const answerDiv = document.createElement('div');
                 answerDiv.className = 'player-answer-item';
                 answerDiv.dataset.answerId = answer.id;
-                answerDiv.dataset.isCorrect = answer.is_correct;
 
                 answerDiv.innerHTML = `
                     <input type="radio" name="answer" id="answer-${index}" value="${answer.id}" class="player-answer-item__radio">
@@ -818,6 +884,32 @@ class PlayerSessionManager {
         }
     }
 
+    upsertPlayer(player) {
+        this.upsertPlayers([player]);
+    }
+
+    upsertPlayers(players) {
+        players.forEach(player => {
+            const index = this.players.findIndex(p => p.id === player.id);
+            if (index === -1) {
+                this.players.push(player);
+            } else {
+                this.players[index] = player;
+            }
+        });
+        this.updatePlayersList();
+    }
+
+    applyLeaderboardChanges(changes) {
+        changes.forEach(change => {
+            const player = this.players.find(p => p.id === change.player_id);
+            if (player) {
+                player.score = change.score;
+            }
+        });
+        this.updatePlayersList();
+    }
+
     updatePlayersList() {
         const playersList = document.getElementById('player-players-list');
         if (!playersList) return;
@@ -114,7 +114,7 @@ class SessionManager {
 
     async loadCurrentQuestion() {
         try {
-            this.currentQuestion = await apiService.getCurrentQuestion(this.sessionId);
+            this.currentQuestion = await apiService.getCurrentQuestion(this.sessionId, this.sessionUrl);
             this.updateQuestionUI();
         } catch (error) {
             
@@ -133,14 +133,8 @@ class SessionManager {
 
             
             const wsProtocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-            let wsUrl;
-            
-            if (window.location.hostname === 'localhost' && window.location.port === '8080') {
-                wsUrl = `${wsProtocol}//${window.location.host}/api/ws/${this.sessionUrl}?token=${encodeURIComponent(token)}`;
-            } else {
-                const wsHost = `${window.location.hostname}:8000`;
-                wsUrl = `${wsProtocol}//${wsHost}/api/ws/${this.sessionUrl}?token=${encodeURIComponent(token)}`;
-            }
+            // Через тот же nginx, что и REST: он направляет все сокеты сессии в один процесс бэкенда
+            let wsUrl = `${wsProtocol}//${window.location.host}/api/ws/${this.sessionUrl}?token=${encodeURIComponent(token)}`;
             
             console.log('Подключение к WebSocket:', wsUrl);
             this.websocket = new WebSocket(wsUrl);
@@ -187,6 +181,11 @@ class SessionManager {
 
     handleWebSocketMessage(message) {
         switch (message.type) {
+            case 'ping':
+                // Heartbeat сервера: без ответа соединение будет закрыто как простаивающее
+                this.websocket.send(JSON.stringify({ type: 'pong' }));
+                break;
+
             case 'session_joined':
                 
                 if (message.session_id) {
@@ -215,6 +214,40 @@ class SessionManager {
                 this.requestPlayersList();
                 break;
 
+            case 'player_joined':
+                
+                if (message.player) {
+                    this.upsertPlayer(message.player);
+                }
+                break;
+
+            case 'players_joined':
+                // Игроки, вошедшие за последнее окно, приходят одним сообщением
+                if (message.players) {
+                    this.upsertPlayers(message.players);
+                }
+                break;
+
+            case 'player_left':
+                
+                this.players = this.players.filter(p => p.id !== message.player_id);
+                this.updatePlayersList();
+                break;
+
+            case 'score_changed':
+                
+                if (message.scores) {
+                    this.applyLeaderboardChanges(message.scores);
+                }
+                break;
+
+            case 'leaderboard_update':
+                
+                if (message.changes) {
+                    this.applyLeaderboardChanges(message.changes);
+                }
+                break;
+
             case 'chat_message':
                 
                 if (message.username && message.text) {
@@ -222,13 +255,29 @@ class SessionManager {
                 }
                 break;
 
+            case 'answers_progress':
+                
+                if (message.user_ids) {
+                    this.markPlayersAnswered(message.user_ids);
+                }
+                break;
+
             case 'question_available':
                 
-                if (message.session_id) {
+                this.players.forEach(player => { player.answered = false; });
+                if (message.question) {
+                    this.currentQuestion = message.question;
+                    this.updateQuestionUI();
+                } else if (message.session_id) {
                     this.loadCurrentQuestion();
                 }
                 break;
 
+            case 'question_closed':
+                
+                this.showQuestionResults(message);
+                break;
+
             case 'question_sent':
                 
                 alert('Следующий вопрос отправлен игрокам!');
@@ -332,6 +381,41 @@ class SessionManager {
         }
     }
 
+    upsertPlayer(player) {
+        this.upsertPlayers([player]);
+    }
+
+    upsertPlayers(players) {
+        players.forEach(player => {
+            const index = this.players.findIndex(p => p.id === player.id);
+            if (index === -1) {
+                this.players.push(player);
+            } else {
+                this.players[index] = player;
+            }
+        });
+        this.updatePlayersList();
+    }
+
+    applyLeaderboardChanges(changes) {
+        changes.forEach(change => {
+            const player = this.players.find(p => p.id === change.player_id);
+            if (player) {
+                player.score = change.score;
+            }
+        });
+        this.updatePlayersList();
+    }
+
+    markPlayersAnswered(userIds) {
+        this.players.forEach(player => {
+            if (userIds.includes(player.user_id)) {
+                player.answered = true;
+            }
+        });
+        this.updatePlayersList();
+    }
+
     updatePlayersList() {
         const playersList = document.getElementById('players-list');
         const playersCount = document.getElementById('players-count');
@@ -350,7 +434,7 @@ class SessionManager {
         playersList.innerHTML = '';
         this.players.forEach(player => {
             const playerItem = document.createElement('div');
-            playerItem.className = 'session-player-item';
+            playerItem.className = player.answered ? 'session-player-item session-player-item--answered' : 'session-player-item';
             playerItem.innerHTML = `
                 <span class="session-player-item__name">${player.nickname || player.username || 'Игрок'}</span>
                 <span class="session-player-item__score">${player.score || 0}</span>
@@ -400,6 +484,16 @@ class SessionManager {
         this.updateControlButtons();
     }
 
+    showQuestionResults(results) {
+        const questionInfo = document.getElementById('question-info');
+        if (!questionInfo || !this.currentQuestion || results.question_id !== this.currentQuestion.id) return;
+
+        const resultsItem = document.createElement('div');
+        resultsItem.className = 'session-question-info-item';
+        resultsItem.innerHTML = `<span>Время вышло. Ответили: ${results.answered}, правильно: ${results.correct}</span>`;
+        questionInfo.appendChild(resultsItem);
+    }
+
     updateQuestionUI() {
         if (!this.currentQuestion) {
             const questionCard = document.getElementById('question-card');
@@ -0,0 +1,6 @@
+import os
+import tempfile
+
+# app.db.session подключается к БД при импорте - тестам хватает пустой SQLite
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp(prefix='quiz-tests-')}/test.db")
+os.environ.setdefault("SECRET_KEY", "test-secret")
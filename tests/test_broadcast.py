@@ -0,0 +1,156 @@
+"""Рассылка между воркерами через Redis pub/sub (RedisBroadcastBackend на общем fakeredis)."""
+import asyncio
+import json
+
+from fakeredis import FakeServer
+from fakeredis import aioredis as fake_aioredis
+
+from app.models import models
+from app.routers.websocket import ConnectionManager
+from app.services.answer_progress import AnswerProgress
+from app.services.broadcast import RedisBroadcastBackend
+
+SESSION_URL = "quiz-session"
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.frames = []
+
+    async def send_text(self, frame: str):
+        self.frames.append(json.loads(frame))
+
+    async def send_bytes(self, frame: bytes):
+        raise AssertionError("JSON-сокет не должен получать MessagePack")
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        pass
+
+
+def worker(server: FakeServer) -> ConnectionManager:
+    """Менеджер сокетов отдельного воркера со своим клиентом Redis"""
+    return ConnectionManager(RedisBroadcastBackend(fake_aioredis.FakeRedis(server=server, decode_responses=True)))
+
+
+async def wait_for(condition, timeout: float = 3.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("сообщение не доставлено")
+        await asyncio.sleep(0.01)
+
+
+def messages(socket: FakeWebSocket, message_type: str) -> list:
+    return [frame for frame in socket.frames if frame.get("type") == message_type]
+
+
+def test_broadcast_reaches_socket_on_other_worker():
+    async def scenario():
+        server = FakeServer()
+        first, second, idle = worker(server), worker(server), worker(server)
+        sender, receiver, bystander = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        try:
+            await first.connect(SESSION_URL, sender, models.User(id=1))
+            await second.connect(SESSION_URL, receiver, models.User(id=2))
+            await idle.connect("other-session", bystander, models.User(id=3))
+
+            await first.broadcast(SESSION_URL, {"type": "chat_message", "text": "привет"})
+            await wait_for(lambda: messages(sender, "chat_message") and messages(receiver, "chat_message"))
+            # Даем время лишним копиям, если бы они были
+            await asyncio.sleep(0.2)
+
+            # Отправитель получает сообщение один раз: через канал, а не еще и локально
+            assert [m["text"] for m in messages(sender, "chat_message")] == ["привет"]
+            assert [m["text"] for m in messages(receiver, "chat_message")] == ["привет"]
+            assert messages(bystander, "chat_message") == []
+        finally:
+            for manager in (first, second, idle):
+                await manager.close()
+
+    asyncio.run(scenario())
+
+
+def test_messages_keep_order_across_workers():
+    async def scenario():
+        server = FakeServer()
+        first, second = worker(server), worker(server)
+        receiver = FakeWebSocket()
+        try:
+            await first.connect(SESSION_URL, FakeWebSocket(), models.User(id=1))
+            await second.connect(SESSION_URL, receiver, models.User(id=2))
+
+            for number in range(20):
+                await first.broadcast(SESSION_URL, {"type": "chat_message", "text": str(number)})
+            await wait_for(lambda: len(messages(receiver, "chat_message")) == 20)
+
+            assert [m["text"] for m in messages(receiver, "chat_message")] == [str(n) for n in range(20)]
+        finally:
+            for manager in (first, second):
+                await manager.close()
+
+    asyncio.run(scenario())
+
+
+def test_excluded_user_is_skipped_on_every_worker():
+    async def scenario():
+        server = FakeServer()
+        first, second = worker(server), worker(server)
+        host_here, host_there, player = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        try:
+            # Хост открыл сокеты на обоих воркерах, игрок - на втором
+            await first.connect(SESSION_URL, host_here, models.User(id=1))
+            await second.connect(SESSION_URL, host_there, models.User(id=1))
+            await second.connect(SESSION_URL, player, models.User(id=2))
+
+            await first.broadcast(SESSION_URL, {"type": "answers_progress", "count": 1}, exclude_user_id=1)
+            await first.broadcast(SESSION_URL, {"type": "chat_message", "text": "после"})
+            await wait_for(lambda: messages(host_there, "chat_message") and messages(host_here, "chat_message"))
+
+            assert [m["count"] for m in messages(player, "answers_progress")] == [1]
+            assert messages(host_here, "answers_progress") == []
+            assert messages(host_there, "answers_progress") == []
+        finally:
+            for manager in (first, second):
+                await manager.close()
+
+    asyncio.run(scenario())
+
+
+def test_answers_progress_reaches_host_on_other_worker():
+    async def scenario():
+        server = FakeServer()
+        first, second = worker(server), worker(server)
+        host, player_here, player_there = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        progress = []
+        for manager in (first, second):
+            # Прогресс ответов у каждого воркера свой, общий только Redis
+            counter = AnswerProgress(fake_aioredis.FakeRedis(server=server, decode_responses=True), window=0.01)
+            counter.broadcast = manager.broadcast
+            counter.send_to_user = manager.send_to_user
+            progress.append(counter)
+        try:
+            await first.connect(SESSION_URL, host, models.User(id=1))
+            await first.connect(SESSION_URL, player_here, models.User(id=2))
+            await second.connect(SESSION_URL, player_there, models.User(id=3))
+
+            # Ответ принял второй воркер, хост подключен к первому
+            progress[1].add(SESSION_URL, 10, 1, 100, 3)
+            await wait_for(lambda: messages(host, "answers_progress"))
+            progress[0].add(SESSION_URL, 10, 1, 100, 2)
+            await wait_for(lambda: len(messages(host, "answers_progress")) == 2)
+            await wait_for(lambda: len(messages(player_here, "answers_progress")) == 2)
+            await asyncio.sleep(0.2)
+
+            detailed = messages(host, "answers_progress")
+            assert [(m["user_ids"], m["count"]) for m in detailed] == [([3], 1), ([2], 2)]
+            for player in (player_here, player_there):
+                room = messages(player, "answers_progress")
+                assert [m["count"] for m in room] == [1, 2]
+                assert all("user_ids" not in m for m in room)
+        finally:
+            for counter in progress:
+                await counter.close()
+            for manager in (first, second):
+                await manager.close()
+
+    asyncio.run(scenario())
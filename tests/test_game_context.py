@@ -0,0 +1,41 @@
+"""Сброс контекстов игр и снимков вопросов с других воркеров через канал Redis."""
+import asyncio
+
+import fakeredis
+from fakeredis import FakeServer
+from fakeredis import aioredis as fake_aioredis
+
+from app.core.config import settings
+from app.db import redis as redis_store
+from app.models import models
+from app.services import game_context
+
+
+def test_invalidation_from_other_worker_marks_context_stale(monkeypatch):
+    server = FakeServer()
+    monkeypatch.setattr(settings, "USE_INMEMORY_REDIS", False)
+    monkeypatch.setattr(redis_store, "get_redis", lambda: fakeredis.FakeStrictRedis(server=server, decode_responses=True))
+    monkeypatch.setattr(redis_store, "get_async_redis", lambda: fake_aioredis.FakeRedis(server=server, decode_responses=True))
+
+    async def scenario():
+        ctx = game_context.SessionContext(models.SessionGame(id=501, quiz_id=77, host_id=1))
+        other = game_context.SessionContext(models.SessionGame(id=502, quiz_id=78, host_id=1))
+        with game_context._lock:
+            game_context._contexts.update({ctx.session_id: ctx, other.session_id: other})
+        listener = game_context.InvalidationListener()
+        try:
+            await listener.start()
+            # Сообщение, которое отправил бы воркер, принявший правку квиза через REST
+            game_context.publish_invalidation("quiz:77")
+            for _ in range(300):
+                if ctx.stale:
+                    break
+                await asyncio.sleep(0.01)
+            assert ctx.stale
+            assert not other.stale
+        finally:
+            await listener.close()
+            game_context.drop_session_context(ctx.session_id)
+            game_context.drop_session_context(other.session_id)
+
+    asyncio.run(scenario())
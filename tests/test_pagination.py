@@ -0,0 +1,41 @@
+"""Обход сессий курсором, когда у части сессий нет started_at."""
+from datetime import datetime, timedelta
+
+from app.db.init_db import init_db
+from app.db.session import SessionLocal, engine
+from app.models import models
+from app.services import crud
+
+HOST_ID = 901
+
+
+def test_sessions_cursor_walks_sessions_without_started_at():
+    init_db(engine)
+    start = datetime(2026, 1, 1)
+    # Пары с одинаковым started_at и сессии без него вперемешку по id
+    started = [None, start, start, None, start + timedelta(hours=1), None, start - timedelta(hours=1)]
+    with engine.begin() as conn:
+        conn.execute(models.SessionGame.__table__.insert(), [
+            {"id": 9000 + i, "quiz_id": 1, "host_id": HOST_ID, "url": f"page-{i}", "status": "ended", "started_at": value}
+            for i, value in enumerate(started)
+        ])
+    host = models.User(id=HOST_ID)
+    try:
+        with SessionLocal() as db:
+            expected = [s.id for s in crud.list_sessions(db, host, limit=100)]
+        seen = []
+        cursor = None
+        while True:
+            with SessionLocal() as db:
+                rows = crud.list_sessions(db, host, limit=2, cursor=cursor)
+            seen.extend(s.id for s in rows)
+            cursor = crud.SESSIONS_KEYSET.next_cursor(rows, 2)
+            if cursor is None:
+                break
+        assert seen == expected
+        assert sorted(seen) == [9000 + i for i in range(len(started))]
+        # Сначала сессии без started_at, затем от новых к старым
+        assert seen[:3] == [9005, 9003, 9000]
+    finally:
+        with engine.begin() as conn:
+            conn.execute(models.SessionGame.__table__.delete().where(models.SessionGame.host_id == HOST_ID))
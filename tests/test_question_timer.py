@@ -0,0 +1,29 @@
+"""Прием ответов таймером вопросов: только открытый вопрос и только до дедлайна."""
+import asyncio
+
+from app.services.question_timer import QuestionTimer
+
+
+def test_accepts_only_open_question_before_deadline():
+    async def scenario():
+        timer = QuestionTimer(grace=0.0, auto_advance=False, advance_delay=0.0)
+        try:
+            # Сессия, в которой вопрос еще не открывался
+            assert not timer.accepts(1, 10)
+
+            await timer.open_question(1, "room", 10, time_limit=30)
+            assert timer.accepts(1, 10)
+            assert not timer.accepts(1, 11)
+
+            # Следующий вопрос без time_limit: время не ограничено, предыдущий закрыт
+            await timer.open_question(1, "room", 11, time_limit=None)
+            assert timer.accepts(1, 11)
+            assert not timer.accepts(1, 10)
+
+            await timer.open_question(1, "room", 12, time_limit=30)
+            timer.sessions[1].deadline = asyncio.get_running_loop().time() - 1
+            assert not timer.accepts(1, 12)
+        finally:
+            await timer.close()
+
+    asyncio.run(scenario())